@@ -300,7 +300,7 @@ def delete_document(
 async def process_document_background(document_id: str, file_path: str):
     """Background task to process uploaded document with notifications and tracking"""
     from app.core.database import SessionLocal
-    from app.services.notification_service import NotificationService
+    from app.services.notification_service import get_notification_service
     from app.crud.user import user_crud
     import time
     
@@ -342,7 +342,7 @@ async def process_document_background(document_id: str, file_path: str):
                 ).first()
                 
                 if admin_user:
-                    notification_service = NotificationService()
+                    notification_service = get_notification_service()
                     await notification_service.notify_document_processed(
                         db=db_session,
                         document_id=document_id,
@@ -384,7 +384,7 @@ async def process_document_background(document_id: str, file_path: str):
                     ).first()
                     
                     if admin_user:
-                        notification_service = NotificationService()
+                        notification_service = get_notification_service()
                         await notification_service.notify_document_processed(
                             db=db_session,
                             document_id=document_id,
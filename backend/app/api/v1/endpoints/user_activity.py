@@ -315,7 +315,7 @@ async def get_inactive_users(
     at_risk_users = inactive_users + [u for u in lightly_engaged if u["activity_count"] < 5]
     
     # Sort by last login (most recent first for prioritization)
-    at_risk_users.sort(key=lambda x: x["last_login"] or datetime.min, reverse=True)
+    at_risk_users.sort(key=lambda x: x["last_login"] or "", reverse=True)
     
     return {
         "tpa_id": target_tpa_id,
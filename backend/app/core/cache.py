@@ -0,0 +1,91 @@
+"""
+Redis cache helpers for short-lived query results
+"""
+import logging
+from typing import Any, Optional
+
+import orjson
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Get the shared Redis client, creating it on first use
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+    return _client
+
+
+async def cache_get_json(key: str) -> Optional[Any]:
+    """
+    Get a cached JSON value, or None on a miss or when Redis is unavailable
+    """
+    try:
+        value = await get_redis().get(key)
+    except Exception as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+        return None
+
+    return orjson.loads(value) if value is not None else None
+
+
+async def cache_set_json(key: str, value: Any, ttl_seconds: int) -> None:
+    """
+    Cache a JSON-serializable value with an expiry
+    """
+    try:
+        await get_redis().set(key, orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS), ex=ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+
+async def cache_get_bytes(key: str) -> Optional[bytes]:
+    """
+    Get a cached raw value, or None on a miss or when Redis is unavailable
+    """
+    try:
+        return await get_redis().get(key)
+    except Exception as e:
+        logger.warning(f"Cache read failed for {key}: {e}")
+        return None
+
+
+async def cache_set_bytes(key: str, value: bytes, ttl_seconds: int) -> None:
+    """
+    Cache a raw value with an expiry
+    """
+    try:
+        await get_redis().set(key, value, ex=ttl_seconds)
+    except Exception as e:
+        logger.warning(f"Cache write failed for {key}: {e}")
+
+
+async def cache_incr(key: str) -> None:
+    """
+    Increment a counter, e.g. a generation number that invalidates dependent keys
+    """
+    try:
+        await get_redis().incr(key)
+    except Exception as e:
+        logger.warning(f"Cache increment failed for {key}: {e}")
+
+
+async def cache_delete_pattern(pattern: str) -> None:
+    """
+    Delete all cached keys matching a glob pattern
+    """
+    try:
+        client = get_redis()
+        keys = [key async for key in client.scan_iter(match=pattern)]
+        if keys:
+            await client.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Cache invalidation failed for {pattern}: {e}")
@@ -22,11 +22,21 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = Field(env="REDIS_URL")
+    KG_CACHE_TTL_SECONDS: int = Field(default=300, env="KG_CACHE_TTL_SECONDS")
+    
+    # Activity analytics
+    ACTIVITY_ROLLUP_REFRESH_SECONDS: int = Field(default=300, env="ACTIVITY_ROLLUP_REFRESH_SECONDS")
     
     # Neo4j
     NEO4J_URI: str = Field(env="NEO4J_URI")
     NEO4J_USER: str = Field(env="NEO4J_USER")
     NEO4J_PASSWORD: str = Field(env="NEO4J_PASSWORD")
+    NEO4J_POOL_SIZE: int = Field(default=50, env="NEO4J_POOL_SIZE")
+    NEO4J_ACQ_TIMEOUT: float = Field(default=60.0, env="NEO4J_ACQ_TIMEOUT")  # seconds
+    NEO4J_MAX_CONNECTION_LIFETIME: float = Field(default=3600.0, env="NEO4J_MAX_CONNECTION_LIFETIME")  # seconds
+    NEO4J_CONNECTION_TIMEOUT: float = Field(default=15.0, env="NEO4J_CONNECTION_TIMEOUT")  # seconds
+    NEO4J_QUERY_TIMEOUT: float = Field(default=10.0, env="NEO4J_QUERY_TIMEOUT")  # seconds
+    NEO4J_BATCH_CHUNK: int = Field(default=5000, env="NEO4J_BATCH_CHUNK")  # rows per write transaction
     
     # API Keys
     OPENAI_API_KEY: str = Field(env="OPENAI_API_KEY")
@@ -46,6 +56,7 @@ class Settings(BaseSettings):
     # Pinecone Configuration
     PINECONE_ENVIRONMENT: str = Field(default="gcp-starter", env="PINECONE_ENVIRONMENT")
     PINECONE_INDEX_NAME: str = Field(default="smartspd-vectors", env="PINECONE_INDEX_NAME")
+    EMBEDDING_CACHE_TTL_SECONDS: int = Field(default=2592000, env="EMBEDDING_CACHE_TTL_SECONDS")  # 30 days
     
     # Security
     JWT_SECRET_KEY: str = Field(env="JWT_SECRET_KEY")
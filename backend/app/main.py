@@ -4,6 +4,7 @@ SmartSPD FastAPI Application
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+import asyncio
 import logging
 import time
 
@@ -189,10 +190,21 @@ async def startup_event():
     logger.info(f"Starting {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info(f"Environment: {settings.ENVIRONMENT}")
     logger.info(f"AI Provider: {settings.AI_SERVICE_PROVIDER}")
+    
+    if settings.ENVIRONMENT != "test":
+        from app.services.user_activity_service import run_daily_activity_refresher
+        app.state.activity_rollup_task = asyncio.create_task(run_daily_activity_refresher())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down SmartSPD API")
+    
+    activity_rollup_task = getattr(app.state, "activity_rollup_task", None)
+    if activity_rollup_task is not None:
+        activity_rollup_task.cancel()
+    
+    from app.services.notification_service import get_notification_service
+    await get_notification_service().close()
 
 if __name__ == "__main__":
     import uvicorn
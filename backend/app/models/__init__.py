@@ -5,7 +5,7 @@ from .health_plan import HealthPlan
 from .document import Document, DocumentChunk
 from .conversation import Conversation, Message
 from .analytics import QueryAnalytics, UserActivity
-from .audit import AuditLog
+from .audit import AuditLog, user_daily_activity
 from .feedback import QueryFeedback
 
 __all__ = [
@@ -20,5 +20,6 @@ __all__ = [
     "QueryAnalytics",
     "UserActivity",
     "AuditLog",
+    "user_daily_activity",
     "QueryFeedback"
 ]
\ No newline at end of file
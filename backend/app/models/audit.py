@@ -1,10 +1,10 @@
 """
 Audit logging for compliance and security
 """
-from sqlalchemy import Column, String, Text, ForeignKey, JSON, Enum, Boolean
+from sqlalchemy import Column, String, Text, ForeignKey, JSON, Enum, Boolean, Date, Integer, Index, DDL, event, table, column
 from sqlalchemy.orm import relationship
 from enum import Enum as PyEnum
-from .base import TenantModel
+from .base import Base, TenantModel
 
 class AuditAction(PyEnum):
     """Audit action enumeration"""
@@ -30,6 +30,21 @@ class AuditSeverity(PyEnum):
 class AuditLog(TenantModel):
     """Audit log for compliance tracking"""
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        # Range scans over a user's or TPA's recent activity (migrations/003_audit_log_activity_indexes.sql)
+        Index(
+            "idx_audit_logs_user_created",
+            "user_id",
+            "created_at",
+            postgresql_include=["action", "resource_type", "success", "ip_address"]
+        ),
+        Index(
+            "idx_audit_logs_tpa_created",
+            "tpa_id",
+            "created_at",
+            postgresql_include=["user_id", "action", "resource_type", "success", "ip_address"]
+        ),
+    )
     
     # Action details
     action = Column(Enum(AuditAction), nullable=False, index=True)
@@ -65,4 +80,43 @@ class AuditLog(TenantModel):
     user = relationship("User", back_populates="audit_logs")
     
     def __repr__(self):
-        return f"<AuditLog(action='{self.action.value}', resource_type='{self.resource_type}')>"
\ No newline at end of file
+        return f"<AuditLog(action='{self.action.value}', resource_type='{self.resource_type}')>"
+
+# Daily rollup of audit logs, maintained as a materialized view (migrations/002_user_daily_activity.sql)
+user_daily_activity = table(
+    "mv_user_daily_activity",
+    column("tpa_id", String(36)),
+    column("user_id", String(36)),
+    column("day", Date),
+    column("action", Enum(AuditAction)),
+    column("resource_type", String(100)),
+    column("success", Boolean),
+    column("cnt", Integer)
+)
+
+# Databases built with create_all() rather than the Docker init scripts get the
+# rollup too; IF NOT EXISTS keeps repeated create_all() calls harmless
+_DAILY_ACTIVITY_DDL = (
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_daily_activity AS
+    SELECT
+        tpa_id,
+        user_id,
+        date(created_at) AS day,
+        action,
+        resource_type,
+        success,
+        count(*) AS cnt
+    FROM audit_logs
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_user_daily_activity_key
+        ON mv_user_daily_activity(tpa_id, user_id, day, action, resource_type, success)
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_mv_user_daily_activity_tpa_user_day ON mv_user_daily_activity(tpa_id, user_id, day)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_user_daily_activity_day ON mv_user_daily_activity(day)",
+)
+
+for _statement in _DAILY_ACTIVITY_DDL:
+    event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -1,17 +1,28 @@
 """
 AI Service abstraction layer for OpenAI and Azure OpenAI
 """
+import asyncio
 import openai
+import tiktoken
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
 from enum import Enum
 from dataclasses import dataclass
+from functools import lru_cache
 
 from app.core.config import settings
 from app.core.exceptions import AIServiceError
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=8)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    """Get the tokenizer for a model, falling back to cl100k_base for unknown names"""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
 class AIProvider(Enum):
     OPENAI = "openai"
     AZURE = "azure"
@@ -30,6 +41,7 @@ class AIService:
     
     def __init__(self):
         self.provider = AIProvider(settings.AI_SERVICE_PROVIDER.lower())
+        self._client: Optional[openai.AsyncOpenAI] = None
         self._setup_client()
     
     def _setup_client(self):
@@ -54,6 +66,13 @@ class AIService:
             
             logger.info("Initialized OpenAI client")
     
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """Shared async client, so concurrent requests reuse its connection pool"""
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._client
+    
     async def chat_completion(
         self,
         messages: List[Dict[str, str]],
@@ -71,8 +90,7 @@ class AIService:
             elif self.provider == AIProvider.AZURE:
                 model = self._map_to_azure_deployment(model)
             
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=model,
                 messages=messages,
                 max_tokens=max_tokens,
@@ -92,6 +110,48 @@ class AIService:
             logger.error(f"Chat completion failed: {e}")
             raise AIServiceError(f"Chat completion failed: {e}", self.provider.value)
     
+    async def chat_completion_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        max_tokens: int = 1000,
+        temperature: float = 0.2,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """Stream chat completion content as it is generated"""
+        
+        try:
+            # Determine the model to use
+            if not model:
+                model = self._get_default_chat_model()
+            elif self.provider == AIProvider.AZURE:
+                model = self._map_to_azure_deployment(model)
+            
+            stream = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True,
+                **kwargs
+            )
+            
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            
+        except Exception as e:
+            logger.error(f"Chat completion stream failed: {e}")
+            raise AIServiceError(f"Chat completion stream failed: {e}", self.provider.value)
+    
+    def get_encoding(self, model: Optional[str] = None) -> tiktoken.Encoding:
+        """Get the tokenizer for a model, defaulting to the chat model"""
+        return _get_encoding(model or self._get_default_chat_model())
+    
+    def count_tokens(self, text: str, model: Optional[str] = None) -> int:
+        """Count tokens in text with the model's tokenizer"""
+        return len(self.get_encoding(model).encode(text))
+    
     async def create_embedding(
         self,
         text: str,
@@ -105,8 +165,7 @@ class AIService:
             elif self.provider == AIProvider.AZURE:
                 model = self._map_to_azure_deployment(model, "embedding")
             
-            client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-            response = client.embeddings.create(
+            response = await self.client.embeddings.create(
                 input=text,
                 model=model
             )
@@ -117,6 +176,30 @@ class AIService:
             logger.error(f"Embedding creation failed: {e}")
             raise AIServiceError(f"Embedding creation failed: {e}", self.provider.value)
     
+    async def create_embeddings(
+        self,
+        texts: List[str],
+        model: Optional[str] = None
+    ) -> List[List[float]]:
+        """Create embeddings for several texts in a single request"""
+        
+        try:
+            if not model:
+                model = self._get_default_embedding_model()
+            elif self.provider == AIProvider.AZURE:
+                model = self._map_to_azure_deployment(model, "embedding")
+            
+            response = await self.client.embeddings.create(
+                input=texts,
+                model=model
+            )
+            
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            
+        except Exception as e:
+            logger.error(f"Batch embedding creation failed: {e}")
+            raise AIServiceError(f"Embedding creation failed: {e}", self.provider.value)
+    
     def _get_default_chat_model(self) -> str:
         """Get default chat model for the provider"""
         if self.provider == AIProvider.AZURE:
@@ -124,6 +207,10 @@ class AIService:
         else:
             return "gpt-4"
     
+    def get_embedding_model(self) -> str:
+        """Get the embedding model used when none is specified"""
+        return self._get_default_embedding_model()
+    
     def _get_default_embedding_model(self) -> str:
         """Get default embedding model for the provider"""
         if self.provider == AIProvider.AZURE:
@@ -192,5 +279,93 @@ class AIService:
                 "error": str(e)
             }
 
+class AIBatcher:
+    """Collect concurrent chat completion requests and dispatch them in batches"""
+    
+    def __init__(self, service: AIService, batch_size: int = 8, flush_interval_ms: int = 50):
+        self.service = service
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._consumer_task: Optional[asyncio.Task] = None
+        self._batch_tasks: Set[asyncio.Task] = set()
+    
+    async def submit(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        max_tokens: int = 1000,
+        temperature: float = 0.2,
+        **kwargs
+    ) -> AIResponse:
+        """Queue a chat completion and wait for its response"""
+        
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        
+        future = asyncio.get_running_loop().create_future()
+        request = dict(
+            messages=messages,
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **kwargs
+        )
+        self._queue.put_nowait((request, future))
+        
+        if self._consumer_task is None or self._consumer_task.done():
+            self._consumer_task = asyncio.create_task(self._consume())
+        
+        return await future
+    
+    async def _collect_batch(self) -> List[Tuple[Dict[str, Any], asyncio.Future]]:
+        """Wait for a request, then gather more until the batch is full or the flush interval ends"""
+        
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _consume(self):
+        """Background worker dispatching queued requests batch by batch"""
+        while True:
+            batch = await self._collect_batch()
+            
+            # Dispatch without waiting so the next batch can start collecting
+            task = asyncio.create_task(self._dispatch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+    
+    async def _dispatch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        """Send a batch of requests concurrently and resolve their futures"""
+        
+        # Chat completions have no batch endpoint, so a batch fans out
+        # concurrently over the shared async client's connections
+        results = await asyncio.gather(
+            *(self.service.chat_completion(**request) for request, _ in batch),
+            return_exceptions=True
+        )
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # Caller stopped waiting
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
 # Global AI service instance
-ai_service = AIService()
\ No newline at end of file
+ai_service = AIService()
+
+# Global batcher for AI requests made on behalf of concurrent queries
+ai_batcher = AIBatcher(ai_service)
\ No newline at end of file
@@ -1,7 +1,7 @@
 """
 Audit service for compliance tracking
 """
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from sqlalchemy.orm import Session
 from datetime import datetime
 
@@ -38,14 +38,14 @@ class AuditService:
         """Log an audit event"""
         
         try:
-            audit_log = AuditLog(
+            audit_log = AuditService._build_audit_log(
                 tpa_id=tpa_id,
                 user_id=user_id,
-                action=AuditAction(action),
+                action=action,
                 resource_type=resource_type,
                 resource_id=resource_id,
                 description=description,
-                severity=AuditSeverity(severity),
+                severity=severity,
                 ip_address=ip_address,
                 user_agent=user_agent,
                 request_path=request_path,
@@ -68,6 +68,50 @@ class AuditService:
             db.rollback()
             raise
     
+    @staticmethod
+    def log_events(db: Session, events: List[Dict[str, Any]]) -> List[AuditLog]:
+        """Log several audit events in a single commit
+        
+        Each event takes the same keyword arguments as log_event. Invalid
+        events are logged and skipped so they don't sink the whole batch.
+        """
+        
+        audit_logs = []
+        for event in events:
+            try:
+                audit_logs.append(AuditService._build_audit_log(**event))
+            except Exception as e:
+                logger.error(f"Skipping invalid audit event {event.get('action')}: {e}")
+        
+        if not audit_logs:
+            return []
+        
+        try:
+            db.add_all(audit_logs)
+            db.commit()
+            return audit_logs
+            
+        except Exception as e:
+            logger.error(f"Failed to log audit events: {e}")
+            db.rollback()
+            raise
+    
+    @staticmethod
+    def _build_audit_log(
+        *,
+        action: str,
+        severity: str = "low",
+        success: bool = True,
+        **fields: Any
+    ) -> AuditLog:
+        """Build an AuditLog row, validating action and severity"""
+        return AuditLog(
+            action=AuditAction(action),
+            severity=AuditSeverity(severity),
+            success=success,
+            **fields
+        )
+    
     @staticmethod
     async def log_auth_event(
         db: Session,
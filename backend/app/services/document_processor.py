@@ -136,35 +136,32 @@ class DocumentProcessor:
             vectorized_chunks = 0
             failed_chunks = 0
             
-            # Now generate embeddings for chunks that don't have them yet
-            for i, (chunk, chunk_data) in enumerate(zip(chunk_objects, chunks)):
-                if not chunk.embedding:  # Skip if already has embedding
-                    try:
-                        logger.info(f"🧠 Generating embedding for chunk {i+1}/{len(chunks)}")
-                        embedding = await self.vector_service.generate_embedding(chunk_data['content'])
-                        chunk.embedding = embedding
-                        chunk.embedding_model = "text-embedding-ada-002"
-                        vectorized_chunks += 1
-                        
-                        # Store in vector database using the chunk ID
-                        await self.vector_service.upsert_document_chunk(
-                            chunk_id=chunk.id,
-                            text=chunk_data['content'],
-                            metadata={
-                                'tpa_id': document.tpa_id,
-                                'document_id': document.id,
-                                'document_type': document.document_type.value,
-                                'health_plan_id': document.health_plan_id,
-                                'chunk_index': i,
-                                'page_number': chunk_data.get('page_number'),
-                                'section_title': chunk_data.get('section_title'),
-                                'chunk_type': chunk_data.get('chunk_type')
-                            }
-                        )
-                        logger.info(f"✅ Chunk {i+1} embedded and stored in vector database")
-                    except Exception as e:
-                        logger.error(f"❌ Failed to generate embedding for chunk {i}: {e}")
-                        failed_chunks += 1
+            # Now generate embeddings for chunks that don't have them yet, in one batch
+            pending = [
+                (i, chunk, chunk_data)
+                for i, (chunk, chunk_data) in enumerate(zip(chunk_objects, chunks))
+                if not chunk.embedding  # Skip if already has embedding
+            ]
+            if pending:
+                logger.info(f"🧠 Generating embeddings for {len(pending)} chunks")
+                vectorized_chunks, failed_chunks = await self._embed_and_store_chunks([
+                    (
+                        chunk,
+                        chunk_data['content'],
+                        {
+                            'tpa_id': document.tpa_id,
+                            'document_id': document.id,
+                            'document_type': document.document_type.value,
+                            'health_plan_id': document.health_plan_id,
+                            'chunk_index': i,
+                            'page_number': chunk_data.get('page_number'),
+                            'section_title': chunk_data.get('section_title'),
+                            'chunk_type': chunk_data.get('chunk_type')
+                        }
+                    )
+                    for i, chunk, chunk_data in pending
+                ])
+                logger.info(f"✅ {vectorized_chunks} chunks embedded and stored in vector database")
             
             # Log chunking summary
             logger.info(f"✅ SPD Chunking Complete - Total: {len(chunks)}, Vectorized: {vectorized_chunks}, Failed: {failed_chunks}")
@@ -205,6 +202,7 @@ class DocumentProcessor:
             # Create summary chunks
             chunks = extracted_data.get('chunks', [])
             logger.info(f"📝 Creating {len(chunks)} summary chunks...")
+            chunk_objects = []
             vectorized_chunks = 0
             failed_chunks = 0
             
@@ -222,36 +220,31 @@ class DocumentProcessor:
                     confidence_score=chunk_data.get('confidence_score', 0.9)
                 )
                 
-                # Generate embedding
-                if self.vector_service.initialized:
-                    try:
-                        embedding = await self.vector_service.generate_embedding(chunk_data['content'])
-                        chunk.embedding = embedding
-                        chunk.embedding_model = "text-embedding-ada-002"
-                        vectorized_chunks += 1
-                        
-                        # Store in vector database
-                        await self.vector_service.upsert_document_chunk(
-                            chunk_id=chunk.id,
-                            text=chunk_data['content'],
-                            metadata={
-                                'tpa_id': document.tpa_id,
-                                'document_id': document.id,
-                                'document_type': document.document_type.value,
-                                'health_plan_id': document.health_plan_id,
-                                'chunk_index': i,
-                                'chunk_type': chunk_data.get('chunk_type')
-                            }
-                        )
-                    except Exception as e:
-                        logger.warning(f"Failed to generate embedding for BPS chunk {i}: {e}")
-                        failed_chunks += 1
-                else:
-                    logger.warning(f"Vector service not initialized, skipping embedding for BPS chunk {i}")
-                    failed_chunks += 1
-                
+                chunk_objects.append(chunk)
                 db.add(chunk)
             
+            # Generate embeddings in one batch once chunk IDs are assigned
+            if self.vector_service.initialized:
+                db.flush()
+                vectorized_chunks, failed_chunks = await self._embed_and_store_chunks([
+                    (
+                        chunk,
+                        chunk_data['content'],
+                        {
+                            'tpa_id': document.tpa_id,
+                            'document_id': document.id,
+                            'document_type': document.document_type.value,
+                            'health_plan_id': document.health_plan_id,
+                            'chunk_index': i,
+                            'chunk_type': chunk_data.get('chunk_type')
+                        }
+                    )
+                    for i, (chunk, chunk_data) in enumerate(zip(chunk_objects, chunks))
+                ])
+            elif chunks:
+                logger.warning(f"Vector service not initialized, skipping embeddings for {len(chunks)} BPS chunks")
+                failed_chunks = len(chunks)
+            
             logger.info(f"✅ BPS Chunking Complete - Total: {len(chunks)}, Vectorized: {vectorized_chunks}, Failed: {failed_chunks}")
             
             # Store benefits in knowledge graph
@@ -312,6 +305,37 @@ class DocumentProcessor:
             logger.error(f"Generic document processing failed: {e}")
             return False
     
+    async def _embed_and_store_chunks(
+        self,
+        items: List[Tuple[DocumentChunk, str, Dict[str, Any]]]
+    ) -> Tuple[int, int]:
+        """Embed (chunk, text, vector metadata) items and store them in the vector database, returning (vectorized, failed) counts"""
+        try:
+            embeddings = await self.vector_service.generate_embeddings([text for _, text, _ in items])
+            await self.vector_service.upsert_document_chunks(
+                [(chunk.id, text, metadata) for chunk, text, metadata in items],
+                embeddings=embeddings
+            )
+            for (chunk, _, _), embedding in zip(items, embeddings):
+                chunk.embedding = embedding
+                chunk.embedding_model = "text-embedding-ada-002"
+            return len(items), 0
+            
+        except Exception as e:
+            if len(items) == 1:
+                logger.error(f"❌ Failed to embed chunk {items[0][0].id}: {e}")
+                return 0, 1
+            logger.warning(f"Batch embedding of {len(items)} chunks failed, retrying chunk by chunk: {e}")
+        
+        # Isolate the failing chunks; batches embedded before the failure are
+        # served from the embedding cache
+        vectorized = failed = 0
+        for item in items:
+            chunk_vectorized, chunk_failed = await self._embed_and_store_chunks([item])
+            vectorized += chunk_vectorized
+            failed += chunk_failed
+        return vectorized, failed
+    
     async def _extract_pdf_text(self, file_path: str) -> str:
         """Extract text from PDF file"""
         text = ""
@@ -2,8 +2,9 @@
 Document version control service for tracking document changes and versions
 """
 import logging
+import os
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 import hashlib
 import difflib
 from sqlalchemy.orm import Session
@@ -16,6 +17,17 @@ from app.services.analytics_service import analytics_service
 
 logger = logging.getLogger(__name__)
 
+# Version-specific metadata keys excluded when diffing document metadata
+_EXCLUDE_METADATA_KEYS = frozenset({
+    'version_number', 'original_document_id', 'previous_version',
+    'uploaded_at', 'uploaded_by', 'is_version', 'change_notes'
+})
+
+
+def _now_iso() -> str:
+    """Current UTC time as a compact ISO-8601 string for metadata payloads"""
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
 
 class DocumentVersion:
     """Represents a document version"""
@@ -75,15 +87,12 @@ class DocumentVersionControl:
             new_version = current_version + 1
             
             # Create new version document
-            import os
-            from pathlib import Path
-            
-            path = Path(file_path)
+            now_iso = _now_iso()
             
             new_doc_data = {
                 'filename': original_doc.filename,  # Keep original filename
                 'file_path': file_path,
-                'file_size': path.stat().st_size,
+                'file_size': os.path.getsize(file_path),
                 'file_hash': new_file_hash,
                 'document_type': original_doc.document_type,
                 'health_plan_id': original_doc.health_plan_id,
@@ -95,7 +104,7 @@ class DocumentVersionControl:
                     'previous_version': current_version,
                     'change_notes': change_notes or f"Version {new_version} uploaded",
                     'uploaded_by': user_id,
-                    'uploaded_at': datetime.utcnow().isoformat(),
+                    'uploaded_at': now_iso,
                     'is_version': True
                 }
             }
@@ -104,7 +113,7 @@ class DocumentVersionControl:
             new_document = await document_crud.create(db, obj_in=new_doc_data, tpa_id=tpa_id)
             
             # Archive previous version
-            await self._archive_previous_version(db, original_doc, new_version)
+            await self._archive_previous_version(db, original_doc, new_version, archived_at=now_iso)
             
             # Generate change summary
             change_summary = await self._generate_change_summary(
@@ -164,12 +173,18 @@ class DocumentVersionControl:
         
         return max_version
     
-    async def _archive_previous_version(self, db: Session, previous_doc: Document, new_version: int):
+    async def _archive_previous_version(
+        self,
+        db: Session,
+        previous_doc: Document,
+        new_version: int,
+        archived_at: Optional[str] = None
+    ):
         """Mark previous version as archived"""
         
         metadata = previous_doc.metadata or {}
         metadata.update({
-            'archived_at': datetime.utcnow().isoformat(),
+            'archived_at': archived_at or _now_iso(),
             'archived_by_version': new_version,
             'is_current': False
         })
@@ -255,13 +270,8 @@ class DocumentVersionControl:
             new_metadata = new_document.metadata or {}
             
             # Exclude version-specific metadata from comparison
-            exclude_keys = {
-                'version_number', 'original_document_id', 'previous_version',
-                'uploaded_at', 'uploaded_by', 'is_version', 'change_notes'
-            }
-            
-            old_comparable = {k: v for k, v in old_metadata.items() if k not in exclude_keys}
-            new_comparable = {k: v for k, v in new_metadata.items() if k not in exclude_keys}
+            old_comparable = {k: v for k, v in old_metadata.items() if k not in _EXCLUDE_METADATA_KEYS}
+            new_comparable = {k: v for k, v in new_metadata.items() if k not in _EXCLUDE_METADATA_KEYS}
             
             if old_comparable != new_comparable:
                 change_summary['metadata_changes'] = {
@@ -420,7 +430,7 @@ class DocumentVersionControl:
                     'rollback_to_version': target_doc.metadata.get('version_number', 1) if target_doc.metadata else 1,
                     'rollback_reason': rollback_reason,
                     'rollback_by': user_id,
-                    'rollback_at': datetime.utcnow().isoformat(),
+                    'rollback_at': _now_iso(),
                     'is_rollback': True
                 }
             }
@@ -469,7 +479,7 @@ class DocumentVersionControl:
             metadata.update({
                 'deleted': True,
                 'deleted_by': user_id,
-                'deleted_at': datetime.utcnow().isoformat(),
+                'deleted_at': _now_iso(),
                 'delete_reason': delete_reason
             })
             
@@ -1,17 +1,320 @@
 """
 Knowledge Graph service using Neo4j
 """
-from neo4j import GraphDatabase
-from typing import List, Dict, Any, Optional
+from neo4j import READ_ACCESS, AsyncGraphDatabase, Query, unit_of_work
+from neo4j.exceptions import Neo4jError
+from typing import AsyncIterator, List, Dict, Any, Optional, Sequence
+import asyncio
 import logging
+import time
 from datetime import datetime
 
+from app.core.cache import cache_delete_pattern, cache_get_json, cache_set_json
 from app.core.config import settings
-from app.core.exceptions import AIServiceError
+from app.core.exceptions import AIServiceError, ValidationError
 from app.services.ai_service import ai_service
 
 logger = logging.getLogger(__name__)
 
+# Benefit node properties written by create_benefit_nodes
+BENEFIT_PROPERTIES = (
+    "benefit_type",
+    "category",
+    "description",
+    "in_network_coverage",
+    "out_of_network_coverage",
+    "copay",
+    "coinsurance",
+    "deductible_applies",
+    "prior_auth_required",
+    "created_at",
+)
+
+
+def _lucene_escape(term: str) -> str:
+    """Quote a search term as a Lucene phrase, so operators and special characters in it match literally"""
+    escaped = term.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def _lucene_query(terms: Sequence[str]) -> str:
+    """Build a full-text query matching any of the terms, ignoring blank ones"""
+    return " OR ".join(_lucene_escape(term) for term in map(str.strip, terms) if term)
+
+
+def _cache_key(method: str, health_plan_id: str, terms: Sequence[str] = ()) -> str:
+    """Build the Redis key for a cached per-plan read"""
+    return f"kg:{method}:{health_plan_id}:{','.join(sorted(terms))}"
+
+
+# Relationship types that may be created between benefits
+ALLOWED_REL_TYPES = frozenset({
+    "RELATED_TO",
+    "SIMILAR_COVERAGE",
+    "BELONGS_TO_CATEGORY",
+    "DEPENDS_ON",
+})
+
+# Multi-hop traversal limits
+MAX_TRAVERSAL_HOPS = 3
+MULTI_HOP_NEIGHBOR_CAP = 50
+MULTI_HOP_DECAY = 0.5
+MULTI_HOP_TOP_K = 20
+
+# Longest relationship chain considered by get_benefit_path
+MAX_BENEFIT_PATH_LENGTH = 6
+
+
+def _build_multi_hop_query(max_hops: int) -> str:
+    """Build the multi-hop traversal query for a fixed hop limit"""
+    return f"""
+    MATCH (p:HealthPlan {{id: $health_plan_id}})-[:INCLUDES_BENEFIT]->(b:Benefit)
+    WHERE b.benefit_type IN $benefit_types
+    
+    // Rank source benefits using neighbour counts only
+    OPTIONAL MATCH path = (b)-[:RELATED_TO*1..{max_hops}]->(connected:Benefit)
+    WITH p, b, connected, min(length(path)) as depth
+    ORDER BY depth
+    WITH p, b, collect(depth)[..$neighbor_cap] as depths
+    
+    OPTIONAL MATCH (b)-[:BELONGS_TO_CATEGORY]-(category)<-[:BELONGS_TO_CATEGORY]-(category_related:Benefit)
+    WHERE (p)-[:INCLUDES_BENEFIT]->(category_related)
+    WITH p, b, depths, count(DISTINCT category_related) as category_count
+    
+    OPTIONAL MATCH (p)-[:INCLUDES_BENEFIT]->(coverage_related:Benefit)
+    WHERE coverage_related.category = b.category
+    AND coverage_related.id <> b.id
+    WITH p, b, depths, category_count, count(DISTINCT coverage_related) as coverage_count
+    
+    // Calculate relationship strength, decaying multi-hop neighbours by depth
+    WITH p, b,
+         reduce(strength = 0.0, d IN depths | strength + $hop_decay ^ (d - 1))
+             + CASE WHEN category_count < $neighbor_cap THEN category_count ELSE $neighbor_cap END
+             + CASE WHEN coverage_count < $neighbor_cap THEN coverage_count ELSE $neighbor_cap END
+             as relationship_strength
+    ORDER BY relationship_strength DESC
+    LIMIT $top_k
+    
+    // Materialize neighbour sets only for the top-ranked benefits
+    // Find benefits within max_hops directed relationships, keeping the shortest depth
+    OPTIONAL MATCH path = (b)-[:RELATED_TO*1..{max_hops}]->(connected:Benefit)
+    WITH p, b, relationship_strength, connected, min(length(path)) as depth
+    ORDER BY depth
+    WITH p, b, relationship_strength,
+         collect(connected)[..$neighbor_cap] as multi_hop_benefits
+    
+    // Find benefits that share categories
+    OPTIONAL MATCH (b)-[:BELONGS_TO_CATEGORY]-(category)<-[:BELONGS_TO_CATEGORY]-(category_related:Benefit)
+    WHERE (p)-[:INCLUDES_BENEFIT]->(category_related)
+    WITH p, b, relationship_strength, multi_hop_benefits,
+         collect(DISTINCT category_related)[..$neighbor_cap] as category_benefits
+    
+    // Find benefits with similar coverage patterns
+    OPTIONAL MATCH (p)-[:INCLUDES_BENEFIT]->(coverage_related:Benefit)
+    WHERE coverage_related.category = b.category
+    AND coverage_related.id <> b.id
+    WITH b, relationship_strength, multi_hop_benefits, category_benefits,
+         collect(DISTINCT coverage_related)[..$neighbor_cap] as coverage_benefits
+    
+    RETURN b, 
+           multi_hop_benefits,
+           category_benefits,
+           coverage_benefits,
+           relationship_strength
+    ORDER BY relationship_strength DESC
+    """
+
+
+_MULTI_HOP_QUERIES = {
+    hops: _build_multi_hop_query(hops) for hops in range(1, MAX_TRAVERSAL_HOPS + 1)
+}
+
+
+# Cypher statements, built once at import so every call reuses the same query text
+_Q_PING = "RETURN 1 as test"
+
+# Schema objects keyed by name so existing ones can be skipped
+_SCHEMA_STATEMENTS = {
+    # Constraints
+    "tpa_id": "CREATE CONSTRAINT tpa_id IF NOT EXISTS FOR (t:TPA) REQUIRE t.id IS UNIQUE",
+    "health_plan_id": "CREATE CONSTRAINT health_plan_id IF NOT EXISTS FOR (p:HealthPlan) REQUIRE p.id IS UNIQUE",
+    "benefit_id": "CREATE CONSTRAINT benefit_id IF NOT EXISTS FOR (b:Benefit) REQUIRE b.id IS UNIQUE",
+    "document_id": "CREATE CONSTRAINT document_id IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE",
+    "coverage_pattern_key": "CREATE CONSTRAINT coverage_pattern_key IF NOT EXISTS FOR (cp:CoveragePattern) REQUIRE cp.key IS UNIQUE",
+    
+    # Indexes
+    "tpa_slug": "CREATE INDEX tpa_slug IF NOT EXISTS FOR (t:TPA) ON (t.slug)",
+    "health_plan_number": "CREATE INDEX health_plan_number IF NOT EXISTS FOR (p:HealthPlan) ON (p.plan_number)",
+    "benefit_type": "CREATE INDEX benefit_type IF NOT EXISTS FOR (b:Benefit) ON (b.benefit_type)",
+    "benefit_category": "CREATE INDEX benefit_category IF NOT EXISTS FOR (b:Benefit) ON (b.category)",
+    "benefit_category_type": "CREATE INDEX benefit_category_type IF NOT EXISTS FOR (b:Benefit) ON (b.category, b.benefit_type)",
+    "category_name": "CREATE INDEX category_name IF NOT EXISTS FOR (c:Category) ON (c.health_plan_id, c.name)",
+    "benefit_coverage": "CREATE INDEX benefit_coverage IF NOT EXISTS FOR (b:Benefit) ON (b.coinsurance, b.deductible_applies, b.prior_auth_required)",
+    
+    # Full-text indexes
+    "benefit_text": "CREATE FULLTEXT INDEX benefit_text IF NOT EXISTS FOR (b:Benefit) ON EACH [b.description, b.benefit_type]"
+}
+
+_Q_SHOW_CONSTRAINTS = "SHOW CONSTRAINTS YIELD name"
+
+_Q_SHOW_INDEXES = "SHOW INDEXES YIELD name"
+
+_Q_AWAIT_INDEXES = "CALL db.awaitIndexes()"
+
+# Link benefits stored before Category nodes existed to their category; a
+# no-op once every benefit is linked
+_Q_BACKFILL_CATEGORIES = """
+MATCH (p:HealthPlan)-[:INCLUDES_BENEFIT]->(b:Benefit)
+WHERE NOT (b)-[:BELONGS_TO_CATEGORY]->(:Category)
+MERGE (c:Category {health_plan_id: p.id, name: coalesce(b.category, 'Other')})
+MERGE (b)-[:BELONGS_TO_CATEGORY]->(c)
+RETURN count(DISTINCT b) as backfilled
+"""
+
+# Set once this process has attempted the category backfill; initialize()
+# runs on every health probe and must not repeat the graph-wide write scan
+_categories_backfilled = False
+
+_Q_CREATE_TPA = """
+MERGE (t:TPA {id: $id})
+SET t.name = $name,
+    t.slug = $slug,
+    t.created_at = $created_at,
+    t.updated_at = $updated_at
+RETURN t
+"""
+
+_Q_CREATE_HEALTH_PLAN = """
+MATCH (t:TPA {id: $tpa_id})
+MERGE (p:HealthPlan {id: $id})
+SET p.name = $name,
+    p.plan_number = $plan_number,
+    p.plan_year = $plan_year,
+    p.plan_type = $plan_type,
+    p.created_at = $created_at,
+    p.updated_at = $updated_at
+MERGE (t)-[:HAS_PLAN]->(p)
+RETURN p
+"""
+
+_Q_UPSERT_BENEFITS = """
+UNWIND $rows AS row
+MATCH (p:HealthPlan {id: row.health_plan_id})
+MERGE (b:Benefit {id: row.id})
+SET b += row.props
+MERGE (p)-[:INCLUDES_BENEFIT]->(b)
+
+// Keep the precomputed category grouping in step with b.category
+MERGE (c:Category {health_plan_id: row.health_plan_id, name: coalesce(row.props.category, 'Other')})
+MERGE (b)-[:BELONGS_TO_CATEGORY]->(c)
+WITH b, c
+OPTIONAL MATCH (b)-[stale:BELONGS_TO_CATEGORY]->(other:Category)
+WHERE other <> c
+DELETE stale
+"""
+
+_Q_LINK_RELATED_BENEFITS = """
+UNWIND $rows AS row
+MATCH (b1:Benefit {id: row.benefit_id})
+MATCH (b2:Benefit {id: row.related_id})
+MERGE (b1)-[:RELATED_TO]->(b2)
+"""
+
+_Q_RELATED_BENEFITS = """
+MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
+WHERE b.benefit_type IN $benefit_types
+OPTIONAL MATCH (b)-[:RELATED_TO]->(related:Benefit)
+WITH p, b, collect(related) as related_benefits
+OPTIONAL MATCH (p)-[:INCLUDES_BENEFIT]->(category_related:Benefit)
+WHERE category_related.category = b.category
+AND category_related.id <> b.id
+RETURN b, related_benefits, collect(category_related) as category_benefits
+"""
+
+_Q_BENEFIT_HIERARCHY = """
+MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)-[:BELONGS_TO_CATEGORY]->(c:Category)
+RETURN c.name as category,
+       collect({
+           id: b.id,
+           benefit_type: b.benefit_type,
+           description: b.description,
+           copay: b.copay,
+           coinsurance: b.coinsurance
+       }) as benefits
+ORDER BY category
+"""
+
+_Q_SEARCH_BENEFITS = """
+CALL db.index.fulltext.queryNodes('benefit_text', $search_query) YIELD node AS b, score
+MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b)
+RETURN b
+ORDER BY score DESC
+"""
+
+# One relationship write per whitelisted type; the type cannot be a parameter
+_Q_CREATE_RELATIONSHIPS = {
+    relationship_type: f"""
+UNWIND $rows AS row
+MATCH (b1:Benefit {{id: row.benefit_id_1}})
+MATCH (b2:Benefit {{id: row.benefit_id_2}})
+MERGE (b1)-[r:{relationship_type}]->(b2)
+SET r.strength = row.strength,
+    r.description = row.description,
+    r.created_at = row.created_at
+"""
+    for relationship_type in ALLOWED_REL_TYPES
+}
+
+# Link each benefit to one CoveragePattern node per distinct coverage tuple
+# instead of materializing pairwise edges
+_Q_LINK_COVERAGE_PATTERNS = """
+MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
+MERGE (cp:CoveragePattern {
+    key: $health_plan_id + '|' +
+         coalesce(toString(b.category), '') + '|' +
+         coalesce(toString(b.coinsurance), '') + '|' +
+         coalesce(toString(b.deductible_applies), '') + '|' +
+         coalesce(toString(b.prior_auth_required), '')
+})
+ON CREATE SET cp.health_plan_id = $health_plan_id,
+              cp.category = b.category,
+              cp.coinsurance = b.coinsurance,
+              cp.deductible_applies = b.deductible_applies,
+              cp.prior_auth_required = b.prior_auth_required
+MERGE (b)-[:HAS_PATTERN]->(cp)
+
+// Drop links to patterns the benefit's coverage no longer matches
+WITH b, cp
+OPTIONAL MATCH (b)-[stale:HAS_PATTERN]->(other:CoveragePattern)
+WHERE other <> cp
+DELETE stale
+RETURN count(DISTINCT cp) as patterns_found, count(DISTINCT b) as benefits_linked
+"""
+
+_Q_SIMILAR_COVERAGE_BENEFITS = """
+MATCH (b1:Benefit {id: $benefit_id})-[:HAS_PATTERN]->(:CoveragePattern)<-[:HAS_PATTERN]-(b2:Benefit)
+WHERE b2 <> b1
+RETURN DISTINCT b2
+ORDER BY b2.benefit_type
+"""
+
+_Q_BENEFIT_PATH_ENDPOINT_COUNTS = """
+MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
+WHERE b.benefit_type IN [$start_benefit_type, $end_benefit_type]
+RETURN sum(CASE WHEN b.benefit_type = $start_benefit_type THEN 1 ELSE 0 END) as start_count,
+       sum(CASE WHEN b.benefit_type = $end_benefit_type THEN 1 ELSE 0 END) as end_count
+"""
+
+_Q_BENEFIT_PATH = f"""
+MATCH (p:HealthPlan {{id: $health_plan_id}})-[:INCLUDES_BENEFIT]->(start:Benefit {{benefit_type: $start_benefit_type}})
+MATCH (p)-[:INCLUDES_BENEFIT]->(end:Benefit {{benefit_type: $end_benefit_type}})
+MATCH path = shortestPath((start)-[*..{MAX_BENEFIT_PATH_LENGTH}]-(end))
+RETURN path, length(path) as path_length
+ORDER BY path_length ASC
+LIMIT 1
+"""
+
+
 class KnowledgeGraphService:
     """Service for knowledge graph operations using Neo4j"""
     
@@ -22,18 +325,30 @@ class KnowledgeGraphService:
     async def initialize(self):
         """Initialize Neo4j connection"""
         try:
-            self.driver = GraphDatabase.driver(
+            self.driver = AsyncGraphDatabase.driver(
                 settings.NEO4J_URI,
-                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+                max_connection_pool_size=settings.NEO4J_POOL_SIZE,
+                connection_acquisition_timeout=settings.NEO4J_ACQ_TIMEOUT,
+                max_connection_lifetime=settings.NEO4J_MAX_CONNECTION_LIFETIME,
+                connection_timeout=settings.NEO4J_CONNECTION_TIMEOUT
+            )
+            logger.info(
+                f"Neo4j driver configured: pool_size={settings.NEO4J_POOL_SIZE}, "
+                f"acquisition_timeout={settings.NEO4J_ACQ_TIMEOUT}s, "
+                f"max_lifetime={settings.NEO4J_MAX_CONNECTION_LIFETIME}s, "
+                f"connection_timeout={settings.NEO4J_CONNECTION_TIMEOUT}s"
             )
             
             # Test connection
-            with self.driver.session() as session:
-                result = session.run("RETURN 1 as test")
-                result.single()
+            async with self.driver.session() as session:
+                result = await session.run(_Q_PING)
+                await result.single()
             
             # Create constraints and indexes
             await self._create_schema()
+            if not _categories_backfilled:
+                await self._backfill_categories()
             
             self.initialized = True
             logger.info("Knowledge graph service initialized successfully")
@@ -45,27 +360,101 @@ class KnowledgeGraphService:
     
     async def _create_schema(self):
         """Create Neo4j schema constraints and indexes"""
-        constraints_and_indexes = [
-            # Constraints
-            "CREATE CONSTRAINT tpa_id IF NOT EXISTS FOR (t:TPA) REQUIRE t.id IS UNIQUE",
-            "CREATE CONSTRAINT health_plan_id IF NOT EXISTS FOR (p:HealthPlan) REQUIRE p.id IS UNIQUE",
-            "CREATE CONSTRAINT benefit_id IF NOT EXISTS FOR (b:Benefit) REQUIRE b.id IS UNIQUE",
-            "CREATE CONSTRAINT document_id IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE",
-            
-            # Indexes
-            "CREATE INDEX tpa_slug IF NOT EXISTS FOR (t:TPA) ON (t.slug)",
-            "CREATE INDEX health_plan_number IF NOT EXISTS FOR (p:HealthPlan) ON (p.plan_number)",
-            "CREATE INDEX benefit_type IF NOT EXISTS FOR (b:Benefit) ON (b.benefit_type)",
-            "CREATE INDEX benefit_category IF NOT EXISTS FOR (b:Benefit) ON (b.category)"
-        ]
-        
-        with self.driver.session() as session:
-            for query in constraints_and_indexes:
+        
+        async def _read_existing_names(tx):
+            names = set()
+            for query in (_Q_SHOW_CONSTRAINTS, _Q_SHOW_INDEXES):
+                result = await tx.run(query)
+                names.update([record["name"] async for record in result])
+            return names
+        
+        async def _create_schema_object(tx, statement):
+            await tx.run(statement)
+        
+        async with self.driver.session() as session:
+            # Only issue DDL for schema objects that do not exist yet; if the
+            # schema cannot be listed, every IF NOT EXISTS statement is run
+            try:
+                existing = await session.execute_read(_read_existing_names)
+            except Exception as e:
+                logger.warning(f"Failed to list Neo4j schema objects: {e}")
+                existing = set()
+            
+            missing = [
+                statement for name, statement in _SCHEMA_STATEMENTS.items()
+                if name not in existing
+            ]
+            
+            if not missing:
+                return
+            
+            # One transaction per statement so an unsupported one does not
+            # roll back the rest
+            created = 0
+            for statement in missing:
                 try:
-                    session.run(query)
+                    await session.execute_write(_create_schema_object, statement)
+                    created += 1
                 except Exception as e:
-                    # Constraints may already exist
-                    logger.debug(f"Schema query warning: {e}")
+                    logger.warning(f"Failed to create Neo4j schema object: {e}")
+            logger.info(f"Created {created} of {len(missing)} missing Neo4j schema objects")
+            
+            # Wait for newly created indexes to come online before serving queries
+            try:
+                result = await session.run(_Q_AWAIT_INDEXES)
+                await result.consume()
+            except Exception as e:
+                logger.warning(f"Timed out waiting for Neo4j indexes: {e}")
+    
+    async def _backfill_categories(self):
+        """Create Category nodes for benefits stored before they were maintained on upsert, once per process"""
+        global _categories_backfilled
+        _categories_backfilled = True
+        
+        async def _backfill(tx):
+            result = await tx.run(_Q_BACKFILL_CATEGORIES)
+            record = await result.single()
+            return record["backfilled"] if record else 0
+        
+        try:
+            async with self.driver.session() as session:
+                backfilled = await session.execute_write(_backfill)
+        except Exception as e:
+            logger.warning(f"Failed to backfill benefit categories: {e}")
+            return
+        
+        if backfilled:
+            # Hierarchies cached before the backfill are empty
+            await cache_delete_pattern("kg:get_benefit_hierarchy:*")
+            logger.info(f"Linked {backfilled} benefits to Category nodes")
+    
+    async def _write_in_chunks(
+        self,
+        session,
+        query: str,
+        rows: List[Dict[str, Any]],
+        label: str
+    ):
+        """Run an UNWIND write in transactions of at most NEO4J_BATCH_CHUNK rows"""
+        
+        async def _write_chunk(tx, chunk):
+            await tx.run(query, rows=chunk)
+        
+        chunk_size = settings.NEO4J_BATCH_CHUNK
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            chunk_start = time.perf_counter()
+            await session.execute_write(_write_chunk, chunk)
+            logger.debug(
+                f"Wrote {len(chunk)} {label} in {time.perf_counter() - chunk_start:.3f}s"
+            )
+            
+            # Yield to the event loop between chunks
+            await asyncio.sleep(0)
+    
+    async def invalidate_plan_cache(self, health_plan_id: str):
+        """Drop cached knowledge graph reads for a health plan"""
+        await cache_delete_pattern(f"kg:*:{health_plan_id}:*")
     
     async def create_tpa_node(self, tpa_data: Dict[str, Any]) -> bool:
         """Create TPA node"""
@@ -73,16 +462,11 @@ class KnowledgeGraphService:
             return False
         
         try:
-            with self.driver.session() as session:
-                query = """
-                MERGE (t:TPA {id: $id})
-                SET t.name = $name,
-                    t.slug = $slug,
-                    t.created_at = $created_at,
-                    t.updated_at = $updated_at
-                RETURN t
-                """
-                session.run(query, tpa_data)
+            async def _create_tpa(tx, payload):
+                await tx.run(_Q_CREATE_TPA, payload)
+            
+            async with self.driver.session() as session:
+                await session.execute_write(_create_tpa, tpa_data)
             return True
             
         except Exception as e:
@@ -95,20 +479,11 @@ class KnowledgeGraphService:
             return False
         
         try:
-            with self.driver.session() as session:
-                query = """
-                MATCH (t:TPA {id: $tpa_id})
-                MERGE (p:HealthPlan {id: $id})
-                SET p.name = $name,
-                    p.plan_number = $plan_number,
-                    p.plan_year = $plan_year,
-                    p.plan_type = $plan_type,
-                    p.created_at = $created_at,
-                    p.updated_at = $updated_at
-                MERGE (t)-[:HAS_PLAN]->(p)
-                RETURN p
-                """
-                session.run(query, plan_data)
+            async def _create_health_plan(tx, payload):
+                await tx.run(_Q_CREATE_HEALTH_PLAN, payload)
+            
+            async with self.driver.session() as session:
+                await session.execute_write(_create_health_plan, plan_data)
             return True
             
         except Exception as e:
@@ -116,43 +491,45 @@ class KnowledgeGraphService:
             return False
     
     async def create_benefit_nodes(self, benefits_data: List[Dict[str, Any]]) -> bool:
-        """Create benefit nodes and relationships"""
+        """Create benefit nodes and relationships (an empty batch is a successful no-op)"""
         if not self.initialized:
             return False
         
+        if not benefits_data:
+            return True
+        
         try:
-            with self.driver.session() as session:
-                for benefit in benefits_data:
-                    # Create benefit node
-                    query = """
-                    MATCH (p:HealthPlan {id: $health_plan_id})
-                    MERGE (b:Benefit {id: $id})
-                    SET b.benefit_type = $benefit_type,
-                        b.category = $category,
-                        b.description = $description,
-                        b.in_network_coverage = $in_network_coverage,
-                        b.out_of_network_coverage = $out_of_network_coverage,
-                        b.copay = $copay,
-                        b.coinsurance = $coinsurance,
-                        b.deductible_applies = $deductible_applies,
-                        b.prior_auth_required = $prior_auth_required,
-                        b.created_at = $created_at
-                    MERGE (p)-[:INCLUDES_BENEFIT]->(b)
-                    """
-                    session.run(query, benefit)
-                    
-                    # Create relationships between related benefits
-                    if benefit.get("related_benefits"):
-                        for related_id in benefit["related_benefits"]:
-                            related_query = """
-                            MATCH (b1:Benefit {id: $benefit_id})
-                            MATCH (b2:Benefit {id: $related_id})
-                            MERGE (b1)-[:RELATED_TO]->(b2)
-                            """
-                            session.run(related_query, {
-                                "benefit_id": benefit["id"],
-                                "related_id": related_id
-                            })
+            # Flatten the payload so both writes travel as a single list parameter
+            benefit_rows = [
+                {
+                    "id": benefit["id"],
+                    "health_plan_id": benefit["health_plan_id"],
+                    "props": {key: benefit.get(key) for key in BENEFIT_PROPERTIES}
+                }
+                for benefit in benefits_data
+            ]
+            # Each edge is sent once, ordered by source id for consistent lock ordering
+            related_edges = sorted({
+                (benefit["id"], related_id)
+                for benefit in benefits_data
+                for related_id in benefit.get("related_benefits") or []
+                if related_id != benefit["id"]
+            })
+            related_rows = [
+                {"benefit_id": benefit_id, "related_id": related_id}
+                for benefit_id, related_id in related_edges
+            ]
+            
+            async with self.driver.session() as session:
+                await self._write_in_chunks(session, _Q_UPSERT_BENEFITS, benefit_rows, "benefit nodes")
+                
+                # Create relationships between related benefits
+                await self._write_in_chunks(
+                    session, _Q_LINK_RELATED_BENEFITS, related_rows, "related benefit edges"
+                )
+            
+            for health_plan_id in {row["health_plan_id"] for row in benefit_rows}:
+                await self.invalidate_plan_cache(health_plan_id)
             
             return True
             
@@ -160,100 +537,112 @@ class KnowledgeGraphService:
             logger.error(f"Failed to create benefit nodes: {e}")
             return False
     
+    async def iter_related_benefits(
+        self, 
+        health_plan_id: str, 
+        benefit_types: List[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream benefits related to specified types as records arrive"""
+        if not self.initialized or not benefit_types:
+            return
+        
+        async with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            result = await session.run(_Q_RELATED_BENEFITS, {
+                "health_plan_id": health_plan_id,
+                "benefit_types": benefit_types
+            })
+            
+            async for record in result:
+                benefit = dict(record["b"])
+                benefit["related_benefits"] = [dict(r) for r in record["related_benefits"] if r]
+                benefit["category_benefits"] = [dict(r) for r in record["category_benefits"] if r]
+                yield benefit
+    
     async def find_related_benefits(
         self, 
         health_plan_id: str, 
         benefit_types: List[str]
     ) -> List[Dict[str, Any]]:
-        """Find benefits related to specified types"""
-        if not self.initialized:
+        """Find benefits related to specified types (empty types match nothing)"""
+        if not self.initialized or not benefit_types:
             return []
         
+        cache_key = _cache_key("find_related_benefits", health_plan_id, benefit_types)
+        cached = await cache_get_json(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            with self.driver.session() as session:
-                query = """
-                MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
-                WHERE b.benefit_type IN $benefit_types
-                OPTIONAL MATCH (b)-[:RELATED_TO]->(related:Benefit)
-                RETURN b, collect(related) as related_benefits
-                """
-                
-                result = session.run(query, {
-                    "health_plan_id": health_plan_id,
-                    "benefit_types": benefit_types
-                })
-                
-                benefits = []
-                for record in result:
-                    benefit = dict(record["b"])
-                    benefit["related_benefits"] = [dict(r) for r in record["related_benefits"] if r]
-                    benefits.append(benefit)
-                
-                return benefits
+            benefits = [
+                benefit async for benefit in self.iter_related_benefits(health_plan_id, benefit_types)
+            ]
                 
         except Exception as e:
             logger.error(f"Failed to find related benefits: {e}")
             return []
+        
+        await cache_set_json(cache_key, benefits, settings.KG_CACHE_TTL_SECONDS)
+        return benefits
+    
+    async def iter_related_benefits_multi_hop(
+        self, 
+        health_plan_id: str, 
+        benefit_types: List[str],
+        max_hops: int = 3,
+        top_k: int = MULTI_HOP_TOP_K
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream benefits related to specified types with multi-hop traversal"""
+        if not self.initialized or not benefit_types:
+            return
+        
+        # Single-hop requests skip the variable-length traversal entirely
+        if max_hops <= 1:
+            async for benefit in self.iter_related_benefits(health_plan_id, benefit_types):
+                yield benefit
+            return
+        
+        async with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            # Multi-hop traversal query, hop count clamped to the precompiled plans
+            hops = max(1, min(max_hops, MAX_TRAVERSAL_HOPS))
+            query = Query(_MULTI_HOP_QUERIES[hops], timeout=settings.NEO4J_QUERY_TIMEOUT)
+            
+            result = await session.run(query, {
+                "health_plan_id": health_plan_id,
+                "benefit_types": benefit_types,
+                "neighbor_cap": MULTI_HOP_NEIGHBOR_CAP,
+                "hop_decay": MULTI_HOP_DECAY,
+                "top_k": top_k
+            })
+            
+            async for record in result:
+                benefit = dict(record["b"])
+                benefit["multi_hop_benefits"] = [dict(r) for r in record["multi_hop_benefits"] if r]
+                benefit["category_benefits"] = [dict(r) for r in record["category_benefits"] if r]
+                benefit["coverage_benefits"] = [dict(r) for r in record["coverage_benefits"] if r]
+                benefit["relationship_strength"] = record["relationship_strength"]
+                yield benefit
     
     async def find_related_benefits_multi_hop(
         self, 
         health_plan_id: str, 
         benefit_types: List[str],
-        max_hops: int = 3
+        max_hops: int = 3,
+        top_k: int = MULTI_HOP_TOP_K
     ) -> List[Dict[str, Any]]:
-        """Find benefits related to specified types with multi-hop traversal"""
-        if not self.initialized:
+        """Find benefits related to specified types with multi-hop traversal (empty types match nothing)"""
+        if not self.initialized or not benefit_types:
             return []
         
+        # Single-hop requests skip the variable-length traversal entirely
+        if max_hops <= 1:
+            return await self.find_related_benefits(health_plan_id, benefit_types)
+        
         try:
-            with self.driver.session() as session:
-                # Multi-hop traversal query
-                query = f"""
-                MATCH (p:HealthPlan {{id: $health_plan_id}})-[:INCLUDES_BENEFIT]->(b:Benefit)
-                WHERE b.benefit_type IN $benefit_types
-                
-                // Find benefits within max_hops relationships
-                OPTIONAL MATCH path = (b)-[:RELATED_TO*1..{max_hops}]-(connected:Benefit)
-                
-                // Find benefits that share categories
-                OPTIONAL MATCH (b)-[:BELONGS_TO_CATEGORY]-(category)<-[:BELONGS_TO_CATEGORY]-(category_related:Benefit)
-                WHERE (p)-[:INCLUDES_BENEFIT]->(category_related)
-                
-                // Find benefits with similar coverage patterns
-                OPTIONAL MATCH (coverage_related:Benefit)
-                WHERE (p)-[:INCLUDES_BENEFIT]->(coverage_related)
-                AND coverage_related.category = b.category
-                AND coverage_related.id <> b.id
-                
-                WITH b, 
-                     collect(DISTINCT connected) as multi_hop_benefits,
-                     collect(DISTINCT category_related) as category_benefits,
-                     collect(DISTINCT coverage_related) as coverage_benefits
-                
-                RETURN b, 
-                       multi_hop_benefits,
-                       category_benefits,
-                       coverage_benefits,
-                       // Calculate relationship strength
-                       size(multi_hop_benefits) + size(category_benefits) + size(coverage_benefits) as relationship_strength
-                ORDER BY relationship_strength DESC
-                """
-                
-                result = session.run(query, {
-                    "health_plan_id": health_plan_id,
-                    "benefit_types": benefit_types
-                })
-                
-                benefits = []
-                for record in result:
-                    benefit = dict(record["b"])
-                    benefit["multi_hop_benefits"] = [dict(r) for r in record["multi_hop_benefits"] if r]
-                    benefit["category_benefits"] = [dict(r) for r in record["category_benefits"] if r]
-                    benefit["coverage_benefits"] = [dict(r) for r in record["coverage_benefits"] if r]
-                    benefit["relationship_strength"] = record["relationship_strength"]
-                    benefits.append(benefit)
-                
-                return benefits
+            return [
+                benefit async for benefit in self.iter_related_benefits_multi_hop(
+                    health_plan_id, benefit_types, max_hops, top_k
+                )
+            ]
                 
         except Exception as e:
             logger.error(f"Failed to find related benefits with multi-hop: {e}")
@@ -265,64 +654,79 @@ class KnowledgeGraphService:
         if not self.initialized:
             return {}
         
+        cache_key = _cache_key("get_benefit_hierarchy", health_plan_id)
+        cached = await cache_get_json(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            with self.driver.session() as session:
-                query = """
-                MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
-                RETURN b.category as category, 
-                       collect({
-                           id: b.id,
-                           benefit_type: b.benefit_type,
-                           description: b.description,
-                           copay: b.copay,
-                           coinsurance: b.coinsurance
-                       }) as benefits
-                ORDER BY category
-                """
-                
-                result = session.run(query, {"health_plan_id": health_plan_id})
+            async def _read_hierarchy(tx, plan_id):
+                result = await tx.run(_Q_BENEFIT_HIERARCHY, {"health_plan_id": plan_id})
                 
                 hierarchy = {}
-                for record in result:
+                async for record in result:
                     category = record["category"] or "Other"
                     hierarchy[category] = record["benefits"]
                 
                 return hierarchy
+            
+            async with self.driver.session() as session:
+                hierarchy = await session.execute_read(_read_hierarchy, health_plan_id)
                 
         except Exception as e:
             logger.error(f"Failed to get benefit hierarchy: {e}")
             return {}
+        
+        await cache_set_json(cache_key, hierarchy, settings.KG_CACHE_TTL_SECONDS)
+        return hierarchy
+    
+    async def iter_search_benefits(
+        self, 
+        health_plan_id: str, 
+        search_terms: List[str]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream benefits matching search terms in relevance order"""
+        if not self.initialized or not search_terms:
+            return
+        
+        search_query = _lucene_query(search_terms)
+        if not search_query:
+            return
+        
+        async with self.driver.session(default_access_mode=READ_ACCESS) as session:
+            result = await session.run(_Q_SEARCH_BENEFITS, {
+                "health_plan_id": health_plan_id,
+                "search_query": search_query
+            })
+            
+            async for record in result:
+                yield dict(record["b"])
     
     async def search_benefits(
         self, 
         health_plan_id: str, 
         search_terms: List[str]
     ) -> List[Dict[str, Any]]:
-        """Search benefits by terms"""
-        if not self.initialized:
+        """Search benefits by terms (no terms match nothing)"""
+        if not self.initialized or not search_terms:
             return []
         
+        cache_key = _cache_key("search_benefits", health_plan_id, search_terms)
+        cached = await cache_get_json(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            with self.driver.session() as session:
-                # Create search pattern
-                search_pattern = " OR ".join([f"toLower(b.description) CONTAINS toLower('{term}')" for term in search_terms])
-                search_pattern += " OR " + " OR ".join([f"toLower(b.benefit_type) CONTAINS toLower('{term}')" for term in search_terms])
-                
-                query = f"""
-                MATCH (p:HealthPlan {{id: $health_plan_id}})-[:INCLUDES_BENEFIT]->(b:Benefit)
-                WHERE {search_pattern}
-                RETURN b
-                ORDER BY b.category, b.benefit_type
-                """
-                
-                result = session.run(query, {"health_plan_id": health_plan_id})
-                
-                benefits = [dict(record["b"]) for record in result]
-                return benefits
+            benefits = [
+                benefit async for benefit in self.iter_search_benefits(health_plan_id, search_terms)
+            ]
                 
         except Exception as e:
             logger.error(f"Failed to search benefits: {e}")
             return []
+        
+        await cache_set_json(cache_key, benefits, settings.KG_CACHE_TTL_SECONDS)
+        return benefits
     
     async def create_benefit_relationships(
         self,
@@ -333,31 +737,50 @@ class KnowledgeGraphService:
         if not self.initialized:
             return False
         
+        # Reject unknown relationship types before touching the driver
+        unsupported_types = {
+            rel.get('relationship_type', 'RELATED_TO') for rel in benefit_relationships
+        } - ALLOWED_REL_TYPES
+        if unsupported_types:
+            raise ValidationError(
+                "Unsupported benefit relationship type",
+                details={
+                    "unsupported_types": sorted(unsupported_types),
+                    "allowed_types": sorted(ALLOWED_REL_TYPES)
+                }
+            )
+        
         try:
-            with self.driver.session() as session:
-                for rel in benefit_relationships:
-                    # Create different types of relationships
-                    relationship_type = rel.get('relationship_type', 'RELATED_TO')
-                    
-                    query = f"""
-                    MATCH (b1:Benefit {{id: $benefit_id_1}})
-                    MATCH (b2:Benefit {{id: $benefit_id_2}})
-                    MERGE (b1)-[r:{relationship_type}]->(b2)
-                    SET r.strength = $strength,
-                        r.description = $description,
-                        r.created_at = $created_at
-                    """
-                    
-                    session.run(query, {
-                        "benefit_id_1": rel["benefit_id_1"],
-                        "benefit_id_2": rel["benefit_id_2"],
-                        "strength": rel.get("strength", 0.5),
-                        "description": rel.get("description", ""),
-                        "created_at": datetime.utcnow().isoformat()
-                    })
+            # Group rows by relationship type so each type is written with one UNWIND
+            created_at = datetime.utcnow().isoformat()
+            rows_by_type: Dict[str, List[Dict[str, Any]]] = {}
+            for rel in benefit_relationships:
+                relationship_type = rel.get('relationship_type', 'RELATED_TO')
+                rows_by_type.setdefault(relationship_type, []).append({
+                    "benefit_id_1": rel["benefit_id_1"],
+                    "benefit_id_2": rel["benefit_id_2"],
+                    "strength": rel.get("strength", 0.5),
+                    "description": rel.get("description", ""),
+                    "created_at": created_at
+                })
+            
+            if rows_by_type:
+                async with self.driver.session() as session:
+                    for relationship_type, rows in rows_by_type.items():
+                        await self._write_in_chunks(
+                            session,
+                            _Q_CREATE_RELATIONSHIPS[relationship_type],
+                            rows,
+                            f"{relationship_type} relationships"
+                        )
+                
+                await self.invalidate_plan_cache(health_plan_id)
             
             return True
             
+        except Neo4jError as e:
+            logger.error(f"Failed to create benefit relationships: [{e.code}] {e.message}")
+            return False
         except Exception as e:
             logger.error(f"Failed to create benefit relationships: {e}")
             return False
@@ -366,46 +789,21 @@ class KnowledgeGraphService:
         self,
         health_plan_id: str
     ) -> Dict[str, Any]:
-        """Analyze benefit patterns and create intelligent relationships"""
+        """Analyze benefit patterns and link benefits to shared coverage patterns"""
         if not self.initialized:
             return {}
         
         try:
-            with self.driver.session() as session:
-                # Find benefits with similar coverage patterns
-                query = """
-                MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(b:Benefit)
-                
-                // Group benefits by similar characteristics
-                WITH b.category as category,
-                     b.coinsurance as coinsurance,
-                     b.deductible_applies as deductible_applies,
-                     b.prior_auth_required as prior_auth_required,
-                     collect(b) as benefits
-                WHERE size(benefits) > 1
-                
-                // Create relationships between benefits with similar patterns
-                UNWIND benefits as b1
-                UNWIND benefits as b2
-                WHERE b1.id <> b2.id
-                MERGE (b1)-[r:SIMILAR_COVERAGE]->(b2)
-                SET r.similarity_score = 
-                    CASE 
-                        WHEN b1.coinsurance = b2.coinsurance AND 
-                             b1.deductible_applies = b2.deductible_applies AND 
-                             b1.prior_auth_required = b2.prior_auth_required
-                        THEN 1.0
-                        ELSE 0.7
-                    END
-                
-                RETURN count(r) as relationships_created
-                """
-                
-                result = session.run(query, {"health_plan_id": health_plan_id})
-                record = result.single()
+            async def _link_coverage_patterns(tx, plan_id):
+                result = await tx.run(_Q_LINK_COVERAGE_PATTERNS, {"health_plan_id": plan_id})
+                return await result.single()
+            
+            async with self.driver.session() as session:
+                record = await session.execute_write(_link_coverage_patterns, health_plan_id)
                 
                 return {
-                    "relationships_created": record["relationships_created"] if record else 0,
+                    "patterns_found": record["patterns_found"] if record else 0,
+                    "benefits_linked": record["benefits_linked"] if record else 0,
                     "analysis_completed": True
                 }
                 
@@ -413,6 +811,23 @@ class KnowledgeGraphService:
             logger.error(f"Failed to analyze benefit patterns: {e}")
             return {"analysis_completed": False}
     
+    async def find_similar_coverage_benefits(self, benefit_id: str) -> List[Dict[str, Any]]:
+        """Find benefits sharing a coverage pattern with the given benefit"""
+        if not self.initialized:
+            return []
+        
+        try:
+            async def _read_similar(tx, source_id):
+                result = await tx.run(_Q_SIMILAR_COVERAGE_BENEFITS, {"benefit_id": source_id})
+                return [dict(record["b2"]) async for record in result]
+            
+            async with self.driver.session() as session:
+                return await session.execute_read(_read_similar, benefit_id)
+                
+        except Exception as e:
+            logger.error(f"Failed to find similar coverage benefits: {e}")
+            return []
+    
     async def get_benefit_path(
         self,
         health_plan_id: str,
@@ -424,44 +839,60 @@ class KnowledgeGraphService:
             return []
         
         try:
-            with self.driver.session() as session:
-                query = """
-                MATCH (p:HealthPlan {id: $health_plan_id})-[:INCLUDES_BENEFIT]->(start:Benefit {benefit_type: $start_benefit_type})
-                MATCH (p)-[:INCLUDES_BENEFIT]->(end:Benefit {benefit_type: $end_benefit_type})
-                MATCH path = shortestPath((start)-[*]-(end))
-                RETURN path, length(path) as path_length
-                ORDER BY path_length ASC
-                LIMIT 1
-                """
+            params = {
+                "health_plan_id": health_plan_id,
+                "start_benefit_type": start_benefit_type,
+                "end_benefit_type": end_benefit_type
+            }
+            
+            @unit_of_work(timeout=settings.NEO4J_QUERY_TIMEOUT)
+            async def _read_path(tx, payload):
+                # Seed the search from the endpoint type with fewer benefits
+                result = await tx.run(_Q_BENEFIT_PATH_ENDPOINT_COUNTS, payload)
+                counts = await result.single()
+                if not counts or not counts["start_count"] or not counts["end_count"]:
+                    return None, False
                 
-                result = session.run(query, {
-                    "health_plan_id": health_plan_id,
-                    "start_benefit_type": start_benefit_type,
-                    "end_benefit_type": end_benefit_type
-                })
+                reverse_path = counts["end_count"] < counts["start_count"]
+                if reverse_path:
+                    payload = {
+                        **payload,
+                        "start_benefit_type": payload["end_benefit_type"],
+                        "end_benefit_type": payload["start_benefit_type"]
+                    }
                 
-                record = result.single()
-                if record:
-                    path = record["path"]
-                    path_data = []
-                    
-                    for i in range(len(path.nodes)):
-                        node = dict(path.nodes[i])
-                        path_data.append({
-                            "benefit": node,
-                            "step": i + 1,
-                            "relationship": dict(path.relationships[i]) if i < len(path.relationships) else None
-                        })
-                    
-                    return path_data
+                result = await tx.run(_Q_BENEFIT_PATH, payload)
+                return await result.single(), reverse_path
+            
+            async with self.driver.session() as session:
+                record, reverse_path = await session.execute_read(_read_path, params)
+            
+            if record:
+                path = record["path"]
+                nodes = list(path.nodes)
+                relationships = list(path.relationships)
+                if reverse_path:
+                    nodes.reverse()
+                    relationships.reverse()
                 
-                return []
+                path_data = []
+                for i in range(len(nodes)):
+                    node = dict(nodes[i])
+                    path_data.append({
+                        "benefit": node,
+                        "step": i + 1,
+                        "relationship": dict(relationships[i]) if i < len(relationships) else None
+                    })
                 
+                return path_data
+            
+            return []
+            
         except Exception as e:
             logger.error(f"Failed to find benefit path: {e}")
             return []
     
-    def close(self):
+    async def close(self):
         """Close Neo4j connection"""
         if self.driver:
-            self.driver.close()
\ No newline at end of file
+            await self.driver.close()
\ No newline at end of file
@@ -10,20 +10,28 @@ Provides email and SMS alerting capabilities for:
 """
 
 import asyncio
-import smtplib
+import base64
+import hashlib
 import ssl
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
-from typing import List, Dict, Any, Optional
+import time
+import zlib
+from collections import deque
+from functools import lru_cache
+from string import Template
+from types import MappingProxyType
+from datetime import datetime, timezone
+from email.message import EmailMessage, MIMEPart
+from email.policy import SMTP as SMTP_POLICY
+from typing import List, Dict, Any, Callable, Deque, Optional, Set, Tuple, TypeVar
 from pathlib import Path
 
+import aiofiles
 import aiohttp
+import aiosmtplib
 from sqlalchemy.orm import Session
 
 from app.core.config import settings
+from app.core.database import get_db_context
 from app.models.user import User
 from app.models.audit import AuditLog
 from app.services.audit_service import AuditService
@@ -31,6 +39,213 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Alert severities in increasing order of urgency
+SEVERITY_RANKS = MappingProxyType({"low": 0, "medium": 1, "high": 2, "critical": 3})
+
+SEVERITY_COLORS = MappingProxyType({
+    "low": "#10b981",      # Green
+    "medium": "#f59e0b",   # Yellow
+    "high": "#ef4444",     # Red
+    "critical": "#dc2626"  # Dark red
+})
+
+SEVERITY_ICONS = MappingProxyType({
+    "low": "ℹ️",
+    "medium": "⚠️",
+    "high": "🚨",
+    "critical": "🔥"
+})
+
+_DEFAULT_SEVERITY_COLOR = "#6b7280"
+_DEFAULT_SEVERITY_ICON = "🔔"
+
+_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S UTC'
+
+# Roles that receive system and user activity alerts
+_ADMIN_ROLES = ("tpa_admin", "cs_manager")
+
+# Admin email cache key covering admins of every TPA
+_ANY_TPA = "*"
+
+# Background audit writer: queue bound, batch size and wait before each write
+_AUDIT_QUEUE_SIZE = 1000
+_AUDIT_BATCH_SIZE = 50
+_AUDIT_BATCH_WINDOW = 0.1
+
+# Put on a background worker's queue by close(); the worker sends what it
+# holds and exits instead of being cancelled with a batch in hand
+_QUEUE_STOP = object()
+
+# Dedup entries kept before expired ones are swept
+_DEDUP_SWEEP_THRESHOLD = 10_000
+
+# Attachment read size; a multiple of 57 bytes so each chunk encodes to whole base64 lines
+_ATTACHMENT_CHUNK_SIZE = 57 * 1024
+_BASE64_LINE_BYTES = 57
+
+# Text attachments above this size are gzipped before sending
+_COMPRESSIBLE_EXTENSIONS = ('.csv', '.json', '.txt', '.html')
+_COMPRESS_MIN_BYTES = 32 * 1024
+
+# HTML email bodies, compiled once at import
+_DOC_PROCESSED_HTML = Template("""
+<html>
+<body>
+    <h2>✅ Document Processing Complete</h2>
+    
+    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 10px 0;">
+        <p><strong>Document:</strong> $document_name</p>
+        <p><strong>Status:</strong> <span style="color: green;">Successfully processed</span></p>
+        <p><strong>Processing Time:</strong> $processing_time seconds</p>
+        <p><strong>Document ID:</strong> $document_id</p>
+    </div>
+    
+    <p>The document has been processed and is now available for queries.</p>
+    <p>You can start asking questions about this health plan document.</p>
+    
+    <hr>
+    <p><em>Best regards,<br>SmartSPD Team</em></p>
+</body>
+</html>
+""")
+
+_DOC_FAILED_HTML = Template("""
+<html>
+<body>
+    <h2>❌ Document Processing Failed</h2>
+    
+    <div style="background: #fef2f2; padding: 15px; border-radius: 5px; margin: 10px 0;">
+        <p><strong>Document:</strong> $document_name</p>
+        <p><strong>Status:</strong> <span style="color: red;">Processing failed</span></p>
+        <p><strong>Document ID:</strong> $document_id</p>
+    </div>
+    
+    <p>There was an issue processing your document. Please try uploading again or contact support.</p>
+    
+    <hr>
+    <p><em>Best regards,<br>SmartSPD Team</em></p>
+</body>
+</html>
+""")
+
+_SYSTEM_ALERT_HTML = Template("""
+<html>
+<body>
+    <h2>$icon SmartSPD System Alert</h2>
+    
+    <div style="background: #f9fafb; padding: 15px; border-radius: 5px; border-left: 4px solid $color; margin: 10px 0;">
+        <p><strong>Alert Type:</strong> $alert_type</p>
+        <p><strong>Severity:</strong> <span style="color: $color; font-weight: bold;">$severity</span></p>
+        <p><strong>Time:</strong> $timestamp</p>
+    </div>
+    
+    <div style="background: #f3f4f6; padding: 15px; border-radius: 5px; margin: 10px 0;">
+        <h3>Message:</h3>
+        <p>$message</p>
+    </div>
+    
+    <p>Please review the system and take appropriate action if necessary.</p>
+    
+    <hr>
+    <p><em>SmartSPD Monitoring System</em></p>
+</body>
+</html>
+""")
+
+_USER_ACTIVITY_HTML = Template("""
+<html>
+<body>
+    <h2>👤 User Activity Alert</h2>
+    
+    <div style="background: #fef3c7; padding: 15px; border-radius: 5px; border-left: 4px solid #f59e0b; margin: 10px 0;">
+        <p><strong>User:</strong> $user_name ($user_email)</p>
+        <p><strong>Alert Type:</strong> $alert_type</p>
+        <p><strong>Time:</strong> $timestamp</p>
+    </div>
+    
+    <div style="background: #f3f4f6; padding: 15px; border-radius: 5px; margin: 10px 0;">
+        <h3>Details:</h3>
+        <p>$details</p>
+    </div>
+    
+    <p>Please review the user's activity and take appropriate action if necessary.</p>
+    
+    <hr>
+    <p><em>SmartSPD User Activity Monitoring</em></p>
+</body>
+</html>
+""")
+
+_WELCOME_HTML = Template("""
+<html>
+<body>
+    <h2>🎉 Welcome to SmartSPD!</h2>
+    
+    <p>Dear $user_name,</p>
+    
+    <p>Welcome to SmartSPD, your AI-powered health plan assistant. Your account has been created and you can now access the system.</p>
+    
+    <div style="background: #eff6ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
+        <h3>Login Information:</h3>
+        <p><strong>Email:</strong> $user_email</p>
+        $password_html
+    </div>
+    
+    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
+        <h3>Getting Started:</h3>
+        <ol>
+            <li>Log in to the SmartSPD dashboard</li>
+            <li>Upload your health plan documents</li>
+            <li>Start asking questions about benefits and coverage</li>
+        </ol>
+    </div>
+    
+    <p>If you need help, please contact your administrator or visit our help documentation.</p>
+    
+    <hr>
+    <p><em>Best regards,<br>SmartSPD Team</em></p>
+</body>
+</html>
+""")
+
+_COMPLIANCE_REPORT_HTML = Template("""
+<html>
+<body>
+    <h2>📊 SmartSPD Audit Compliance Report</h2>
+    
+    <div style="background: #f8fafc; padding: 15px; border-radius: 5px; margin: 15px 0;">
+        <p><strong>Report Period:</strong> $report_period</p>
+        <p><strong>Generated:</strong> $generated</p>
+    </div>
+    
+    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
+        <h3>Summary:</h3>
+        <ul>
+            <li><strong>Total Activities:</strong> $total_activities</li>
+            <li><strong>Successful Activities:</strong> $successful_activities</li>
+            <li><strong>Failed Activities:</strong> $failed_activities</li>
+            <li><strong>Success Rate:</strong> $success_rate</li>
+            <li><strong>Security Events:</strong> $security_events</li>
+        </ul>
+    </div>
+    
+    <p>Please review the attached detailed report for compliance purposes.</p>
+    
+    <hr>
+    <p><em>SmartSPD Compliance Team</em></p>
+</body>
+</html>
+""")
+
+
+def _without_stop(items: List[Any]) -> Tuple[List[Any], bool]:
+    """Split the stop sentinel out of items taken from a worker queue"""
+    kept = [item for item in items if item is not _QUEUE_STOP]
+    return kept, len(kept) < len(items)
+
+
 class NotificationService:
     """Service for sending email and SMS notifications"""
     
@@ -41,15 +256,118 @@ class NotificationService:
         self.smtp_password = getattr(settings, 'SMTP_PASSWORD', None)
         self.smtp_from_email = getattr(settings, 'SMTP_FROM_EMAIL', None)
         
+        # SMTP connection pool, created on first send
+        self.smtp_pool_size = getattr(settings, 'SMTP_POOL_SIZE', 5)
+        self.smtp_max_messages_per_connection = getattr(settings, 'SMTP_MAX_MESSAGES_PER_CONNECTION', 100)
+        self._smtp_idle: Optional[asyncio.Queue] = None
+        self._smtp_slots: Optional[asyncio.Semaphore] = None
+        self._smtp_message_counts: Dict[int, int] = {}
+        
+        # Identical emails (same recipients, subject and body) are suppressed within the window
+        self.notification_dedup_seconds = getattr(settings, 'NOTIFICATION_DEDUP_SECONDS', 60)
+        self._dedup: Dict[str, float] = {}
+        
+        # Queued emails are flushed in batches over a single connection
+        self.email_batch_window = getattr(settings, 'EMAIL_BATCH_WINDOW_SECONDS', 0.5)
+        self._email_queue: Optional[asyncio.Queue] = None
+        self._flusher_task: Optional[asyncio.Task] = None
+        
+        # System alerts below the bypass severity are coalesced per
+        # (alert_type, severity, recipient) into one summary per window
+        self.alert_coalesce_seconds = getattr(settings, 'ALERT_COALESCE_SECONDS', 300)
+        self.alert_rate_limit_per_minute = getattr(settings, 'ALERT_RATE_LIMIT_PER_MINUTE', 6)
+        self.alert_bypass_severity = getattr(settings, 'ALERT_BYPASS_SEVERITY', 'high')
+        self._alert_cache: Dict[Tuple[str, str, str], Tuple[float, List[str]]] = {}
+        self._alert_send_times: Dict[str, Deque[float]] = {}
+        self._alert_tasks: Set[asyncio.Task] = set()
+        
+        # Audit events are written off the request path in batches
+        self._audit_queue: Optional[asyncio.Queue] = None
+        self._audit_task: Optional[asyncio.Task] = None
+        
+        # Admin/manager recipient lists per TPA, refreshed after the TTL
+        self.admin_email_cache_seconds = getattr(settings, 'ADMIN_EMAIL_CACHE_SECONDS', 60)
+        self._admin_cache: Dict[str, Tuple[float, List[str]]] = {}
+        
         # SMS configuration (Twilio)
         self.twilio_account_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
         self.twilio_auth_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
         self.twilio_from_number = getattr(settings, 'TWILIO_FROM_NUMBER', None)
         
+        # Shared HTTP session for SMS and other HTTP notifications, created on first use
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        # Matches the connector's per-host limit so gathered sends never queue inside aiohttp
+        self.sms_max_concurrency = getattr(settings, 'SMS_MAX_CONCURRENCY', 50)
+        self._sms_sem: Optional[asyncio.Semaphore] = None
+        
         # Notification preferences
         self.enable_email = getattr(settings, 'ENABLE_EMAIL_NOTIFICATIONS', True)
         self.enable_sms = getattr(settings, 'ENABLE_SMS_NOTIFICATIONS', False)
         
+    def _email_configured(self) -> bool:
+        """Check that email notifications are enabled and configured"""
+        if not self.enable_email or not self.smtp_username or not self.smtp_password:
+            logger.warning("Email notifications not configured or disabled")
+            return False
+        return True
+    
+    @staticmethod
+    def _dedup_key(to_emails: List[str], subject: str, body: str) -> str:
+        """Key identifying an email for duplicate suppression"""
+        return hashlib.blake2b(
+            f"{sorted(to_emails)}|{subject}|{body}".encode(),
+            digest_size=16
+        ).hexdigest()
+    
+    def _is_duplicate(self, key: str, to_emails: List[str], subject: str) -> bool:
+        """Check whether the same email went out within the dedup window, recording it if not"""
+        now = time.monotonic()
+        
+        if now - self._dedup.get(key, float('-inf')) < self.notification_dedup_seconds:
+            logger.info(f"Suppressed duplicate email to {to_emails}: {subject}")
+            return True
+        
+        if len(self._dedup) >= _DEDUP_SWEEP_THRESHOLD:
+            cutoff = now - self.notification_dedup_seconds
+            self._dedup = {k: sent_at for k, sent_at in self._dedup.items() if sent_at >= cutoff}
+        
+        # Recorded before sending so concurrent duplicates are caught; a
+        # failed send forgets it again so a retry goes out
+        self._dedup[key] = now
+        return False
+    
+    def _forget_sent(self, key: str):
+        """Drop a dedup record after its send failed"""
+        self._dedup.pop(key, None)
+    
+    async def _build_message(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None
+    ) -> EmailMessage:
+        """Build an email message with optional HTML body and attachments"""
+        msg = EmailMessage()
+        msg['Subject'] = subject
+        msg['From'] = self.smtp_from_email or self.smtp_username
+        msg['To'] = ', '.join(to_emails)
+        
+        # Add text content; a text-only message stays a single part
+        msg.set_content(body)
+        
+        # Add HTML content if provided
+        if html_body:
+            msg.add_alternative(html_body, subtype='html')
+        
+        # Add attachments if provided
+        if attachments:
+            for attachment in attachments:
+                await self._add_attachment(msg, attachment)
+        
+        return msg
+    
     async def send_email(
         self,
         to_emails: List[str],
@@ -60,66 +378,326 @@ class NotificationService:
     ) -> bool:
         """Send email notification"""
         
-        if not self.enable_email or not self.smtp_username or not self.smtp_password:
-            logger.warning("Email notifications not configured or disabled")
+        if not self._email_configured():
             return False
+        
+        dedup_key = self._dedup_key(to_emails, subject, body)
+        if self._is_duplicate(dedup_key, to_emails, subject):
+            return True
             
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.smtp_from_email or self.smtp_username
-            msg['To'] = ', '.join(to_emails)
+            msg = await self._build_message(to_emails, subject, body, html_body, attachments)
+            sent = (await self.send_email_batch([(to_emails, msg)]))[0]
             
-            # Add text content
-            text_part = MIMEText(body, 'plain')
-            msg.attach(text_part)
+            if sent:
+                logger.info(f"Email sent successfully to {to_emails}")
+            else:
+                self._forget_sent(dedup_key)
+            return sent
             
-            # Add HTML content if provided
-            if html_body:
-                html_part = MIMEText(html_body, 'html')
-                msg.attach(html_part)
+        except Exception as e:
+            logger.error(f"Failed to send email: {e}")
+            self._forget_sent(dedup_key)
+            return False
+    
+    async def send_email_batch(
+        self,
+        messages: List[Tuple[List[str], EmailMessage]]
+    ) -> List[bool]:
+        """Send several messages over one pooled connection, returning per-message status"""
+        
+        if not messages:
+            return []
+        
+        if not self._email_configured():
+            return [False] * len(messages)
+        
+        try:
+            smtp = await self._acquire_smtp()
+        except Exception as e:
+            logger.error(f"Failed to connect to SMTP server: {e}")
+            return [False] * len(messages)
+        
+        statuses: List[bool] = []
+        reusable = True
+        mail_options = ['BODY=8BITMIME'] if smtp.supports_extension('8BITMIME') else []
+        try:
+            for to_emails, msg in messages:
+                try:
+                    # Serialize once; every recipient is a RCPT TO in one transaction
+                    await smtp.sendmail(
+                        self.smtp_username,
+                        to_emails,
+                        msg.as_bytes(policy=SMTP_POLICY),
+                        mail_options=mail_options
+                    )
+                    statuses.append(True)
+                except Exception as e:
+                    logger.error(f"Failed to send email to {to_emails}: {e}")
+                    statuses.append(False)
+                    if not smtp.is_connected:
+                        reusable = False
+                        break
+        finally:
+            await self._release_smtp(smtp, messages_sent=len(statuses), reusable=reusable)
+        
+        # Messages left unsent after the connection dropped
+        statuses.extend([False] * (len(messages) - len(statuses)))
+        return statuses
+    
+    async def queue_email(
+        self,
+        to_emails: List[str],
+        subject: str,
+        body: str,
+        html_body: Optional[str] = None,
+        attachments: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """Queue an email for the background batch sender"""
+        
+        if not self._email_configured():
+            return False
+        
+        dedup_key = self._dedup_key(to_emails, subject, body)
+        if self._is_duplicate(dedup_key, to_emails, subject):
+            return True
+        
+        try:
+            msg = await self._build_message(to_emails, subject, body, html_body, attachments)
+        except Exception as e:
+            logger.error(f"Failed to build email: {e}")
+            self._forget_sent(dedup_key)
+            return False
+        
+        if self._email_queue is None:
+            self._email_queue = asyncio.Queue()
+        self._email_queue.put_nowait((to_emails, msg, dedup_key))
+        
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flusher_task = asyncio.create_task(self._batch_flusher())
+        
+        return True
+    
+    def _drain_email_queue(self, limit: int) -> List[Tuple[List[str], EmailMessage, str]]:
+        """Take up to limit queued emails without waiting"""
+        batch = []
+        while len(batch) < limit and not self._email_queue.empty():
+            batch.append(self._email_queue.get_nowait())
+        return batch
+    
+    async def _batch_flusher(self):
+        """Background worker sending queued emails in batches until it takes the stop sentinel"""
+        while True:
+            first = await self._email_queue.get()
+            if first is _QUEUE_STOP:
+                return
             
-            # Add attachments if provided
-            if attachments:
-                for attachment in attachments:
-                    self._add_attachment(msg, attachment)
+            # Give related notifications a moment to join the batch
+            await asyncio.sleep(self.email_batch_window)
+            batch, stopping = _without_stop(
+                [first] + self._drain_email_queue(self.smtp_max_messages_per_connection - 1)
+            )
             
-            # Send email
-            context = ssl.create_default_context()
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls(context=context)
-                server.login(self.smtp_username, self.smtp_password)
-                server.sendmail(self.smtp_username, to_emails, msg.as_string())
+            await self._send_queued_batch(batch)
+            if stopping:
+                return
+    
+    async def _send_queued_batch(self, batch: List[Tuple[List[str], EmailMessage, str]]):
+        """Send queued emails, forgetting the dedup records of those that failed"""
+        try:
+            statuses = await self.send_email_batch([(to_emails, msg) for to_emails, msg, _ in batch])
+            logger.info(f"Email batch sent: {sum(statuses)}/{len(batch)} delivered")
+        except Exception as e:
+            logger.error(f"Failed to send email batch: {e}")
+            statuses = [False] * len(batch)
+        
+        for (_, _, dedup_key), sent in zip(batch, statuses):
+            if not sent:
+                self._forget_sent(dedup_key)
+    
+    async def _connect_smtp(self) -> aiosmtplib.SMTP:
+        """Open and authenticate a new SMTP connection"""
+        smtp = aiosmtplib.SMTP(
+            hostname=self.smtp_server,
+            port=self.smtp_port,
+            start_tls=False,
+            tls_context=ssl.create_default_context()
+        )
+        await smtp.connect()
+        try:
+            await smtp.starttls()
+            await smtp.login(self.smtp_username, self.smtp_password)
+        except Exception:
+            smtp.close()
+            raise
+        
+        self._smtp_message_counts[id(smtp)] = 0
+        return smtp
+    
+    async def _close_smtp(self, smtp: aiosmtplib.SMTP):
+        """Close an SMTP connection, dropping it from the pool bookkeeping"""
+        self._smtp_message_counts.pop(id(smtp), None)
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+    
+    async def _acquire_smtp(self) -> aiosmtplib.SMTP:
+        """Take an SMTP connection from the pool, reconnecting stale ones"""
+        if self._smtp_slots is None:
+            self._smtp_slots = asyncio.Semaphore(self.smtp_pool_size)
+            self._smtp_idle = asyncio.Queue()
+        
+        await self._smtp_slots.acquire()
+        try:
+            while not self._smtp_idle.empty():
+                smtp = self._smtp_idle.get_nowait()
+                try:
+                    # Servers drop idle sessions; probe before reuse
+                    await smtp.noop()
+                    return smtp
+                except Exception:
+                    await self._close_smtp(smtp)
             
-            logger.info(f"Email sent successfully to {to_emails}")
-            return True
+            return await self._connect_smtp()
             
-        except Exception as e:
-            logger.error(f"Failed to send email: {e}")
-            return False
+        except Exception:
+            self._smtp_slots.release()
+            raise
+    
+    async def _release_smtp(
+        self,
+        smtp: aiosmtplib.SMTP,
+        messages_sent: int = 1,
+        reusable: bool = True
+    ):
+        """Return an SMTP connection to the pool, recycling it after the message cap"""
+        try:
+            message_count = self._smtp_message_counts.get(id(smtp), 0) + messages_sent
+            if (
+                reusable
+                and smtp.is_connected
+                and message_count < self.smtp_max_messages_per_connection
+            ):
+                self._smtp_message_counts[id(smtp)] = message_count
+                self._smtp_idle.put_nowait(smtp)
+            else:
+                await self._close_smtp(smtp)
+        finally:
+            self._smtp_slots.release()
     
-    def _add_attachment(self, msg: MIMEMultipart, attachment: Dict[str, Any]):
-        """Add attachment to email message"""
+    async def close(self):
+        """Flush pending alerts, emails and audit events, then close pooled connections and the HTTP session"""
+        for task in list(self._alert_tasks):
+            task.cancel()
+        for key in list(self._alert_cache):
+            first_seen, messages = self._alert_cache.pop(key)
+            await self._send_alert_summary(key, first_seen, messages)
+        
+        if self._flusher_task is not None:
+            if not self._flusher_task.done():
+                self._email_queue.put_nowait(_QUEUE_STOP)
+                await asyncio.gather(self._flusher_task, return_exceptions=True)
+            self._flusher_task = None
+        
+        # Emails beyond the flusher's last batch
+        if self._email_queue is not None:
+            while not self._email_queue.empty():
+                await self._send_queued_batch(
+                    self._drain_email_queue(self.smtp_max_messages_per_connection)
+                )
+        
+        if self._audit_task is not None:
+            if not self._audit_task.done():
+                # Waits for room if the queue is full; the worker is draining it
+                await self._audit_queue.put(_QUEUE_STOP)
+                await asyncio.gather(self._audit_task, return_exceptions=True)
+            self._audit_task = None
+        
+        # Events beyond the worker's last batch
+        if self._audit_queue is not None:
+            while not self._audit_queue.empty():
+                await self._run_db(
+                    self._write_audit_events,
+                    self._drain_audit_queue(_AUDIT_BATCH_SIZE)
+                )
+        
+        if self._smtp_idle is not None:
+            while not self._smtp_idle.empty():
+                await self._close_smtp(self._smtp_idle.get_nowait())
+        
+        if self._http_session is not None:
+            await self._http_session.close()
+            self._http_session = None
+    
+    async def _add_attachment(self, msg: EmailMessage, attachment: Dict[str, Any]):
+        """Add attachment to email message, encoding the file as it is read"""
         try:
             file_path = attachment.get('file_path')
             filename = attachment.get('filename')
             
             if file_path and Path(file_path).exists():
-                with open(file_path, "rb") as attachment_file:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment_file.read())
+                path = Path(file_path)
+                name = filename or path.name
+                compress = (
+                    name.lower().endswith(_COMPRESSIBLE_EXTENSIONS)
+                    and path.stat().st_size > _COMPRESS_MIN_BYTES
+                )
+                # wbits=31 writes a gzip container
+                compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+                
+                encoded_chunks = []
+                pending = b''
+                async with aiofiles.open(file_path, "rb") as attachment_file:
+                    while chunk := await attachment_file.read(_ATTACHMENT_CHUNK_SIZE):
+                        if compressor:
+                            chunk = compressor.compress(chunk)
+                        pending += chunk
+                        
+                        # Encode whole base64 lines, carrying the remainder forward
+                        whole = len(pending) - len(pending) % _BASE64_LINE_BYTES
+                        if whole:
+                            encoded_chunks.append(base64.encodebytes(pending[:whole]).decode('ascii'))
+                            pending = pending[whole:]
+                
+                if compressor:
+                    pending += compressor.flush()
+                if pending:
+                    encoded_chunks.append(base64.encodebytes(pending).decode('ascii'))
                 
-                encoders.encode_base64(part)
+                # The payload is already encoded, so the part is assembled by
+                # hand rather than with add_attachment, which would re-read it
+                part = MIMEPart()
+                part['Content-Type'] = 'application/gzip' if compress else 'application/octet-stream'
+                part['Content-Transfer-Encoding'] = 'base64'
                 part.add_header(
                     'Content-Disposition',
-                    f'attachment; filename= {filename or Path(file_path).name}'
+                    'attachment',
+                    filename=f"{name}.gz" if compress else name
                 )
+                part.set_payload(''.join(encoded_chunks))
+                
+                if msg.get_content_type() != 'multipart/mixed':
+                    msg.make_mixed()
                 msg.attach(part)
                 
         except Exception as e:
             logger.error(f"Failed to add attachment {attachment}: {e}")
     
+    async def _get_http(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=200,
+                    limit_per_host=50,
+                    ttl_dns_cache=300,
+                    enable_cleanup_closed=True
+                ),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+        return self._http_session
+    
     async def send_sms(
         self,
         to_numbers: List[str],
@@ -138,23 +716,37 @@ class NotificationService:
             # Authentication
             auth = aiohttp.BasicAuth(self.twilio_account_sid, self.twilio_auth_token)
             
-            async with aiohttp.ClientSession(auth=auth) as session:
-                for phone_number in to_numbers:
-                    data = {
-                        'From': self.twilio_from_number,
-                        'To': phone_number,
-                        'Body': message
-                    }
-                    
-                    async with session.post(url, data=data) as response:
+            session = await self._get_http()
+            if self._sms_sem is None:
+                self._sms_sem = asyncio.Semaphore(self.sms_max_concurrency)
+            
+            async def _post_one(phone_number: str) -> bool:
+                data = {
+                    'From': self.twilio_from_number,
+                    'To': phone_number,
+                    'Body': message
+                }
+                
+                async with self._sms_sem:
+                    async with session.post(url, data=data, auth=auth) as response:
                         if response.status == 201:
                             logger.info(f"SMS sent successfully to {phone_number}")
-                        else:
-                            error_text = await response.text()
-                            logger.error(f"Failed to send SMS to {phone_number}: {error_text}")
-                            return False
+                            return True
+                        
+                        error_text = await response.text()
+                        logger.error(f"Failed to send SMS to {phone_number}: {error_text}")
+                        return False
             
-            return True
+            results = await asyncio.gather(
+                *(_post_one(phone_number) for phone_number in to_numbers),
+                return_exceptions=True
+            )
+            
+            for phone_number, result in zip(to_numbers, results):
+                if isinstance(result, Exception):
+                    logger.error(f"Failed to send SMS to {phone_number}: {result}")
+            
+            return all(result is True for result in results)
             
         except Exception as e:
             logger.error(f"Failed to send SMS: {e}")
@@ -174,12 +766,13 @@ class NotificationService:
         subject = f"Document Processing {'Complete' if processing_status == 'completed' else 'Failed'} - {document_name}"
         
         if processing_status == "completed":
+            processing_seconds = f"{processing_time:.1f}"
             body = f"""
 Document Processing Complete
 
 Document: {document_name}
 Status: Successfully processed
-Processing Time: {processing_time:.1f} seconds
+Processing Time: {processing_seconds} seconds
 Document ID: {document_id}
 
 The document has been processed and is now available for queries.
@@ -188,26 +781,11 @@ You can start asking questions about this health plan document.
 Best regards,
 SmartSPD Team
 """
-            html_body = f"""
-<html>
-<body>
-    <h2>✅ Document Processing Complete</h2>
-    
-    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 10px 0;">
-        <p><strong>Document:</strong> {document_name}</p>
-        <p><strong>Status:</strong> <span style="color: green;">Successfully processed</span></p>
-        <p><strong>Processing Time:</strong> {processing_time:.1f} seconds</p>
-        <p><strong>Document ID:</strong> {document_id}</p>
-    </div>
-    
-    <p>The document has been processed and is now available for queries.</p>
-    <p>You can start asking questions about this health plan document.</p>
-    
-    <hr>
-    <p><em>Best regards,<br>SmartSPD Team</em></p>
-</body>
-</html>
-"""
+            html_body = _DOC_PROCESSED_HTML.substitute(
+                document_name=document_name,
+                processing_time=processing_seconds,
+                document_id=document_id
+            )
         else:
             body = f"""
 Document Processing Failed
@@ -221,33 +799,20 @@ There was an issue processing your document. Please try uploading again or conta
 Best regards,
 SmartSPD Team
 """
-            html_body = f"""
-<html>
-<body>
-    <h2>❌ Document Processing Failed</h2>
-    
-    <div style="background: #fef2f2; padding: 15px; border-radius: 5px; margin: 10px 0;">
-        <p><strong>Document:</strong> {document_name}</p>
-        <p><strong>Status:</strong> <span style="color: red;">Processing failed</span></p>
-        <p><strong>Document ID:</strong> {document_id}</p>
-    </div>
-    
-    <p>There was an issue processing your document. Please try uploading again or contact support.</p>
-    
-    <hr>
-    <p><em>Best regards,<br>SmartSPD Team</em></p>
-</body>
-</html>
-"""
+            html_body = _DOC_FAILED_HTML.substitute(
+                document_name=document_name,
+                document_id=document_id
+            )
         
-        await self.send_email([user_email], subject, body, html_body)
+        await self.queue_email([user_email], subject, body, html_body)
         
         # Log notification
-        await AuditService.log_system_event(
-            db=db,
-            tpa_id=None,
+        self._queue_audit(
+            tpa_id="system",
             action="notification_sent",
-            description=f"Document processing notification sent to {user_email}",
+            resource_type="system",
+            description=f"System event: Document processing notification sent to {user_email}",
+            severity="medium",
             metadata={
                 "document_id": document_id,
                 "notification_type": "email",
@@ -255,6 +820,76 @@ SmartSPD Team
             }
         )
     
+    def _queue_audit(self, **event: Any):
+        """Queue an audit event (log_event keyword arguments) for the background writer"""
+        if self._audit_queue is None:
+            self._audit_queue = asyncio.Queue(maxsize=_AUDIT_QUEUE_SIZE)
+        
+        try:
+            self._audit_queue.put_nowait(event)
+        except asyncio.QueueFull:
+            logger.warning(f"Audit queue full, dropping {event['action']} event")
+            return
+        
+        if self._audit_task is None or self._audit_task.done():
+            self._audit_task = asyncio.create_task(self._audit_worker())
+    
+    def _drain_audit_queue(self, limit: int) -> List[Dict[str, Any]]:
+        """Take up to limit queued audit events without waiting"""
+        events = []
+        while len(events) < limit and not self._audit_queue.empty():
+            events.append(self._audit_queue.get_nowait())
+        return events
+    
+    async def _audit_worker(self):
+        """Background worker writing queued audit events in batches until it takes the stop sentinel"""
+        while True:
+            first = await self._audit_queue.get()
+            if first is _QUEUE_STOP:
+                return
+            
+            await asyncio.sleep(_AUDIT_BATCH_WINDOW)
+            events, stopping = _without_stop([first] + self._drain_audit_queue(_AUDIT_BATCH_SIZE - 1))
+            
+            try:
+                await self._run_db(self._write_audit_events, events)
+            except Exception as e:
+                logger.error(f"Failed to write {len(events)} audit events: {e}")
+            
+            if stopping:
+                return
+    
+    @staticmethod
+    def _write_audit_events(events: List[Dict[str, Any]]):
+        """Write audit events in one commit on a dedicated session"""
+        with get_db_context() as db:
+            AuditService.log_events(db, events)
+    
+    @staticmethod
+    async def _run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking database call in a worker thread"""
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    
+    async def _get_admin_emails(self, db: Session, tpa_id: Optional[str] = _ANY_TPA) -> List[str]:
+        """Get active admin and manager emails, for one TPA or all, cached briefly"""
+        cached = self._admin_cache.get(tpa_id)
+        if cached and time.monotonic() - cached[0] < self.admin_email_cache_seconds:
+            return cached[1]
+        
+        # Only the email column is loaded; no User objects are built
+        query = db.query(User.email).filter(
+            User.role.in_(_ADMIN_ROLES),
+            User.is_active == True
+        )
+        if tpa_id != _ANY_TPA:
+            query = query.filter(User.tpa_id == tpa_id)
+        
+        rows = await self._run_db(query.all)
+        emails = [row.email for row in rows]
+        
+        self._admin_cache[tpa_id] = (time.monotonic(), emails)
+        return emails
+    
     async def notify_system_alert(
         self,
         db: Session,
@@ -267,38 +902,52 @@ SmartSPD Team
         
         if not admin_emails:
             # Get admin users from database
-            admin_users = db.query(User).filter(
-                User.role.in_(["tpa_admin", "cs_manager"]),
-                User.is_active == True
-            ).all()
-            admin_emails = [user.email for user in admin_users]
+            admin_emails = await self._get_admin_emails(db)
         
         if not admin_emails:
             logger.warning("No admin emails found for system alert")
             return
         
-        severity_colors = {
-            "low": "#10b981",      # Green
-            "medium": "#f59e0b",   # Yellow
-            "high": "#ef4444",     # Red
-            "critical": "#dc2626"  # Dark red
-        }
+        coalesced = SEVERITY_RANKS.get(severity, 1) < SEVERITY_RANKS.get(self.alert_bypass_severity, 2)
+        if coalesced:
+            self._coalesce_alert(alert_type, message, severity, admin_emails)
+        else:
+            subject, body, html_body = self._build_system_alert(alert_type, message, severity)
+            await self.queue_email(admin_emails, subject, body, html_body)
         
-        severity_icons = {
-            "low": "ℹ️",
-            "medium": "⚠️", 
-            "high": "🚨",
-            "critical": "🔥"
-        }
+        # Log alert notification
+        self._queue_audit(
+            tpa_id="system",
+            action="system_alert_sent",
+            resource_type="system",
+            description=f"System event: System alert sent: {alert_type}",
+            severity=severity,
+            metadata={
+                "alert_type": alert_type,
+                "recipients": len(admin_emails),
+                "notification_type": "email",
+                "coalesced": coalesced
+            }
+        )
+    
+    def _build_system_alert(
+        self,
+        alert_type: str,
+        message: str,
+        severity: str
+    ) -> Tuple[str, str, str]:
+        """Build subject, text and HTML bodies for a system alert"""
         
-        subject = f"{severity_icons.get(severity, '🔔')} SmartSPD System Alert - {alert_type}"
+        icon = SEVERITY_ICONS.get(severity, _DEFAULT_SEVERITY_ICON)
+        timestamp = datetime.now(timezone.utc).strftime(_TIMESTAMP_FORMAT)
+        subject = f"{icon} SmartSPD System Alert - {alert_type}"
         
         body = f"""
 SmartSPD System Alert
 
 Alert Type: {alert_type}
 Severity: {severity.upper()}
-Time: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
+Time: {timestamp}
 
 Message:
 {message}
@@ -308,45 +957,81 @@ Please review the system and take appropriate action if necessary.
 SmartSPD Monitoring System
 """
         
-        html_body = f"""
-<html>
-<body>
-    <h2>{severity_icons.get(severity, '🔔')} SmartSPD System Alert</h2>
+        html_body = _SYSTEM_ALERT_HTML.substitute(
+            icon=icon,
+            color=SEVERITY_COLORS.get(severity, _DEFAULT_SEVERITY_COLOR),
+            alert_type=alert_type,
+            severity=severity.upper(),
+            timestamp=timestamp,
+            message=message
+        )
+        
+        return subject, body, html_body
     
-    <div style="background: #f9fafb; padding: 15px; border-radius: 5px; border-left: 4px solid {severity_colors.get(severity, '#6b7280')}; margin: 10px 0;">
-        <p><strong>Alert Type:</strong> {alert_type}</p>
-        <p><strong>Severity:</strong> <span style="color: {severity_colors.get(severity, '#6b7280')}; font-weight: bold;">{severity.upper()}</span></p>
-        <p><strong>Time:</strong> {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}</p>
-    </div>
+    def _coalesce_alert(
+        self,
+        alert_type: str,
+        message: str,
+        severity: str,
+        admin_emails: List[str]
+    ):
+        """Add an alert to each recipient's open window, opening one if needed"""
+        for email in admin_emails:
+            key = (alert_type, severity, email)
+            entry = self._alert_cache.get(key)
+            if entry:
+                entry[1].append(message)
+                continue
+            
+            self._alert_cache[key] = (time.time(), [message])
+            task = asyncio.create_task(self._flush_alerts(key))
+            self._alert_tasks.add(task)
+            task.add_done_callback(self._alert_tasks.discard)
     
-    <div style="background: #f3f4f6; padding: 15px; border-radius: 5px; margin: 10px 0;">
-        <h3>Message:</h3>
-        <p>{message}</p>
-    </div>
+    def _alert_within_rate_limit(self, email: str) -> bool:
+        """Record an alert email to a recipient if under the per-minute limit"""
+        now = time.monotonic()
+        sent = self._alert_send_times.setdefault(email, deque())
+        while sent and now - sent[0] > 60:
+            sent.popleft()
+        
+        if len(sent) >= self.alert_rate_limit_per_minute:
+            return False
+        
+        sent.append(now)
+        return True
     
-    <p>Please review the system and take appropriate action if necessary.</p>
+    async def _flush_alerts(self, key: Tuple[str, str, str]):
+        """Send the coalesced alerts for a key once its window closes"""
+        await asyncio.sleep(self.alert_coalesce_seconds)
+        
+        # Over the rate limit the window stays open and keeps accumulating
+        while not self._alert_within_rate_limit(key[2]):
+            logger.warning(f"Alert rate limit reached for {key[2]}, deferring {key[0]} summary")
+            await asyncio.sleep(self.alert_coalesce_seconds)
+        
+        first_seen, messages = self._alert_cache.pop(key)
+        await self._send_alert_summary(key, first_seen, messages)
     
-    <hr>
-    <p><em>SmartSPD Monitoring System</em></p>
-</body>
-</html>
-"""
+    async def _send_alert_summary(
+        self,
+        key: Tuple[str, str, str],
+        first_seen: float,
+        messages: List[str]
+    ):
+        """Queue one email summarizing the alerts collected for a key"""
+        alert_type, severity, email = key
         
-        await self.send_email(admin_emails, subject, body, html_body)
+        if len(messages) == 1:
+            message = messages[0]
+        else:
+            since = datetime.fromtimestamp(first_seen, timezone.utc).strftime('%H:%M:%S UTC')
+            message = f"{len(messages)} alerts of this type were raised since {since}:\n\n" + "\n".join(
+                f"- {alert_message}" for alert_message in messages
+            )
         
-        # Log alert notification
-        await AuditService.log_system_event(
-            db=db,
-            tpa_id=None,
-            action="system_alert_sent",
-            description=f"System alert sent: {alert_type}",
-            severity=severity,
-            metadata={
-                "alert_type": alert_type,
-                "recipients": len(admin_emails),
-                "notification_type": "email"
-            }
-        )
+        subject, body, html_body = self._build_system_alert(alert_type, message, severity)
+        await self.queue_email([email], subject, body, html_body)
     
     async def notify_user_activity_alert(
         self,
@@ -359,32 +1044,28 @@ SmartSPD Monitoring System
         """Send user activity alerts to managers"""
         
         # Get user info
-        user = db.query(User).filter(User.id == user_id).first()
+        user = await self._run_db(lambda: db.query(User).filter(User.id == user_id).first())
         if not user:
             logger.error(f"User not found for activity alert: {user_id}")
             return
         
         if not manager_emails:
             # Get managers for the user's TPA
-            managers = db.query(User).filter(
-                User.tpa_id == user.tpa_id,
-                User.role.in_(["tpa_admin", "cs_manager"]),
-                User.is_active == True
-            ).all()
-            manager_emails = [manager.email for manager in managers]
+            manager_emails = await self._get_admin_emails(db, user.tpa_id)
         
         if not manager_emails:
             logger.warning(f"No manager emails found for user activity alert: {user_id}")
             return
         
         subject = f"User Activity Alert - {user.first_name} {user.last_name}"
+        timestamp = datetime.now(timezone.utc).strftime(_TIMESTAMP_FORMAT)
         
         body = f"""
 User Activity Alert
 
 User: {user.first_name} {user.last_name} ({user.email})
 Alert Type: {alert_type}
-Time: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
+Time: {timestamp}
 
 Details:
 {details}
@@ -394,38 +1075,23 @@ Please review the user's activity and take appropriate action if necessary.
 SmartSPD User Activity Monitoring
 """
         
-        html_body = f"""
-<html>
-<body>
-    <h2>👤 User Activity Alert</h2>
-    
-    <div style="background: #fef3c7; padding: 15px; border-radius: 5px; border-left: 4px solid #f59e0b; margin: 10px 0;">
-        <p><strong>User:</strong> {user.first_name} {user.last_name} ({user.email})</p>
-        <p><strong>Alert Type:</strong> {alert_type}</p>
-        <p><strong>Time:</strong> {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}</p>
-    </div>
-    
-    <div style="background: #f3f4f6; padding: 15px; border-radius: 5px; margin: 10px 0;">
-        <h3>Details:</h3>
-        <p>{details}</p>
-    </div>
-    
-    <p>Please review the user's activity and take appropriate action if necessary.</p>
-    
-    <hr>
-    <p><em>SmartSPD User Activity Monitoring</em></p>
-</body>
-</html>
-"""
+        html_body = _USER_ACTIVITY_HTML.substitute(
+            user_name=f"{user.first_name} {user.last_name}",
+            user_email=user.email,
+            alert_type=alert_type,
+            timestamp=timestamp,
+            details=details
+        )
         
         await self.send_email(manager_emails, subject, body, html_body)
         
         # Log activity alert notification
-        await AuditService.log_security_event(
-            db=db,
+        self._queue_audit(
             tpa_id=user.tpa_id,
             action="user_activity_alert_sent",
-            description=f"User activity alert sent for {user.email}: {alert_type}",
+            resource_type="security",
+            description=f"Security event: User activity alert sent for {user.email}: {alert_type}",
+            severity="high",
             user_id=user_id,
             metadata={
                 "alert_type": alert_type,
@@ -466,37 +1132,16 @@ Best regards,
 SmartSPD Team
 """
         
-        html_body = f"""
-<html>
-<body>
-    <h2>🎉 Welcome to SmartSPD!</h2>
-    
-    <p>Dear {user_name},</p>
-    
-    <p>Welcome to SmartSPD, your AI-powered health plan assistant. Your account has been created and you can now access the system.</p>
-    
-    <div style="background: #eff6ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <h3>Login Information:</h3>
-        <p><strong>Email:</strong> {user_email}</p>
-        {"<p><strong>Temporary Password:</strong> " + temporary_password + "</p>" if temporary_password else "<p><strong>Password:</strong> Please use the password provided by your administrator</p>"}
-    </div>
-    
-    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <h3>Getting Started:</h3>
-        <ol>
-            <li>Log in to the SmartSPD dashboard</li>
-            <li>Upload your health plan documents</li>
-            <li>Start asking questions about benefits and coverage</li>
-        </ol>
-    </div>
-    
-    <p>If you need help, please contact your administrator or visit our help documentation.</p>
-    
-    <hr>
-    <p><em>Best regards,<br>SmartSPD Team</em></p>
-</body>
-</html>
-"""
+        if temporary_password:
+            password_html = f"<p><strong>Temporary Password:</strong> {temporary_password}</p>"
+        else:
+            password_html = "<p><strong>Password:</strong> Please use the password provided by your administrator</p>"
+        
+        html_body = _WELCOME_HTML.substitute(
+            user_name=user_name,
+            user_email=user_email,
+            password_html=password_html
+        )
         
         await self.send_email([user_email], subject, body, html_body)
     
@@ -510,12 +1155,13 @@ SmartSPD Team
         """Send audit compliance report to administrators"""
         
         subject = f"SmartSPD Audit Compliance Report - {report_period}"
+        generated = datetime.now(timezone.utc).strftime(_TIMESTAMP_FORMAT)
         
         body = f"""
 SmartSPD Audit Compliance Report
 
 Report Period: {report_period}
-Generated: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}
+Generated: {generated}
 
 Summary:
 - Total Activities: {report_data.get('total_activities', 0)}
@@ -529,44 +1175,25 @@ Please review the attached detailed report for compliance purposes.
 SmartSPD Compliance Team
 """
         
-        html_body = f"""
-<html>
-<body>
-    <h2>📊 SmartSPD Audit Compliance Report</h2>
-    
-    <div style="background: #f8fafc; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <p><strong>Report Period:</strong> {report_period}</p>
-        <p><strong>Generated:</strong> {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}</p>
-    </div>
-    
-    <div style="background: #f0f9ff; padding: 15px; border-radius: 5px; margin: 15px 0;">
-        <h3>Summary:</h3>
-        <ul>
-            <li><strong>Total Activities:</strong> {report_data.get('total_activities', 0):,}</li>
-            <li><strong>Successful Activities:</strong> {report_data.get('successful_activities', 0):,}</li>
-            <li><strong>Failed Activities:</strong> {report_data.get('failed_activities', 0):,}</li>
-            <li><strong>Success Rate:</strong> {report_data.get('success_rate', 0):.1%}</li>
-            <li><strong>Security Events:</strong> {report_data.get('security_events', 0):,}</li>
-        </ul>
-    </div>
-    
-    <p>Please review the attached detailed report for compliance purposes.</p>
-    
-    <hr>
-    <p><em>SmartSPD Compliance Team</em></p>
-</body>
-</html>
-"""
+        html_body = _COMPLIANCE_REPORT_HTML.substitute(
+            report_period=report_period,
+            generated=generated,
+            total_activities=f"{report_data.get('total_activities', 0):,}",
+            successful_activities=f"{report_data.get('successful_activities', 0):,}",
+            failed_activities=f"{report_data.get('failed_activities', 0):,}",
+            success_rate=f"{report_data.get('success_rate', 0):.1%}",
+            security_events=f"{report_data.get('security_events', 0):,}"
+        )
         
         await self.send_email(recipient_emails, subject, body, html_body)
         
         # Log compliance report notification
-        await AuditService.log_admin_action(
-            db=db,
-            user_id=None,
-            tpa_id=None,
-            action="compliance_report_sent",
-            description=f"Audit compliance report sent for period: {report_period}",
+        self._queue_audit(
+            tpa_id="system",
+            action="admin_action",
+            resource_type="system",
+            description=f"Admin action: Audit compliance report sent for period: {report_period}",
+            severity="high",
             metadata={
                 "report_period": report_period,
                 "recipients": len(recipient_emails),
@@ -574,21 +1201,23 @@ SmartSPD Compliance Team
             }
         )
 
-# Singleton instance
-notification_service = NotificationService()
+@lru_cache(maxsize=1)
+def get_notification_service() -> NotificationService:
+    """Get the shared notification service, creating it on first use"""
+    return NotificationService()
 
 # Convenience functions
 async def notify_document_processed(*args, **kwargs):
-    return await notification_service.notify_document_processed(*args, **kwargs)
+    return await get_notification_service().notify_document_processed(*args, **kwargs)
 
 async def notify_system_alert(*args, **kwargs):
-    return await notification_service.notify_system_alert(*args, **kwargs)
+    return await get_notification_service().notify_system_alert(*args, **kwargs)
 
 async def notify_user_activity_alert(*args, **kwargs):
-    return await notification_service.notify_user_activity_alert(*args, **kwargs)
+    return await get_notification_service().notify_user_activity_alert(*args, **kwargs)
 
 async def send_welcome_email(*args, **kwargs):
-    return await notification_service.send_welcome_email(*args, **kwargs)
+    return await get_notification_service().send_welcome_email(*args, **kwargs)
 
 async def send_audit_compliance_report(*args, **kwargs):
-    return await notification_service.send_audit_compliance_report(*args, **kwargs)
\ No newline at end of file
+    return await get_notification_service().send_audit_compliance_report(*args, **kwargs)
\ No newline at end of file
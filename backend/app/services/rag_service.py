@@ -2,15 +2,24 @@
 Advanced RAG (Retrieval-Augmented Generation) service for health plan queries
 """
 import asyncio
+import heapq
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
+import operator
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from dataclasses import dataclass
 import json
 import re
+from string import Template
+
+import numpy as np
+import xxhash
+from async_lru import alru_cache
+from pydantic import BaseModel
 
 from app.core.config import settings
 from app.core.exceptions import AIServiceError
-from app.services.ai_service import ai_service
+from app.services.ai_service import ai_batcher, ai_service
 from app.services.vector_service import VectorService
 from app.services.knowledge_graph_service import KnowledgeGraphService
 from app.crud.document import document_chunk_crud
@@ -19,6 +28,359 @@ from app.core.database import get_db
 
 logger = logging.getLogger(__name__)
 
+# Intent keywords, in priority order; these match at the start of a word
+_INTENT_KEYWORDS = {
+    'cost': ('cost', 'pay', 'copay', 'deductible', 'price', '$'),
+    'coverage': ('cover', 'covered', 'coverage', 'benefit'),
+    'network': ('network', 'provider', 'doctor', 'hospital'),
+    'authorization': ('authorization', 'referral', 'approval'),
+    'claims': ('claim', 'billing', 'reimburse')
+}
+
+# Keywords marking a comparison query; these match at the start of a word
+_COMPARISON_KEYWORDS = ('compare', 'difference', 'better', 'vs', 'versus')
+
+# Keywords marking a member-specific query; these match whole words only
+_MEMBER_KEYWORDS = ('my', 'i', 'me')
+
+# Benefit keywords mapped to the benefit type they indicate
+_BENEFIT_KEYWORDS = {
+    'primary care': 'primary_care',
+    'pcp': 'primary_care',
+    'family doctor': 'primary_care',
+    'specialist': 'specialist',
+    'specialty': 'specialist',
+    'emergency': 'emergency',
+    'er': 'emergency',
+    'emergency room': 'emergency',
+    'urgent care': 'urgent_care',
+    'prescription': 'prescription',
+    'drug': 'prescription',
+    'medication': 'prescription',
+    'pharmacy': 'prescription',
+    'hospital': 'hospital',
+    'inpatient': 'hospital',
+    'preventive': 'preventive',
+    'wellness': 'preventive',
+    'physical': 'preventive',
+    'checkup': 'preventive'
+}
+_BENEFIT_TYPE_ORDER = tuple(dict.fromkeys(_BENEFIT_KEYWORDS.values()))
+
+_WORD_START = r'(?<![a-z])'
+_WORD_END = r'(?![a-z])'
+
+
+def _build_keyword_matcher() -> Tuple[re.Pattern, Dict[str, Tuple[Tuple[str, str], ...]]]:
+    """Build one regex over every analysis keyword, plus the (category, label) payloads per match group"""
+    
+    # keyword -> (suffix pattern, payloads)
+    entries: Dict[str, Tuple[str, List[Tuple[str, str]]]] = {}
+    
+    def add(keyword: str, suffix: str, payload: Tuple[str, str]):
+        existing_suffix, payloads = entries.get(keyword, (suffix, []))
+        # A keyword in several categories keeps the looser (prefix) match
+        entries[keyword] = ('' if '' in (existing_suffix, suffix) else suffix, payloads + [payload])
+    
+    for intent, keywords in _INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            add(keyword, '', ('intent', intent))
+    for keyword in _COMPARISON_KEYWORDS:
+        add(keyword, '', ('comparison', 'complex'))
+    for keyword in _MEMBER_KEYWORDS:
+        add(keyword, _WORD_END, ('member', 'member'))
+    for keyword, benefit_type in _BENEFIT_KEYWORDS.items():
+        add(keyword, 's?' + _WORD_END, ('benefit', benefit_type))
+    
+    # Matches never overlap, so a phrase also carries the payloads of its words
+    for keyword, (_, payloads) in entries.items():
+        if ' ' in keyword:
+            for word in keyword.split():
+                if word in entries:
+                    payloads.extend(entries[word][1])
+    
+    # Longest first so phrases win over their leading word
+    ordered = sorted(entries, key=len, reverse=True)
+    pattern = re.compile('|'.join(
+        f'(?P<k{i}>{_WORD_START}{re.escape(keyword)}{entries[keyword][0]})'
+        for i, keyword in enumerate(ordered)
+    ))
+    payloads = {f'k{i}': tuple(dict.fromkeys(entries[keyword][1])) for i, keyword in enumerate(ordered)}
+    return pattern, payloads
+
+
+_KEYWORD_PATTERN, _KEYWORD_PAYLOADS = _build_keyword_matcher()
+
+# Queries up to this many words with a clear intent skip the AI analysis;
+# the intent is clear when it takes at least this share of intent matches
+_FAST_PATH_MAX_WORDS = 12
+_LOCAL_MIN_INTENT_CONFIDENCE = 0.7
+
+# Intents whose answers combine SPD rules with BPS amounts, so pattern-only
+# analyses cross-reference both document types for them
+_CROSS_REFERENCE_INTENTS = frozenset({'cost', 'coverage'})
+
+# Query type implied by each intent when there is no AI analysis
+_INTENT_QUERY_TYPES = {
+    'cost': 'cost_calculation',
+    'coverage': 'coverage_verification'
+}
+
+# Weight of the retrieval score in a result's rank, small enough that it
+# only breaks ties between equal confidences
+_SCORE_RANK_WEIGHT = 0.01
+
+# The database search is skipped when vector search returns at least this
+# many hits all scoring at least this high
+_VECTOR_SUFFICIENT_HITS = 8
+_VECTOR_SUFFICIENT_SCORE = 0.8
+
+# Vector hits needed to start a speculative response before the slower
+# retrieval stages finish
+_PRELIMINARY_MIN_CHUNKS = 3
+
+# Log labels for the retrieval stages run by _retrieve_information_stream
+_RETRIEVAL_STAGE_LABELS = {
+    'vector': "Vector search",
+    'kg': "Knowledge graph search",
+    'cross_ref': "Cross-reference search",
+    'db': "Database search"
+}
+
+# Token budget for retrieved chunk text in the response prompt, shared
+# across the top chunks in proportion to their confidence
+_CONTEXT_TOKEN_BUDGET = 2800
+_CONTEXT_CHUNK_COUNT = 5
+
+# Expert system prompt shared by every response prompt
+_EXPERT_PROMPT = """
+You are a highly experienced health insurance expert with over 30 years of experience in TPA operations and customer service. You understand complex health plan benefits, coverage details, and member needs deeply.
+
+Your role is to provide accurate, professional, and helpful responses to health plan questions based on the provided documents and context. You should:
+
+1. Always reference specific document sources when providing information
+2. Use professional but approachable language suitable for customer service agents
+3. Provide clear, actionable answers that agents can communicate to members
+4. Include relevant costs, coverage details, and any limitations or exclusions
+5. Mention if prior authorization or referrals are required
+6. Distinguish between in-network and out-of-network coverage when relevant
+7. If information is unclear or missing, explicitly state this rather than guessing
+
+Response format:
+- Start with a direct answer to the question
+- Provide specific details (costs, coverage percentages, etc.)
+- Include any important limitations or exclusions
+- End with source references and confidence level
+
+Remember: Accuracy is paramount. It's better to say "I don't have enough information" than to provide incorrect details.
+"""
+
+# Prompt templates, compiled once
+_ANALYSIS_TEMPLATE = Template("""
+You are an expert healthcare benefits analyst. Analyze this health insurance query and extract detailed information:
+
+Query: "$query"
+
+Extract the following information in JSON format:
+{
+    "intent": "coverage|cost|network|authorization|claims|general",
+    "complexity": "simple|medium|complex",
+    "entities": ["entity1", "entity2"],
+    "benefit_types": ["primary_care", "specialist", "emergency", "prescription", "preventive", "mental_health", "hospital", "urgent_care"],
+    "keywords": ["keyword1", "keyword2"],
+    "requires_calculation": boolean,
+    "member_specific": boolean,
+    "document_types_needed": ["spd", "bps", "both"],
+    "query_type": "benefit_lookup|cost_calculation|coverage_verification|comparison|procedure_coverage",
+    "healthcare_entities": {
+        "medical_procedures": [],
+        "medications": [],
+        "providers": [],
+        "body_parts": [],
+        "conditions": [],
+        "amounts": []
+    },
+    "cross_reference_needed": boolean,
+    "confidence_level": "high|medium|low"
+}
+
+Be thorough in extracting healthcare-specific entities and determining if cross-referencing between SPD and BPS documents is needed.
+""")
+
+_CONNECTION_TEMPLATE = Template("""
+Find connections between these SPD (Summary Plan Description) and BPS (Benefit Payment Schedule) sections:
+
+SPD Sections:
+$spd_sections
+
+BPS Sections:
+$bps_sections
+
+Query: $keywords
+
+Identify which SPD rules correspond to which BPS amounts. Return as JSON:
+{
+    "connections": [
+        {
+            "spd_section": "SPD-1",
+            "bps_section": "BPS-1",
+            "connection_type": "coverage_amount|copay|deductible|coinsurance",
+            "combined_content": "Combined explanation...",
+            "confidence": 0.85
+        }
+    ]
+}
+""")
+
+# Constant system message for response generation; only the user message
+# changes per query, so the shared prefix stays eligible for prompt caching
+_RESPONSE_SYSTEM_PROMPT = _EXPERT_PROMPT + """
+The user message is JSON: "q" is the question; "intent", "complexity", "type", "entities" and "xref" (cross-referencing needed) describe it; "history" holds earlier conversation; "ctx" lists retrieved document excerpts with an "id", source ("src") and page ("pg").
+
+Work through the question step by step: identify the benefit asked about, find the relevant excerpts, connect SPD rules with BPS amounts when xref is true, and verify the answer against the excerpts. Include exact costs, percentages or coverage amounts; limitations, exclusions and requirements such as deductibles or prior authorization; in-network vs out-of-network differences; and source references with page numbers. Suggest 2-3 follow-up questions members commonly ask.
+
+Respond with JSON only:
+{"answer": "...", "reasoning": "...", "confidence_level": "High|Medium|Low", "related_topics": ["..."], "follow_up_suggestions": ["...?"], "requires_clarification": boolean, "cross_referenced_data": {"spd_rules": "...", "bps_amounts": "..."}}
+"""
+
+
+class QueryAnalysis(BaseModel):
+    """Expected shape of the AI query analysis"""
+    model_config = {'extra': 'allow'}
+    
+    intent: str
+    complexity: str
+    entities: List[str] = []
+    benefit_types: List[str] = []
+    keywords: List[str] = []
+    requires_calculation: bool = False
+    member_specific: bool = False
+    document_types_needed: List[str] = []
+    query_type: str = 'general'
+    healthcare_entities: Dict[str, List[Any]] = {}
+    cross_reference_needed: bool = False
+    confidence_level: str = 'medium'
+
+class CrossRefConnection(BaseModel):
+    """One SPD/BPS connection found by the AI"""
+    spd_section: str
+    bps_section: str
+    connection_type: str
+    combined_content: str
+    confidence: float
+
+class CrossRefConnections(BaseModel):
+    """Expected shape of the SPD/BPS connection response"""
+    connections: List[CrossRefConnection] = []
+
+class GenerationResponse(BaseModel):
+    """Expected shape of the generated answer"""
+    model_config = {'extra': 'allow'}
+    
+    answer: str
+    reasoning: str = ''
+    confidence_level: str = 'Medium'
+    related_topics: List[str] = []
+    follow_up_suggestions: List[str] = []
+    requires_clarification: bool = False
+    cross_referenced_data: Optional[Dict[str, Any]] = None
+
+@dataclass(slots=True)
+class Source:
+    """Source reference for a retrieved chunk"""
+    type: str
+    score: float
+    document_id: Optional[str] = None
+    page_number: Optional[int] = None
+    section_title: Optional[str] = None
+    chunk_type: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Dict form for API responses, leaving out unset fields"""
+        source = {'type': self.type, 'score': self.score}
+        
+        if self.document_id:
+            source['document_id'] = self.document_id
+        
+        if self.page_number:
+            source['page_number'] = self.page_number
+        
+        if self.section_title:
+            source['section_title'] = self.section_title
+        
+        if self.chunk_type:
+            source['chunk_type'] = self.chunk_type
+        
+        return source
+
+class _AnswerStreamExtractor:
+    """Pull the "answer" string out of a JSON response while it is still streaming"""
+    
+    _ANSWER_START = re.compile(r'"answer"\s*:\s*"')
+    
+    def __init__(self):
+        self.text = ""
+        self._pos: Optional[int] = None
+        self._done = False
+    
+    def feed(self, delta: str) -> str:
+        """Add streamed content, returning any newly completed answer text"""
+        self.text += delta
+        if self._done:
+            return ""
+        
+        if self._pos is None:
+            match = self._ANSWER_START.search(self.text)
+            if not match:
+                return ""
+            self._pos = match.end()
+        
+        # Advance over whole characters and escapes, stopping at the closing quote
+        i, end = self._pos, len(self.text)
+        while i < end:
+            char = self.text[i]
+            if char == '\\':
+                step = 2
+                if self.text[i + 1:i + 2] == 'u':
+                    # A high surrogate escape needs its low half to decode
+                    step = 12 if self.text[i + 2:i + 4].lower() in ('d8', 'd9', 'da', 'db') else 6
+                if i + step > end:
+                    break
+                i += step
+            elif char == '"':
+                self._done = True
+                break
+            else:
+                i += 1
+        
+        raw, self._pos = self.text[self._pos:i], i
+        return json.loads(f'"{raw}"', strict=False) if raw else ""
+
+class _SpeculativeResponse:
+    """Response streamed ahead of time from a preliminary prompt, buffered until it is kept or dropped"""
+    
+    def __init__(self, prompt: str, events: AsyncIterator[Dict[str, Any]]):
+        self.prompt = prompt
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._buffer(events))
+    
+    async def _buffer(self, events: AsyncIterator[Dict[str, Any]]):
+        """Collect response events, marking the end with None"""
+        try:
+            async for event in events:
+                self._queue.put_nowait(event)
+        finally:
+            self._queue.put_nowait(None)
+    
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the buffered events, then the rest as they arrive"""
+        while (event := await self._queue.get()) is not None:
+            yield event
+    
+    def cancel(self):
+        """Drop the response, stopping the model call if it is still running"""
+        self._task.cancel()
+
 class RAGService:
     """Advanced RAG service for health plan question answering"""
     
@@ -26,29 +388,11 @@ class RAGService:
         self.vector_service = VectorService()
         self.kg_service = KnowledgeGraphService()
         self.ai_service = ai_service
+        self.batcher = ai_batcher
+        self._enc = ai_service.get_encoding("gpt-4")
         
         # Expert system prompt
-        self.expert_prompt = """
-        You are a highly experienced health insurance expert with over 30 years of experience in TPA operations and customer service. You understand complex health plan benefits, coverage details, and member needs deeply.
-
-        Your role is to provide accurate, professional, and helpful responses to health plan questions based on the provided documents and context. You should:
-
-        1. Always reference specific document sources when providing information
-        2. Use professional but approachable language suitable for customer service agents
-        3. Provide clear, actionable answers that agents can communicate to members
-        4. Include relevant costs, coverage details, and any limitations or exclusions
-        5. Mention if prior authorization or referrals are required
-        6. Distinguish between in-network and out-of-network coverage when relevant
-        7. If information is unclear or missing, explicitly state this rather than guessing
-
-        Response format:
-        - Start with a direct answer to the question
-        - Provide specific details (costs, coverage percentages, etc.)
-        - Include any important limitations or exclusions
-        - End with source references and confidence level
-
-        Remember: Accuracy is paramount. It's better to say "I don't have enough information" than to provide incorrect details.
-        """
+        self.expert_prompt = _EXPERT_PROMPT
     
     async def process_query(
         self,
@@ -60,39 +404,78 @@ class RAGService:
     ) -> Dict[str, Any]:
         """Process a health plan query and return intelligent response"""
         
+        async for event in self.process_query_stream(
+            db, query, tpa_id, health_plan_id, conversation_context
+        ):
+            if event.get('done'):
+                return event['result']
+    
+    async def process_query_stream(
+        self,
+        db: Session,
+        query: str,
+        tpa_id: str,
+        health_plan_id: Optional[str] = None,
+        conversation_context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Process a query, yielding answer text as it is generated and the full result last"""
+        
+        speculative = None
+        
         try:
-            # Analyze query intent and complexity
-            query_analysis = await self._analyze_query(query)
+            # Analyze query intent and complexity; short, clearly classified
+            # queries use the pattern analysis without an AI round-trip
+            pattern_analysis = self._pattern_based_analysis(query)
+            if self._is_fast_path_query(query, pattern_analysis):
+                query_analysis = self._fallback_analysis(query, pattern_analysis)
+            else:
+                query_analysis = await self._analyze_query(query)
             
-            # Retrieve relevant information
-            retrieval_results = await self._retrieve_information(
+            # Retrieve relevant information; early vector hits start a
+            # speculative response while the slower stages finish
+            async for retrieval_results in self._retrieve_information_stream(
                 db, query, tpa_id, health_plan_id, query_analysis
-            )
+            ):
+                if retrieval_results.get('preliminary'):
+                    speculative_prompt = self._build_response_prompt(
+                        query, retrieval_results, query_analysis, conversation_context
+                    )
+                    speculative = _SpeculativeResponse(
+                        speculative_prompt,
+                        self._stream_response(query, speculative_prompt, retrieval_results)
+                    )
             
-            # Generate AI response
-            response = await self._generate_response(
-                query, retrieval_results, query_analysis, conversation_context
-            )
+            # Generate AI response, forwarding answer text as it streams
+            response = None
+            async for event in self._generate_response_stream(
+                query, retrieval_results, query_analysis, conversation_context, speculative
+            ):
+                if event.get('done'):
+                    response = event['response']
+                else:
+                    yield event
             
             # Calculate confidence score
             confidence_score = self._calculate_confidence_score(
                 response, retrieval_results, query_analysis
             )
             
-            return {
+            yield {'done': True, 'result': {
                 'answer': response['answer'],
                 'reasoning': response.get('reasoning', ''),
                 'confidence_score': confidence_score,
                 'query_intent': query_analysis['intent'],
                 'query_complexity': query_analysis['complexity'],
-                'source_documents': retrieval_results['sources'],
+                'source_documents': [source.to_dict() for source in retrieval_results['sources']],
                 'related_topics': response.get('related_topics', []),
                 'follow_up_suggestions': response.get('follow_up_suggestions', []),
                 'processing_time': retrieval_results['processing_time'],
                 'token_count': response.get('token_count', 0)
-            }
+            }}
             
         except Exception as e:
+            if speculative is not None:
+                speculative.cancel()
             logger.error(f"RAG query processing failed: {e}")
             raise AIServiceError(f"Failed to process query: {e}", "RAG")
     
@@ -100,46 +483,8 @@ class RAGService:
         """Enhanced query analysis with healthcare-specific entity recognition"""
         
         try:
-            # Enhanced prompt with healthcare-specific guidance
-            analysis_prompt = f"""
-            You are an expert healthcare benefits analyst. Analyze this health insurance query and extract detailed information:
-            
-            Query: "{query}"
-            
-            Extract the following information in JSON format:
-            {{
-                "intent": "coverage|cost|network|authorization|claims|general",
-                "complexity": "simple|medium|complex",
-                "entities": ["entity1", "entity2"],
-                "benefit_types": ["primary_care", "specialist", "emergency", "prescription", "preventive", "mental_health", "hospital", "urgent_care"],
-                "keywords": ["keyword1", "keyword2"],
-                "requires_calculation": boolean,
-                "member_specific": boolean,
-                "document_types_needed": ["spd", "bps", "both"],
-                "query_type": "benefit_lookup|cost_calculation|coverage_verification|comparison|procedure_coverage",
-                "healthcare_entities": {{
-                    "medical_procedures": [],
-                    "medications": [],
-                    "providers": [],
-                    "body_parts": [],
-                    "conditions": [],
-                    "amounts": []
-                }},
-                "cross_reference_needed": boolean,
-                "confidence_level": "high|medium|low"
-            }}
-            
-            Be thorough in extracting healthcare-specific entities and determining if cross-referencing between SPD and BPS documents is needed.
-            """
-            
-            ai_response = await self.ai_service.chat_completion(
-                messages=[{"role": "user", "content": analysis_prompt}],
-                model="gpt-4o-mini",
-                max_tokens=500,
-                temperature=0.1
-            )
-            
-            analysis = json.loads(ai_response.content)
+            # Repeat queries reuse the cached AI analysis
+            analysis = dict(await self._ai_query_analysis(" ".join(query.lower().split())))
             
             # Add additional pattern-based analysis
             analysis.update(self._pattern_based_analysis(query))
@@ -150,66 +495,94 @@ class RAGService:
             logger.warning(f"Enhanced query analysis failed, using fallback: {e}")
             return self._fallback_analysis(query)
     
+    @alru_cache(maxsize=1024)
+    async def _ai_query_analysis(self, query: str) -> Dict[str, Any]:
+        """AI analysis of a normalized query; failures raise and are not cached"""
+        
+        # Enhanced prompt with healthcare-specific guidance
+        analysis_prompt = _ANALYSIS_TEMPLATE.substitute(query=query)
+        
+        ai_response = await self.batcher.submit(
+            messages=[{"role": "user", "content": analysis_prompt}],
+            model="gpt-4o-mini",
+            max_tokens=500,
+            temperature=0.1
+        )
+        
+        # Only fields the model returned are kept, as the analysis is merged
+        # with the pattern analysis
+        return QueryAnalysis.model_validate_json(ai_response.content).model_dump(exclude_unset=True)
+    
     def _pattern_based_analysis(self, query: str) -> Dict[str, Any]:
         """Pattern-based query analysis as fallback"""
         
-        query_lower = query.lower()
+        # Collect every keyword hit in a single pass over the query
+        found = {'intent': set(), 'comparison': set(), 'member': set(), 'benefit': set()}
+        for match in _KEYWORD_PATTERN.finditer(query.lower()):
+            for category, label in _KEYWORD_PAYLOADS[match.lastgroup]:
+                found[category].add(label)
         
         # Intent patterns
-        intent = "general"
-        if any(word in query_lower for word in ['cost', 'pay', 'copay', 'deductible', 'price', '$']):
-            intent = "cost"
-        elif any(word in query_lower for word in ['cover', 'covered', 'coverage', 'benefit']):
-            intent = "coverage"
-        elif any(word in query_lower for word in ['network', 'provider', 'doctor', 'hospital']):
-            intent = "network"
-        elif any(word in query_lower for word in ['authorization', 'referral', 'approval']):
-            intent = "authorization"
-        elif any(word in query_lower for word in ['claim', 'billing', 'reimburse']):
-            intent = "claims"
+        intent = next(
+            (candidate for candidate in _INTENT_KEYWORDS if candidate in found['intent']),
+            "general"
+        )
         
         # Complexity assessment
         complexity = "simple"
         if len(query.split()) > 15 or query.count('?') > 1:
             complexity = "medium"
-        if any(word in query_lower for word in ['compare', 'difference', 'better', 'vs', 'versus']):
+        if found['comparison']:
             complexity = "complex"
         
         # Extract benefit types
-        benefit_types = []
-        benefit_patterns = {
-            'primary_care': ['primary care', 'pcp', 'family doctor'],
-            'specialist': ['specialist', 'specialty'],
-            'emergency': ['emergency', 'er', 'emergency room'],
-            'urgent_care': ['urgent care'],
-            'prescription': ['prescription', 'drug', 'medication', 'pharmacy'],
-            'hospital': ['hospital', 'inpatient'],
-            'preventive': ['preventive', 'wellness', 'physical', 'checkup']
-        }
+        benefit_types = [
+            benefit_type for benefit_type in _BENEFIT_TYPE_ORDER if benefit_type in found['benefit']
+        ]
         
-        for benefit_type, patterns in benefit_patterns.items():
-            if any(pattern in query_lower for pattern in patterns):
-                benefit_types.append(benefit_type)
+        # Share of the matched intents taken by the chosen one; a query
+        # matching several intents is ambiguous
+        intent_confidence = 1 / len(found['intent']) if found['intent'] else 0.0
         
         return {
             'intent': intent,
+            'intent_confidence': intent_confidence,
             'complexity': complexity,
             'benefit_types': benefit_types,
-            'member_specific': any(word in query_lower for word in ['my', 'i', 'me'])
+            'member_specific': bool(found['member'])
         }
     
-    def _fallback_analysis(self, query: str) -> Dict[str, Any]:
-        """Fallback analysis when AI analysis fails"""
-        pattern_analysis = self._pattern_based_analysis(query)
+    def _is_fast_path_query(self, query: str, pattern_analysis: Dict[str, Any]) -> bool:
+        """Check whether the pattern analysis is confident enough to skip the AI analysis"""
+        return (
+            pattern_analysis['intent_confidence'] >= _LOCAL_MIN_INTENT_CONFIDENCE
+            and pattern_analysis['complexity'] != 'complex'
+            and len(query.split()) <= _FAST_PATH_MAX_WORDS
+        )
+    
+    def _fallback_analysis(
+        self,
+        query: str,
+        pattern_analysis: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Analysis built from patterns alone, used on the fast path and when AI analysis fails"""
+        if pattern_analysis is None:
+            pattern_analysis = self._pattern_based_analysis(query)
+        
+        intent = pattern_analysis.get('intent', 'general')
+        cross_reference_needed = intent in _CROSS_REFERENCE_INTENTS
         
         return {
-            'intent': pattern_analysis.get('intent', 'general'),
+            'intent': intent,
             'complexity': pattern_analysis.get('complexity', 'simple'),
             'entities': [],
             'benefit_types': pattern_analysis.get('benefit_types', []),
             'keywords': query.lower().split()[:10],  # First 10 words as keywords
             'requires_calculation': '$' in query or any(word in query.lower() for word in ['cost', 'pay', 'amount']),
-            'member_specific': pattern_analysis.get('member_specific', False)
+            'member_specific': pattern_analysis.get('member_specific', False),
+            'document_types_needed': ['both'] if cross_reference_needed else [],
+            'query_type': _INTENT_QUERY_TYPES.get(intent, 'general'),
+            'cross_reference_needed': cross_reference_needed
         }
     
     async def _retrieve_information(
@@ -222,79 +595,201 @@ class RAGService:
     ) -> Dict[str, Any]:
         """Enhanced retrieval with multi-hop traversal and cross-referencing"""
         
-        start_time = datetime.utcnow()
+        async for retrieval_results in self._retrieve_information_stream(
+            db, query, tpa_id, health_plan_id, query_analysis
+        ):
+            if not retrieval_results.get('preliminary'):
+                return retrieval_results
+    
+    async def _retrieve_information_stream(
+        self,
+        db: Session,
+        query: str,
+        tpa_id: str,
+        health_plan_id: Optional[str],
+        query_analysis: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Retrieve information, yielding preliminary vector results while slower stages run and the full results last"""
+        
+        start_ns = time.perf_counter_ns()
+        
+        complexity = query_analysis.get('complexity')
+        benefit_types = query_analysis.get('benefit_types', [])
+        stages = {}
         
         # 1. Adaptive vector search based on query complexity
-        vector_results = []
         if self.vector_service.initialized:
-            try:
-                # Adjust search parameters based on query analysis
-                top_k = 15 if query_analysis.get('complexity') == 'complex' else 10
-                score_threshold = 0.6 if query_analysis.get('complexity') == 'complex' else 0.7
-                
-                vector_results = await self.vector_service.search_similar_chunks(
-                    query=query,
-                    tpa_id=tpa_id,
-                    health_plan_id=health_plan_id,
-                    top_k=top_k,
-                    score_threshold=score_threshold
-                )
-            except Exception as e:
-                logger.warning(f"Vector search failed: {e}")
+            # Adjust search parameters based on query analysis
+            top_k = 15 if complexity == 'complex' else 10
+            score_threshold = 0.6 if complexity == 'complex' else 0.7
+            
+            # Pre-filter the index to one document type when only one is needed
+            document_types = query_analysis.get('document_types_needed') or []
+            document_type = document_types[0] if document_types in (['spd'], ['bps']) else None
+            
+            stages['vector'] = asyncio.ensure_future(self.vector_service.search_similar_chunks(
+                query=query,
+                tpa_id=tpa_id,
+                health_plan_id=health_plan_id,
+                document_type=document_type,
+                top_k=top_k,
+                score_threshold=score_threshold
+            ))
         
         # 2. Enhanced knowledge graph search with multi-hop traversal
-        kg_results = []
-        if self.kg_service.initialized and health_plan_id:
-            try:
-                benefit_types = query_analysis.get('benefit_types', [])
-                if benefit_types:
-                    # Multi-hop traversal for complex queries
-                    max_hops = 3 if query_analysis.get('complexity') == 'complex' else 1
-                    kg_results = await self.kg_service.find_related_benefits_multi_hop(
-                        health_plan_id, benefit_types, max_hops
-                    )
-            except Exception as e:
-                logger.warning(f"Knowledge graph search failed: {e}")
+        if self.kg_service.initialized and health_plan_id and benefit_types:
+            # Multi-hop traversal for complex queries
+            max_hops = 3 if complexity == 'complex' else 1
+            stages['kg'] = asyncio.ensure_future(self.kg_service.find_related_benefits_multi_hop(
+                health_plan_id, benefit_types, max_hops
+            ))
         
         # 3. SPD/BPS cross-referencing if needed
-        cross_ref_results = []
         if query_analysis.get('cross_reference_needed') and health_plan_id:
-            try:
-                cross_ref_results = await self._cross_reference_spd_bps(
-                    db, tpa_id, health_plan_id, query_analysis
-                )
-            except Exception as e:
-                logger.warning(f"Cross-reference search failed: {e}")
+            stages['cross_ref'] = asyncio.ensure_future(self._cross_reference_spd_bps(
+                db, tpa_id, health_plan_id, query_analysis
+            ))
         
         # 4. Traditional database search as fallback
-        db_results = []
-        try:
-            db_results = await document_chunk_crud.search_chunks(
-                db=db,
-                tpa_id=tpa_id,
-                query=query,
-                health_plan_id=health_plan_id,
-                limit=15
-            )
-        except Exception as e:
-            logger.warning(f"Database search failed: {e}")
+        stages['db'] = asyncio.ensure_future(self._fallback_database_search(
+            db, query, tpa_id, health_plan_id, stages.get('vector')
+        ))
+        
+        # Hand out the vector hits as soon as they land if other stages are
+        # still running, so generation can start on them
+        vector_task = stages.get('vector')
+        if vector_task is not None:
+            await asyncio.wait([vector_task])
+            if (
+                not vector_task.cancelled()
+                and vector_task.exception() is None
+                and len(vector_task.result()) >= _PRELIMINARY_MIN_CHUNKS
+                and not all(task.done() for task in stages.values())
+            ):
+                preliminary = self._build_retrieval_results(
+                    start_ns, vector_task.result(), [], [], None, query_analysis
+                )
+                preliminary['preliminary'] = True
+                yield preliminary
+        
+        # Each stage hits a different backend, so run them concurrently;
+        # a failed stage contributes no results. The database search waits
+        # for vector search to decide whether it is needed
+        stage_results = {}
+        for name, result in zip(
+            stages, await asyncio.gather(*stages.values(), return_exceptions=True)
+        ):
+            if isinstance(result, BaseException):
+                logger.warning(f"{_RETRIEVAL_STAGE_LABELS[name]} failed: {result}")
+                result = []
+            stage_results[name] = result
+        
+        # The SPD/BPS connection call keeps running while the other results
+        # are combined; _resolve_pending_connections merges it in later
+        yield self._build_retrieval_results(
+            start_ns,
+            stage_results.get('vector', []),
+            stage_results.get('kg', []),
+            stage_results['db'],
+            stage_results.get('cross_ref') or None,
+            query_analysis
+        )
+    
+    def _build_retrieval_results(
+        self,
+        start_ns: int,
+        vector_results: List[Dict[str, Any]],
+        kg_results: List[Dict[str, Any]],
+        db_results: List[Any],
+        connection_task: Optional[asyncio.Task],
+        query_analysis: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Combine stage results into ranked retrieval results"""
         
         # Combine and rank results with confidence scoring
         combined_results = self._combine_search_results_with_confidence(
-            vector_results, kg_results, db_results, cross_ref_results, query_analysis
+            vector_results, kg_results, db_results, [], query_analysis
         )
         
-        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        processing_time = (time.perf_counter_ns() - start_ns) / 1e9
         
-        return {
-            'chunks': combined_results,
-            'sources': self._extract_sources(combined_results),
+        retrieval_results = {
             'processing_time': processing_time,
             'vector_count': len(vector_results),
             'kg_count': len(kg_results),
             'db_count': len(db_results),
-            'cross_ref_count': len(cross_ref_results)
+            'cross_ref_count': 0,
+            'pending_connections': connection_task
         }
+        self._set_retrieved_chunks(retrieval_results, combined_results)
+        
+        return retrieval_results
+    
+    async def _fallback_database_search(
+        self,
+        db: Session,
+        query: str,
+        tpa_id: str,
+        health_plan_id: Optional[str],
+        vector_task: Optional[asyncio.Future]
+    ) -> List[Any]:
+        """Full-text chunk search, skipped when vector search already found enough strong matches"""
+        
+        if vector_task is not None:
+            try:
+                vector_results = await vector_task
+            except Exception:
+                vector_results = []  # Logged with the vector stage
+            
+            strong_hits = vector_results[:_VECTOR_SUFFICIENT_HITS]
+            if (
+                len(strong_hits) == _VECTOR_SUFFICIENT_HITS
+                and min(result['score'] for result in strong_hits) >= _VECTOR_SUFFICIENT_SCORE
+            ):
+                return []
+        
+        return await document_chunk_crud.search_chunks(
+            db=db,
+            tpa_id=tpa_id,
+            query=query,
+            health_plan_id=health_plan_id,
+            limit=15
+        )
+    
+    def _set_retrieved_chunks(
+        self,
+        retrieval_results: Dict[str, Any],
+        chunks: List[Dict[str, Any]]
+    ):
+        """Store ranked chunks along with their sources and scores"""
+        
+        retrieval_results['chunks'] = chunks
+        # Chunk scores extracted once for confidence scoring
+        retrieval_results['_scores'] = np.fromiter(
+            (chunk['score'] for chunk in chunks),
+            dtype=np.float64,
+            count=len(chunks)
+        )
+        retrieval_results['sources'] = self._extract_sources(chunks)
+    
+    async def _resolve_pending_connections(self, retrieval_results: Dict[str, Any]):
+        """Wait for the SPD/BPS connection call, if any, and merge its results into the ranked chunks"""
+        
+        connection_task = retrieval_results.pop('pending_connections', None)
+        if connection_task is None:
+            return
+        
+        try:
+            cross_ref_results = await connection_task
+        except Exception as e:
+            logger.warning(f"{_RETRIEVAL_STAGE_LABELS['cross_ref']} failed: {e}")
+            return
+        
+        if cross_ref_results:
+            retrieval_results['cross_ref_count'] = len(cross_ref_results)
+            self._set_retrieved_chunks(retrieval_results, self._rank_results(
+                retrieval_results['chunks'] + self._cross_reference_entries(cross_ref_results)
+            ))
     
     def _combine_search_results_with_confidence(
         self,
@@ -336,17 +831,7 @@ class RAGService:
             })
         
         # Add cross-reference results with very high confidence
-        for result in cross_ref_results:
-            confidence = 0.95  # Very high confidence for cross-referenced data
-            combined.append({
-                'content': result['content'],
-                'source': 'cross_reference',
-                'score': 0.95,
-                'confidence': confidence,
-                'spd_reference': result.get('spd_reference'),
-                'bps_reference': result.get('bps_reference'),
-                'cross_ref_type': result.get('cross_ref_type')
-            })
+        combined.extend(self._cross_reference_entries(cross_ref_results))
         
         # Add database results
         for chunk in db_results:
@@ -363,18 +848,47 @@ class RAGService:
                 'keywords': chunk.keywords
             })
         
-        # Remove duplicates and sort by confidence and score
-        seen_content = set()
-        unique_results = []
+        return self._rank_results(combined)
+    
+    @staticmethod
+    def _cross_reference_entries(cross_ref_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Build combined result entries for SPD/BPS cross-references"""
         
-        for result in sorted(combined, key=lambda x: (x['confidence'], x['score']), reverse=True):
-            content_hash = hash(result['content'][:100])  # First 100 chars
-            if content_hash not in seen_content:
-                seen_content.add(content_hash)
-                unique_results.append(result)
+        return [
+            {
+                'content': result['content'],
+                'source': 'cross_reference',
+                'score': 0.95,
+                'confidence': 0.95,  # Very high confidence for cross-referenced data
+                'spd_reference': result.get('spd_reference'),
+                'bps_reference': result.get('bps_reference'),
+                'cross_ref_type': result.get('cross_ref_type')
+            }
+            for result in cross_ref_results
+        ]
+    
+    def _rank_results(self, combined: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Deduplicate results and return the top ten by confidence and score"""
         
-        # Return top results
-        return unique_results[:10]
+        # Remove duplicates, keeping the best-ranked copy of each
+        rank = operator.itemgetter('_rank')
+        best_by_content = {}
+        
+        for result in combined:
+            # Confidence leads; score only separates equal confidences
+            result['_rank'] = result['confidence'] + _SCORE_RANK_WEIGHT * result['score']
+            content_hash = self._content_hash(result['content'])
+            best = best_by_content.get(content_hash)
+            if best is None or result['_rank'] > best['_rank']:
+                best_by_content[content_hash] = result
+        
+        # Return top results by confidence and score without sorting everything
+        return heapq.nlargest(10, best_by_content.values(), key=rank)
+    
+    @staticmethod
+    def _content_hash(content: str) -> int:
+        """Stable hash of the first 100 characters of content, ignoring whitespace differences"""
+        return xxhash.xxh64_intdigest(" ".join(content.split())[:100].encode('utf-8', 'ignore'))
     
     async def _cross_reference_spd_bps(
         self,
@@ -382,76 +896,100 @@ class RAGService:
         tpa_id: str,
         health_plan_id: str,
         query_analysis: Dict[str, Any]
-    ) -> List[Dict[str, Any]]:
-        """Cross-reference SPD and BPS documents for comprehensive answers"""
+    ) -> Optional[asyncio.Task]:
+        """Find SPD and BPS sections to cross-reference, returning the running connection task"""
         
-        cross_ref_results = []
+        start_ns = time.perf_counter_ns()
         
         try:
-            # Get SPD chunks that mention benefit types
-            spd_chunks = await document_chunk_crud.search_chunks(
-                db=db,
-                tpa_id=tpa_id,
-                query=" ".join(query_analysis.get('benefit_types', [])),
-                health_plan_id=health_plan_id,
-                document_type='spd',
-                limit=10
+            benefit_query = " ".join(query_analysis.get('benefit_types', []))
+            
+            # Get SPD chunks that mention benefit types and BPS chunks with
+            # corresponding amounts; both run on the request's session, so
+            # they are awaited in turn
+            spd_chunks = await self._search_document_type_chunks(
+                db, tpa_id, benefit_query, health_plan_id, 'spd'
+            )
+            bps_chunks = await self._search_document_type_chunks(
+                db, tpa_id, benefit_query, health_plan_id, 'bps'
             )
             
-            # Get BPS chunks with corresponding amounts
-            bps_chunks = await document_chunk_crud.search_chunks(
+            logger.debug(
+                f"SPD/BPS chunk searches took {(time.perf_counter_ns() - start_ns) / 1e6:.1f}ms"
+            )
+            
+            # Dispatch the AI connection call without waiting for it, so it
+            # overlaps with the rest of retrieval and context assembly
+            if spd_chunks and bps_chunks:
+                return asyncio.create_task(
+                    self._find_spd_bps_connections(spd_chunks, bps_chunks, query_analysis)
+                )
+        
+        except Exception as e:
+            logger.warning(f"SPD/BPS cross-referencing failed: {e}")
+        
+        return None
+    
+    async def _search_document_type_chunks(
+        self,
+        db: Session,
+        tpa_id: str,
+        query: str,
+        health_plan_id: str,
+        document_type: str
+    ) -> List[Any]:
+        """Search one document type's chunks, treating a failed search as no matches"""
+        try:
+            return await document_chunk_crud.search_chunks(
                 db=db,
                 tpa_id=tpa_id,
-                query=" ".join(query_analysis.get('benefit_types', [])),
+                query=query,
                 health_plan_id=health_plan_id,
-                document_type='bps',
+                document_type=document_type,
                 limit=10
             )
+        except Exception as e:
+            logger.warning(f"{document_type.upper()} chunk search failed: {e}")
+            return []
+    
+    async def _find_spd_bps_connections(
+        self,
+        spd_chunks: List[Any],
+        bps_chunks: List[Any],
+        query_analysis: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Use AI to find connections between SPD and BPS sections"""
+        
+        cross_ref_results = []
+        
+        try:
+            connection_prompt = _CONNECTION_TEMPLATE.substitute(
+                spd_sections="\n".join(
+                    f"SPD-{i+1}: {chunk.content[:300]}" for i, chunk in enumerate(spd_chunks[:3])
+                ),
+                bps_sections="\n".join(
+                    f"BPS-{i+1}: {chunk.content[:300]}" for i, chunk in enumerate(bps_chunks[:3])
+                ),
+                keywords=query_analysis.get('keywords', [])
+            )
             
-            # Use AI to find connections between SPD and BPS
-            if spd_chunks and bps_chunks:
-                connection_prompt = f"""
-                Find connections between these SPD (Summary Plan Description) and BPS (Benefit Payment Schedule) sections:
-                
-                SPD Sections:
-                {chr(10).join([f"SPD-{i+1}: {chunk.content[:300]}" for i, chunk in enumerate(spd_chunks[:3])])}
-                
-                BPS Sections:
-                {chr(10).join([f"BPS-{i+1}: {chunk.content[:300]}" for i, chunk in enumerate(bps_chunks[:3])])}
-                
-                Query: {query_analysis.get('keywords', [])}
-                
-                Identify which SPD rules correspond to which BPS amounts. Return as JSON:
-                {{
-                    "connections": [
-                        {{
-                            "spd_section": "SPD-1",
-                            "bps_section": "BPS-1",
-                            "connection_type": "coverage_amount|copay|deductible|coinsurance",
-                            "combined_content": "Combined explanation...",
-                            "confidence": 0.85
-                        }}
-                    ]
-                }}
-                """
-                
-                ai_response = await self.ai_service.chat_completion(
-                    messages=[{"role": "user", "content": connection_prompt}],
-                    model="gpt-4o-mini",
-                    max_tokens=800,
-                    temperature=0.1
-                )
-                
-                connections = json.loads(ai_response.content)
-                
-                for conn in connections.get('connections', []):
-                    cross_ref_results.append({
-                        'content': conn['combined_content'],
-                        'spd_reference': conn['spd_section'],
-                        'bps_reference': conn['bps_section'],
-                        'cross_ref_type': conn['connection_type'],
-                        'confidence': conn['confidence']
-                    })
+            ai_response = await self.batcher.submit(
+                messages=[{"role": "user", "content": connection_prompt}],
+                model="gpt-4o-mini",
+                max_tokens=800,
+                temperature=0.1
+            )
+            
+            connections = CrossRefConnections.model_validate_json(ai_response.content)
+            
+            for conn in connections.connections:
+                cross_ref_results.append({
+                    'content': conn.combined_content,
+                    'spd_reference': conn.spd_section,
+                    'bps_reference': conn.bps_section,
+                    'cross_ref_type': conn.connection_type,
+                    'confidence': conn.confidence
+                })
         
         except Exception as e:
             logger.warning(f"SPD/BPS cross-referencing failed: {e}")
@@ -490,32 +1028,80 @@ class RAGService:
         
         return max(0.0, min(1.0, base_confidence))
     
-    def _extract_sources(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    def _extract_sources(self, results: List[Dict[str, Any]]) -> List[Source]:
         """Extract source information from results"""
         
-        sources = []
+        return [
+            Source(
+                type=result['source'],
+                score=result['score'],
+                document_id=result.get('document_id'),
+                page_number=result.get('page_number'),
+                section_title=result.get('section_title'),
+                chunk_type=result.get('chunk_type')
+            )
+            for result in results
+        ]
+    
+    def _build_response_prompt(
+        self,
+        query: str,
+        retrieval_results: Dict[str, Any],
+        query_analysis: Dict[str, Any],
+        conversation_context: Optional[Dict[str, Any]]
+    ) -> str:
+        """Build the compact JSON user message for response generation"""
         
-        for result in results:
-            source = {
-                'type': result['source'],
-                'score': result['score']
-            }
-            
-            if result.get('document_id'):
-                source['document_id'] = result['document_id']
-            
-            if result.get('page_number'):
-                source['page_number'] = result['page_number']
-            
-            if result.get('section_title'):
-                source['section_title'] = result['section_title']
+        prompt = {
+            'q': query,
+            'intent': query_analysis['intent'],
+            'complexity': query_analysis['complexity'],
+            'type': query_analysis.get('query_type', 'general'),
+            'xref': query_analysis.get('cross_reference_needed', False)
+        }
+        
+        if query_analysis.get('healthcare_entities'):
+            prompt['entities'] = query_analysis['healthcare_entities']
+        
+        if conversation_context and conversation_context.get('previous_queries'):
+            prompt['history'] = conversation_context['previous_queries']
+        
+        # Prepare context from retrieved chunks
+        prompt['ctx'] = self._build_context(retrieval_results['chunks'][:_CONTEXT_CHUNK_COUNT])
+        
+        return json.dumps(prompt, ensure_ascii=False, separators=(',', ':'), default=str)
+    
+    def _build_context(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Pack chunk text into the context token budget, giving more confident chunks more room"""
+        
+        context = []
+        budget = _CONTEXT_TOKEN_BUDGET
+        remaining_confidence = sum(chunk['confidence'] for chunk in chunks)
+        
+        for i, chunk in enumerate(chunks):
+            # Each chunk gets its share of what is left, so tokens a short
+            # chunk does not use go to the chunks after it
+            if remaining_confidence > 0:
+                allocated = int(budget * chunk['confidence'] / remaining_confidence)
+            else:
+                allocated = budget // (len(chunks) - i)
+            remaining_confidence -= chunk['confidence']
             
-            if result.get('chunk_type'):
-                source['chunk_type'] = result['chunk_type']
+            tokens = self._enc.encode(chunk['content'])
+            if len(tokens) > allocated:
+                tokens = tokens[:allocated]
+                text = f"{self._enc.decode(tokens)}..."
+            else:
+                text = chunk['content']
+            budget -= len(tokens)
             
-            sources.append(source)
+            entry = {'id': i + 1, 'src': chunk.get('section_title') or chunk['source']}
+            if chunk.get('page_number'):
+                entry['pg'] = chunk['page_number']
+            entry['text'] = text
+            context.append(entry)
         
-        return sources
+        return context
     
     async def _generate_response(
         self,
@@ -526,96 +1112,98 @@ class RAGService:
     ) -> Dict[str, Any]:
         """Generate AI response using retrieved information"""
         
+        async for event in self._generate_response_stream(
+            query, retrieval_results, query_analysis, conversation_context
+        ):
+            if event.get('done'):
+                return event['response']
+    
+    async def _generate_response_stream(
+        self,
+        query: str,
+        retrieval_results: Dict[str, Any],
+        query_analysis: Dict[str, Any],
+        conversation_context: Optional[Dict[str, Any]],
+        speculative: Optional['_SpeculativeResponse'] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the AI response, yielding answer text as it arrives and the parsed response last"""
+        
         try:
-            # Prepare context from retrieved chunks
-            context_chunks = []
-            for i, chunk in enumerate(retrieval_results['chunks'][:5]):  # Top 5 chunks
-                context_chunks.append(f"Source {i+1}: {chunk['content'][:800]}...")
-            
-            context = "\n\n".join(context_chunks)
-            
-            # Build conversation context
-            conv_context = ""
-            if conversation_context and conversation_context.get('previous_queries'):
-                conv_context = f"\nPrevious conversation context:\n{conversation_context['previous_queries']}\n"
-            
-            # Enhanced response generation with multi-step reasoning
-            response_prompt = f"""
-            {self.expert_prompt}
+            # The prompt context needs any SPD/BPS connections still in flight
+            await self._resolve_pending_connections(retrieval_results)
             
-            Query: "{query}"
-            Query Intent: {query_analysis['intent']}
-            Query Complexity: {query_analysis['complexity']}
-            Query Type: {query_analysis.get('query_type', 'general')}
-            Healthcare Entities: {query_analysis.get('healthcare_entities', {})}
-            Cross-Reference Needed: {query_analysis.get('cross_reference_needed', False)}
-            {conv_context}
-            
-            Available Information:
-            {context}
-            
-            Please provide a comprehensive, accurate response using multi-step reasoning:
-            
-            Step 1: Analyze the query and identify the specific healthcare benefit being asked about
-            Step 2: Review the available information and identify the most relevant sources
-            Step 3: If cross-referencing is needed, connect SPD rules with BPS amounts
-            Step 4: Synthesize a complete answer with specific details
-            Step 5: Verify the answer against the source material
-            
-            Include in your response:
-            1. Direct answer to the question with specific details
-            2. Exact costs, percentages, or coverage amounts when available
-            3. Any limitations, exclusions, or requirements (deductibles, prior auth, etc.)
-            4. Network considerations (in-network vs out-of-network)
-            5. Source references with specific page numbers when available
-            6. Confidence level based on information quality
-            
-            Also suggest 2-3 related follow-up questions that members commonly ask.
-            
-            Format your response as JSON:
-            {{
-                "answer": "Your detailed response with specific amounts and requirements...",
-                "reasoning": "Step-by-step explanation of how you arrived at this answer",
-                "confidence_level": "High/Medium/Low",
-                "related_topics": ["topic1", "topic2"],
-                "follow_up_suggestions": ["question1?", "question2?", "question3?"],
-                "requires_clarification": boolean,
-                "cross_referenced_data": {{
-                    "spd_rules": "Relevant SPD rules if applicable",
-                    "bps_amounts": "Corresponding BPS amounts if applicable"
-                }}
-            }}
-            """
-            
-            ai_response = await self.ai_service.chat_completion(
-                messages=[{"role": "user", "content": response_prompt}],
+            response_prompt = self._build_response_prompt(
+                query, retrieval_results, query_analysis, conversation_context
+            )
+        except Exception as e:
+            logger.error(f"Response generation failed: {e}")
+            if speculative is not None:
+                speculative.cancel()
+            yield {'done': True, 'response': self._fallback_response(query, retrieval_results)}
+            return
+        
+        if speculative is not None and speculative.prompt == response_prompt:
+            # The slower retrieval stages left the prompt unchanged, so keep
+            # the response that started on the early vector hits
+            events = speculative.events()
+        else:
+            if speculative is not None:
+                speculative.cancel()
+            events = self._stream_response(query, response_prompt, retrieval_results)
+        
+        async for event in events:
+            yield event
+    
+    async def _stream_response(
+        self,
+        query: str,
+        response_prompt: str,
+        retrieval_results: Dict[str, Any]
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the AI response to a prompt, falling back to a document excerpt on failure"""
+        
+        try:
+            extractor = _AnswerStreamExtractor()
+            async for delta in self.ai_service.chat_completion_stream(
+                messages=[
+                    {"role": "system", "content": _RESPONSE_SYSTEM_PROMPT},
+                    {"role": "user", "content": response_prompt}
+                ],
                 model="gpt-4",
                 max_tokens=1500,
                 temperature=0.1
-            )
+            ):
+                answer_delta = extractor.feed(delta)
+                if answer_delta:
+                    yield {'answer_delta': answer_delta}
             
-            response_content = ai_response.content
-            token_count = ai_response.token_count
+            response_content = extractor.text
             
-            # Parse JSON response
-            parsed_response = json.loads(response_content)
-            parsed_response['token_count'] = token_count
+            # Parse and validate the response once the stream is complete
+            parsed_response = GenerationResponse.model_validate_json(response_content).model_dump()
+            parsed_response['token_count'] = (
+                self.ai_service.count_tokens(_RESPONSE_SYSTEM_PROMPT, "gpt-4")
+                + self.ai_service.count_tokens(response_prompt, "gpt-4")
+                + self.ai_service.count_tokens(response_content, "gpt-4")
+            )
             
-            return parsed_response
+            yield {'done': True, 'response': parsed_response}
             
         except Exception as e:
             logger.error(f"Response generation failed: {e}")
-            
-            # Fallback response
-            return {
-                'answer': self._generate_fallback_response(query, retrieval_results),
-                'reasoning': 'Generated using fallback method due to AI service unavailability',
-                'confidence_level': 'Low',
-                'related_topics': [],
-                'follow_up_suggestions': [],
-                'requires_clarification': True,
-                'token_count': 0
-            }
+            yield {'done': True, 'response': self._fallback_response(query, retrieval_results)}
+    
+    def _fallback_response(self, query: str, retrieval_results: Dict[str, Any]) -> Dict[str, Any]:
+        """Fallback response used when the AI response cannot be generated"""
+        return {
+            'answer': self._generate_fallback_response(query, retrieval_results),
+            'reasoning': 'Generated using fallback method due to AI service unavailability',
+            'confidence_level': 'Low',
+            'related_topics': [],
+            'follow_up_suggestions': [],
+            'requires_clarification': True,
+            'token_count': 0
+        }
     
     def _generate_fallback_response(
         self, 
@@ -649,8 +1237,11 @@ Source: Plan documentation"""
         confidence = 0.5  # Base confidence
         
         # Adjust based on retrieval quality
-        if retrieval_results['chunks']:
-            avg_score = sum(chunk['score'] for chunk in retrieval_results['chunks']) / len(retrieval_results['chunks'])
+        scores = retrieval_results.get('_scores')
+        if scores is None:
+            scores = np.fromiter((chunk['score'] for chunk in retrieval_results['chunks']), dtype=np.float64)
+        if scores.size:
+            avg_score = float(scores.mean())
             confidence += (avg_score - 0.5) * 0.3  # +/- 0.3 based on retrieval scores
         
         # Adjust based on AI confidence level
@@ -4,22 +4,147 @@ User Activity Tracking Service
 This service provides comprehensive user activity monitoring and analytics,
 connecting to existing audit logs and user activity models.
 """
+from collections import Counter, defaultdict
 from datetime import datetime, timedelta, date
+import functools
+import inspect
 from typing import List, Dict, Any, Optional, Tuple
+import orjson
+import pandas as pd
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_, desc, asc
+from sqlalchemy import func, and_, or_, desc, asc, case, extract, text
+import asyncio
 
+from app.core.cache import cache_delete_pattern, cache_get_bytes, cache_set_bytes
+from app.core.config import settings
+from app.core.database import engine, get_db_context
 from app.models.user import User
-from app.models.audit import AuditLog
+from app.models.audit import AuditLog, user_daily_activity
 from app.crud.analytics import analytics_crud
 from app.services.audit_service import AuditService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Dashboard cache lifetimes; real-time data is re-polled every few seconds
+_REAL_TIME_CACHE_TTL_SECONDS = 10
+_SUMMARY_CACHE_TTL_SECONDS = 30
+
+# Cached analytics read from the daily activity rollup, cleared after each refresh
+_ROLLUP_CACHE_PREFIXES = ("tpa_overview", "engagement")
+
+# Postgres advisory lock held by the one worker process refreshing the rollup
+_ROLLUP_REFRESH_LOCK_KEY = 0x5350_4461_696C_79
+
+# Actions that open a user session
+_LOGIN_ACTIONS = frozenset({"login", "session_start"})
+
+# Actions checked for failed sign-in attempts
+_AUTH_ACTIONS = frozenset({"login", "authentication"})
+
+# Hours treated as business hours (8 AM to 6 PM)
+_BUSINESS_HOURS = frozenset(range(8, 18))
+
+# Feature mapping based on actions and resource types
+_FEATURE_MAPPING = {
+    "chat_queries": ["query", "conversation"],
+    "document_management": ["upload", "download", "document"],
+    "user_management": ["user_create", "user_update", "user_delete"],
+    "analytics_viewing": ["analytics", "dashboard"],
+    "admin_functions": ["admin_action", "tpa_management"],
+    "authentication": ["login", "logout", "session_start"]
+}
+_ACTION_TO_FEATURE = {
+    action: feature
+    for feature, actions in _FEATURE_MAPPING.items()
+    for action in actions
+}
+
+# User progression stages and the actions or resources that complete them
+_JOURNEY_STAGES = {
+    "onboarding": ["authentication", "login"],
+    "exploration": ["dashboard", "analytics"],
+    "content_creation": ["document", "upload"],
+    "active_usage": ["query", "conversation"],
+    "advanced_usage": ["admin", "user_management"]
+}
+
+# Churn risk factors and their score weights, in bitmask order
+_CHURN_RISK_FACTORS = (
+    ("Activity declining sharply", 30),
+    ("No activity in past 7 days", 40),
+    ("Consistently low activity", 20),
+    ("High failure rate in recent activities", 25)
+)
+
+# Churn prevention recommendations by risk level
+_CHURN_RECOMMENDATIONS = {
+    "high": (
+        "Send immediate re-engagement email",
+        "Offer personalized training session",
+        "Check for technical issues or access problems",
+        "Consider account manager outreach"
+    ),
+    "medium": (
+        "Send feature highlight email",
+        "Provide usage tips and best practices",
+        "Monitor closely for next 2 weeks"
+    ),
+    "low": (
+        "Include in general engagement campaigns",
+        "Monitor activity patterns"
+    ),
+    "very_low": (
+        "User appears to be actively engaged",
+    )
+}
+
+def _cached_result(prefix: str, ttl_seconds: int):
+    """Cache an analytics method's result in Redis, keyed by its arguments other than the session"""
+    def decorator(method):
+        signature = inspect.signature(method)
+        
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_parts = [str(value) for name, value in bound.arguments.items() if name != "db"]
+            cache_key = ":".join(["activity", prefix, *key_parts])
+            
+            cached = await cache_get_bytes(cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
+            
+            # Misses return the same JSON round-trip as hits (string keys,
+            # enum values, ISO datetimes), so callers see one shape
+            payload = orjson.dumps(await method(*args, **kwargs), option=orjson.OPT_NON_STR_KEYS)
+            await cache_set_bytes(cache_key, payload, ttl_seconds)
+            return orjson.loads(payload)
+        
+        return wrapper
+    return decorator
+
+
 class UserActivityService:
     """Service for tracking and analyzing user activity patterns"""
     
+    @staticmethod
+    def refresh_daily_activity_rollup(connection: Connection) -> bool:
+        """Refresh the daily activity materialized view without blocking readers, if this process holds the refresher lock"""
+        # Session-level lock: the first worker keeps it for the life of its
+        # connection, so the other workers skip rather than refresh again
+        if not connection.info.get("holds_rollup_lock"):
+            connection.info["holds_rollup_lock"] = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"),
+                {"key": _ROLLUP_REFRESH_LOCK_KEY}
+            ).scalar()
+        
+        if connection.info["holds_rollup_lock"]:
+            connection.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_user_daily_activity"))
+        connection.commit()
+        return connection.info["holds_rollup_lock"]
+    
     @staticmethod
     async def track_user_session(
         db: Session,
@@ -47,7 +172,7 @@ class UserActivityService:
         }
         
         # Log session start as audit event
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.query(User.tpa_id).filter(User.id == user_id).first()
         if user:
             await AuditService.log_auth_event(
                 db=db,
@@ -74,50 +199,52 @@ class UserActivityService:
         start_date = end_date - timedelta(days=days)
         
         # Get user info
-        user = db.query(User).filter(User.id == user_id).first()
+        user = db.query(
+            User.id,
+            User.tpa_id,
+            User.first_name,
+            User.last_name,
+            User.email,
+            User.role
+        ).filter(User.id == user_id).first()
         if not user:
             raise ValueError("User not found")
         
-        # Get audit logs for the user
-        user_logs = db.query(AuditLog).filter(
-            and_(
-                AuditLog.user_id == user_id,
-                AuditLog.created_at >= start_date
-            )
-        ).all()
+        # Aggregate the user's audit logs in the database: one totals row, then
+        # a small GROUP BY per breakdown rather than their cross product
+        user_filter = and_(
+            AuditLog.user_id == user_id,
+            AuditLog.created_at >= start_date
+        )
+        
+        totals = db.query(
+            func.count(AuditLog.id),
+            func.count(AuditLog.id).filter(AuditLog.success.is_(True)),
+            func.count(func.distinct(AuditLog.ip_address)),
+            func.min(AuditLog.created_at),
+            func.max(AuditLog.created_at)
+        ).filter(user_filter).one()
+        total_activities, successful_activities, unique_ip_count, first_activity, last_activity = totals
+        
+        def breakdown(column) -> Counter:
+            return Counter(dict(
+                db.query(column, func.count(AuditLog.id)).filter(user_filter).group_by(column).all()
+            ))
+        
+        action_breakdown = breakdown(AuditLog.action)
+        resource_breakdown = breakdown(AuditLog.resource_type)
+        daily_activity = Counter({
+            str(day): count for day, count in breakdown(func.date(AuditLog.created_at)).items()
+        })
+        hourly_activity = Counter({
+            int(hour): count for hour, count in breakdown(extract('hour', AuditLog.created_at)).items()
+        })
+        login_sessions = sum(
+            count for action, count in action_breakdown.items() if action in _LOGIN_ACTIONS
+        )
         
-        # Calculate activity metrics
-        total_activities = len(user_logs)
-        successful_activities = len([log for log in user_logs if log.success])
         failed_activities = total_activities - successful_activities
-        
-        # Group by action type
-        action_breakdown = {}
-        for log in user_logs:
-            action_breakdown[log.action] = action_breakdown.get(log.action, 0) + 1
-        
-        # Group by resource type
-        resource_breakdown = {}
-        for log in user_logs:
-            resource_breakdown[log.resource_type] = resource_breakdown.get(log.resource_type, 0) + 1
-        
-        # Calculate daily activity
-        daily_activity = {}
-        for log in user_logs:
-            day = log.created_at.date().isoformat()
-            daily_activity[day] = daily_activity.get(day, 0) + 1
-        
-        # Get login sessions
-        login_logs = [log for log in user_logs if log.action in ["login", "session_start"]]
-        unique_ips = list(set([log.ip_address for log in user_logs if log.ip_address]))
-        
-        # Most active hours
-        hourly_activity = {}
-        for log in user_logs:
-            hour = log.created_at.hour
-            hourly_activity[hour] = hourly_activity.get(hour, 0) + 1
-        
-        most_active_hour = max(hourly_activity.items(), key=lambda x: x[1])[0] if hourly_activity else None
+        most_active_hour = hourly_activity.most_common(1)[0][0] if hourly_activity else None
         
         return {
             "user_id": user_id,
@@ -130,76 +257,93 @@ class UserActivityService:
             "successful_activities": successful_activities,
             "failed_activities": failed_activities,
             "success_rate": (successful_activities / total_activities * 100) if total_activities > 0 else 0,
-            "login_sessions": len(login_logs),
-            "unique_ip_addresses": len(unique_ips),
+            "login_sessions": login_sessions,
+            "unique_ip_addresses": unique_ip_count,
             "action_breakdown": action_breakdown,
             "resource_breakdown": resource_breakdown,
             "daily_activity": daily_activity,
             "hourly_activity": hourly_activity,
             "most_active_hour": most_active_hour,
-            "last_activity": max([log.created_at for log in user_logs]) if user_logs else None,
-            "first_activity": min([log.created_at for log in user_logs]) if user_logs else None
+            "last_activity": last_activity,
+            "first_activity": first_activity
         }
     
     @staticmethod
+    @_cached_result("tpa_overview", _SUMMARY_CACHE_TTL_SECONDS)
     async def get_tpa_activity_overview(
         db: Session,
         tpa_id: str,
         days: int = 30
     ) -> Dict[str, Any]:
         """Get activity overview for an entire TPA"""
+        return UserActivityService._compute_tpa_activity_overview(db, tpa_id, days)
+    
+    @staticmethod
+    def _compute_tpa_activity_overview(
+        db: Session,
+        tpa_id: str,
+        days: int = 30
+    ) -> Dict[str, Any]:
+        """Compute the TPA activity overview with blocking queries"""
         
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
         # Get all users in the TPA
-        tpa_users = db.query(User).filter(User.tpa_id == tpa_id).all()
-        user_ids = [user.id for user in tpa_users]
-        
-        # Get audit logs for all TPA users
-        tpa_logs = db.query(AuditLog).filter(
+        tpa_users = db.query(
+            User.id,
+            User.first_name,
+            User.last_name,
+            User.email
+        ).filter(User.tpa_id == tpa_id).all()
+        users_by_id = {user.id: user for user in tpa_users}
+        
+        # Load the TPA's daily activity rollup once into a frame for grouped aggregation
+        rollup_query = db.query(
+            user_daily_activity.c.user_id,
+            user_daily_activity.c.day,
+            user_daily_activity.c.action,
+            user_daily_activity.c.success,
+            user_daily_activity.c.cnt
+        ).filter(
             and_(
-                AuditLog.tpa_id == tpa_id,
-                AuditLog.created_at >= start_date
+                user_daily_activity.c.tpa_id == tpa_id,
+                user_daily_activity.c.day >= start_date.date()
             )
-        ).all()
+        )
+        tpa_logs = pd.read_sql(rollup_query.statement, db.connection())
         
         # Active users (users with activity in the period)
-        active_user_ids = list(set([log.user_id for log in tpa_logs if log.user_id]))
-        active_users_count = len(active_user_ids)
+        active_users_count = int(tpa_logs["user_id"].nunique())
         
         # Calculate metrics
-        total_activities = len(tpa_logs)
-        successful_activities = len([log for log in tpa_logs if log.success])
+        total_activities = int(tpa_logs["cnt"].sum())
+        successful_activities = int((tpa_logs["cnt"] * tpa_logs["success"]).sum())
         
         # Top users by activity
-        user_activity_counts = {}
-        for log in tpa_logs:
-            if log.user_id:
-                user_activity_counts[log.user_id] = user_activity_counts.get(log.user_id, 0) + 1
-        
-        top_users = sorted(user_activity_counts.items(), key=lambda x: x[1], reverse=True)[:10]
+        top_users = tpa_logs.groupby("user_id")["cnt"].sum().nlargest(10)
         top_users_data = []
-        for user_id, count in top_users:
-            user = next((u for u in tpa_users if u.id == user_id), None)
+        for user_id, count in top_users.items():
+            user = users_by_id.get(user_id)
             if user:
                 top_users_data.append({
                     "user_id": user_id,
                     "user_name": f"{user.first_name} {user.last_name}",
                     "user_email": user.email,
-                    "activity_count": count
+                    "activity_count": int(count)
                 })
         
         # Daily activity trend
-        daily_activity = {}
-        for log in tpa_logs:
-            day = log.created_at.date().isoformat()
-            daily_activity[day] = daily_activity.get(day, 0) + 1
+        daily_activity = {
+            day.isoformat(): int(count)
+            for day, count in tpa_logs.groupby("day")["cnt"].sum().items()
+        }
         
         # Action breakdown
-        action_breakdown = {}
-        for log in tpa_logs:
-            action_breakdown[log.action] = action_breakdown.get(log.action, 0) + 1
+        action_breakdown = {
+            action: int(count)
+            for action, count in tpa_logs.groupby("action")["cnt"].sum().items()
+        }
         
         return {
             "tpa_id": tpa_id,
@@ -226,28 +370,41 @@ class UserActivityService:
         
         # Get user's historical activity
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        user_logs = db.query(AuditLog).filter(
-            and_(
-                AuditLog.user_id == user_id,
-                AuditLog.created_at >= thirty_days_ago
-            )
-        ).all()
-        
-        if len(user_logs) < 10:  # Not enough data
+        today = datetime.utcnow().date()
+        period_filter = and_(
+            AuditLog.user_id == user_id,
+            AuditLog.created_at >= thirty_days_ago
+        )
+        
+        # Calculate daily activity statistics in the database
+        activity_day = func.date(AuditLog.created_at)
+        daily_counts = db.query(
+            activity_day.label("day"),
+            func.count(AuditLog.id).label("cnt")
+        ).filter(period_filter).group_by(activity_day).subquery()
+        
+        total_activity, avg_daily_activity, stddev_daily_activity, today_activity = db.query(
+            func.sum(daily_counts.c.cnt),
+            func.avg(daily_counts.c.cnt),
+            func.stddev_pop(daily_counts.c.cnt),
+            func.sum(case((daily_counts.c.day == today, daily_counts.c.cnt), else_=0))
+        ).one()
+        
+        if not total_activity or total_activity < 10:  # Not enough data
             return {"has_unusual_activity": False, "reason": "insufficient_data"}
         
-        # Calculate daily activity counts
-        daily_counts = {}
-        for log in user_logs:
-            day = log.created_at.date()
-            daily_counts[day] = daily_counts.get(day, 0) + 1
-        
-        counts = list(daily_counts.values())
-        avg_daily_activity = sum(counts) / len(counts)
+        avg_daily_activity = float(avg_daily_activity)
+        stddev_daily_activity = float(stddev_daily_activity or 0)
+        today_activity = int(today_activity or 0)
         
-        # Check today's activity
-        today = datetime.utcnow().date()
-        today_activity = daily_counts.get(today, 0)
+        # Most recent activities for the pattern checks below
+        recent_logs = db.query(
+            AuditLog.action,
+            AuditLog.success,
+            AuditLog.ip_address,
+            AuditLog.created_at
+        ).filter(period_filter).order_by(AuditLog.created_at.desc()).limit(50).all()
+        last_20_logs = recent_logs[:20]
         
         # Detect anomalies
         anomalies = []
@@ -261,10 +418,19 @@ class UserActivityService:
             })
         
         # Check for unusual IP addresses
-        recent_ips = [log.ip_address for log in user_logs[-20:] if log.ip_address]  # Last 20 activities
-        historical_ips = [log.ip_address for log in user_logs[:-20] if log.ip_address]
+        recent_ips = {log.ip_address for log in last_20_logs if log.ip_address}  # Last 20 activities
+        if recent_ips:
+            known_ips = db.query(AuditLog.ip_address).filter(
+                and_(
+                    period_filter,
+                    AuditLog.created_at < last_20_logs[-1].created_at,
+                    AuditLog.ip_address.in_(recent_ips)
+                )
+            ).distinct().all()
+            new_ips = recent_ips - {ip for (ip,) in known_ips}
+        else:
+            new_ips = set()
         
-        new_ips = set(recent_ips) - set(historical_ips)
         if new_ips:
             anomalies.append({
                 "type": "new_ip_address",
@@ -274,8 +440,8 @@ class UserActivityService:
         
         # Check for failed login patterns
         recent_failed_logins = [
-            log for log in user_logs[-50:] 
-            if log.action in ["login", "authentication"] and not log.success
+            log for log in recent_logs 
+            if log.action in _AUTH_ACTIONS and not log.success
         ]
         
         if len(recent_failed_logins) > 5:
@@ -286,13 +452,12 @@ class UserActivityService:
             })
         
         # Check for off-hours activity
-        business_hours = range(8, 18)  # 8 AM to 6 PM
         off_hours_activity = [
-            log for log in user_logs[-20:] 
-            if log.created_at.hour not in business_hours
+            log for log in last_20_logs 
+            if log.created_at.hour not in _BUSINESS_HOURS
         ]
         
-        if len(off_hours_activity) > len(user_logs[-20:]) * 0.5:  # More than 50% off-hours
+        if len(off_hours_activity) > len(last_20_logs) * 0.5:  # More than 50% off-hours
             anomalies.append({
                 "type": "off_hours_activity",
                 "description": f"High off-hours activity: {len(off_hours_activity)} out of last 20 activities",
@@ -303,86 +468,122 @@ class UserActivityService:
             "has_unusual_activity": len(anomalies) > 0,
             "anomalies": anomalies,
             "avg_daily_activity": avg_daily_activity,
+            "stddev_daily_activity": stddev_daily_activity,
             "today_activity": today_activity,
             "analysis_period_days": 30
         }
     
     @staticmethod
+    @_cached_result("engagement", _SUMMARY_CACHE_TTL_SECONDS)
     async def get_user_engagement_metrics(
         db: Session,
         tpa_id: Optional[str] = None,
         days: int = 30
     ) -> Dict[str, Any]:
         """Get user engagement metrics across the platform"""
+        return UserActivityService._compute_user_engagement_metrics(db, tpa_id, days)
+    
+    @staticmethod
+    def _compute_user_engagement_metrics(
+        db: Session,
+        tpa_id: Optional[str] = None,
+        days: int = 30
+    ) -> Dict[str, Any]:
+        """Compute engagement metrics with blocking queries"""
         
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Base query
-        query = db.query(User)
-        if tpa_id:
-            query = query.filter(User.tpa_id == tpa_id)
-        
-        all_users = query.all()
-        
-        # Get audit logs for the period
-        logs_query = db.query(AuditLog).filter(AuditLog.created_at >= start_date)
+        # Get per-user activity counts for the period from the daily rollup
+        counts_query = db.query(
+            user_daily_activity.c.user_id,
+            func.sum(user_daily_activity.c.cnt).label("cnt")
+        ).filter(
+            and_(
+                user_daily_activity.c.day >= start_date.date(),
+                user_daily_activity.c.user_id.isnot(None)
+            )
+        )
         if tpa_id:
-            logs_query = logs_query.filter(AuditLog.tpa_id == tpa_id)
-        
-        all_logs = logs_query.all()
-        
-        # Calculate engagement levels
-        user_activity_counts = {}
-        for log in all_logs:
-            if log.user_id:
-                user_activity_counts[log.user_id] = user_activity_counts.get(log.user_id, 0) + 1
+            counts_query = counts_query.filter(user_daily_activity.c.tpa_id == tpa_id)
+        activity_counts = counts_query.group_by(user_daily_activity.c.user_id).subquery()
         
         # Categorize users by engagement
-        highly_engaged = []  # >100 activities
-        moderately_engaged = []  # 20-100 activities
-        lightly_engaged = []  # 1-19 activities
-        inactive = []  # 0 activities
-        
-        for user in all_users:
-            activity_count = user_activity_counts.get(user.id, 0)
-            user_data = {
-                "user_id": user.id,
+        activity_count = func.coalesce(activity_counts.c.cnt, 0)
+        engagement_level = case(
+            (activity_count > 100, "highly_engaged"),
+            (activity_count >= 20, "moderately_engaged"),
+            (activity_count > 0, "lightly_engaged"),
+            else_="inactive"
+        )
+        
+        users_query = db.query(
+            User.id.label("user_id"),
+            User.first_name,
+            User.last_name,
+            User.email,
+            User.last_login_at,
+            activity_count.label("activity_count"),
+            engagement_level.label("engagement_level")
+        ).outerjoin(activity_counts, activity_counts.c.user_id == User.id)
+        if tpa_id:
+            users_query = users_query.filter(User.tpa_id == tpa_id)
+        engaged_users = users_query.subquery()
+        
+        # Bucket sizes and activity totals
+        level_stats = db.query(
+            engaged_users.c.engagement_level,
+            func.count(engaged_users.c.user_id),
+            func.sum(engaged_users.c.activity_count)
+        ).group_by(engaged_users.c.engagement_level).all()
+        
+        # Top 10 users per bucket
+        position = func.row_number().over(
+            partition_by=engaged_users.c.engagement_level,
+            order_by=engaged_users.c.activity_count.desc()
+        ).label("position")
+        ranked_users = db.query(engaged_users, position).subquery()
+        top_users = db.query(ranked_users).filter(
+            ranked_users.c.position <= 10
+        ).order_by(ranked_users.c.engagement_level, ranked_users.c.position).all()
+        
+        level_counts = {
+            "highly_engaged": 0,  # >100 activities
+            "moderately_engaged": 0,  # 20-100 activities
+            "lightly_engaged": 0,  # 1-19 activities
+            "inactive": 0  # 0 activities
+        }
+        total_users = 0
+        active_users = 0
+        active_activity_total = 0
+        for level, user_count, level_activity in level_stats:
+            level_counts[level] = user_count
+            total_users += user_count
+            if level != "inactive":
+                active_users += user_count
+                active_activity_total += int(level_activity or 0)
+        
+        engagement_distribution = {level: [] for level in level_counts}
+        for user in top_users:
+            engagement_distribution[user.engagement_level].append({
+                "user_id": user.user_id,
                 "user_name": f"{user.first_name} {user.last_name}",
                 "user_email": user.email,
-                "activity_count": activity_count,
+                "activity_count": int(user.activity_count),
                 "last_login": user.last_login_at
-            }
-            
-            if activity_count > 100:
-                highly_engaged.append(user_data)
-            elif activity_count >= 20:
-                moderately_engaged.append(user_data)
-            elif activity_count > 0:
-                lightly_engaged.append(user_data)
-            else:
-                inactive.append(user_data)
-        
-        # Calculate retention metrics
-        total_users = len(all_users)
-        active_users = len([u for u in all_users if u.id in user_activity_counts])
+            })
         
         return {
             "period_days": days,
             "total_users": total_users,
             "active_users": active_users,
             "engagement_rate": (active_users / total_users * 100) if total_users > 0 else 0,
-            "highly_engaged_users": len(highly_engaged),
-            "moderately_engaged_users": len(moderately_engaged),
-            "lightly_engaged_users": len(lightly_engaged),
-            "inactive_users": len(inactive),
-            "engagement_distribution": {
-                "highly_engaged": highly_engaged[:10],  # Top 10
-                "moderately_engaged": moderately_engaged[:10],
-                "lightly_engaged": lightly_engaged[:10],
-                "inactive": inactive[:10]
-            },
-            "avg_activities_per_active_user": sum(user_activity_counts.values()) / len(user_activity_counts) if user_activity_counts else 0
+            "highly_engaged_users": level_counts["highly_engaged"],
+            "moderately_engaged_users": level_counts["moderately_engaged"],
+            "lightly_engaged_users": level_counts["lightly_engaged"],
+            "inactive_users": level_counts["inactive"],
+            "engagement_distribution": engagement_distribution,
+            "avg_activities_per_active_user": active_activity_total / active_users if active_users else 0
         }
     
     @staticmethod
@@ -392,49 +593,52 @@ class UserActivityService:
         days: int = 30
     ) -> Dict[str, Any]:
         """Track usage of different platform features"""
+        return UserActivityService._compute_feature_usage(db, tpa_id, days)
+    
+    @staticmethod
+    def _compute_feature_usage(
+        db: Session,
+        tpa_id: Optional[str] = None,
+        days: int = 30
+    ) -> Dict[str, Any]:
+        """Compute feature usage counts with blocking queries"""
         
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        # Get audit logs for the period
-        logs_query = db.query(AuditLog).filter(AuditLog.created_at >= start_date)
+        # Get daily activity counts for the period from the daily rollup
+        rollup_query = db.query(
+            user_daily_activity.c.day,
+            user_daily_activity.c.user_id,
+            user_daily_activity.c.action,
+            user_daily_activity.c.resource_type,
+            user_daily_activity.c.cnt
+        ).filter(user_daily_activity.c.day >= start_date.date())
         if tpa_id:
-            logs_query = logs_query.filter(AuditLog.tpa_id == tpa_id)
-        
-        all_logs = logs_query.all()
-        
-        # Feature mapping based on actions and resource types
-        feature_mapping = {
-            "chat_queries": ["query", "conversation"],
-            "document_management": ["upload", "download", "document"],
-            "user_management": ["user_create", "user_update", "user_delete"],
-            "analytics_viewing": ["analytics", "dashboard"],
-            "admin_functions": ["admin_action", "tpa_management"],
-            "authentication": ["login", "logout", "session_start"]
-        }
+            rollup_query = rollup_query.filter(user_daily_activity.c.tpa_id == tpa_id)
         
-        feature_usage = {}
-        feature_users = {}
+        activity_rows = rollup_query.all()
         
-        for feature, actions in feature_mapping.items():
-            feature_logs = [
-                log for log in all_logs 
-                if log.action in actions or log.resource_type in actions
-            ]
-            
-            feature_usage[feature] = len(feature_logs)
-            feature_users[feature] = len(set([log.user_id for log in feature_logs if log.user_id]))
-        
-        # Calculate daily usage trends
-        daily_feature_usage = {}
-        for log in all_logs:
-            day = log.created_at.date().isoformat()
-            if day not in daily_feature_usage:
-                daily_feature_usage[day] = {}
+        feature_usage = {feature: 0 for feature in _FEATURE_MAPPING}
+        feature_user_ids = {feature: set() for feature in _FEATURE_MAPPING}
+        daily_feature_usage = defaultdict(Counter)
+        
+        # Map each row to its features in one pass
+        for row in activity_rows:
+            day_usage = daily_feature_usage[row.day.isoformat()]
+            features = {
+                _ACTION_TO_FEATURE.get(row.action),
+                _ACTION_TO_FEATURE.get(row.resource_type)
+            }
+            features.discard(None)
             
-            for feature, actions in feature_mapping.items():
-                if log.action in actions or log.resource_type in actions:
-                    daily_feature_usage[day][feature] = daily_feature_usage[day].get(feature, 0) + 1
+            for feature in features:
+                feature_usage[feature] += row.cnt
+                day_usage[feature] += row.cnt
+                if row.user_id:
+                    feature_user_ids[feature].add(row.user_id)
+        
+        feature_users = {feature: len(user_ids) for feature, user_ids in feature_user_ids.items()}
         
         return {
             "period_days": days,
@@ -453,14 +657,18 @@ class UserActivityService:
     ) -> Dict[str, Any]:
         """Generate actionable insights from user activity data"""
         
-        # Get various metrics
-        engagement_metrics = await UserActivityService.get_user_engagement_metrics(db, tpa_id, days)
-        feature_usage = await UserActivityService.track_feature_usage(db, tpa_id, days)
-        
+        # Get various metrics concurrently, each in a worker thread on its own session
+        metric_tasks = [
+            _run_in_session(UserActivityService._compute_user_engagement_metrics, tpa_id, days),
+            _run_in_session(UserActivityService._compute_feature_usage, tpa_id, days)
+        ]
         if tpa_id:
-            tpa_overview = await UserActivityService.get_tpa_activity_overview(db, tpa_id, days)
-        else:
-            tpa_overview = None
+            metric_tasks.append(
+                _run_in_session(UserActivityService._compute_tpa_activity_overview, tpa_id, days)
+            )
+        
+        engagement_metrics, feature_usage, *tpa_results = await asyncio.gather(*metric_tasks)
+        tpa_overview = tpa_results[0] if tpa_results else None
         
         insights = []
         recommendations = []
@@ -514,63 +722,49 @@ class UserActivityService:
     ) -> Dict[str, Any]:
         """Predict likelihood of user churn based on activity patterns"""
         
-        # Get user's historical activity for longer period
-        ninety_days_ago = datetime.utcnow() - timedelta(days=90)
-        user_logs = db.query(AuditLog).filter(
-            and_(
-                AuditLog.user_id == user_id,
-                AuditLog.created_at >= ninety_days_ago
+        # Count the user's activity windows in one pass over the period
+        now = datetime.utcnow()
+        period_filter = and_(
+            AuditLog.user_id == user_id,
+            AuditLog.created_at >= now - timedelta(days=90)
+        )
+        
+        total_activity, recent_activity, previous_week_activity, month_ago_activity = db.query(
+            func.count(AuditLog.id),
+            func.count(AuditLog.id).filter(AuditLog.created_at >= now - timedelta(days=7)),
+            func.count(AuditLog.id).filter(
+                and_(
+                    AuditLog.created_at >= now - timedelta(days=14),
+                    AuditLog.created_at < now - timedelta(days=7)
+                )
+            ),
+            func.count(AuditLog.id).filter(
+                and_(
+                    AuditLog.created_at >= now - timedelta(days=30),
+                    AuditLog.created_at < now - timedelta(days=23)
+                )
             )
-        ).order_by(AuditLog.created_at.desc()).all()
+        ).filter(period_filter).one()
         
-        if len(user_logs) < 5:
+        if total_activity < 5:
             return {"risk_level": "unknown", "reason": "insufficient_data"}
         
-        # Calculate activity trend
-        recent_activity = len([
-            log for log in user_logs 
-            if log.created_at >= datetime.utcnow() - timedelta(days=7)
-        ])
-        
-        previous_week_activity = len([
-            log for log in user_logs 
-            if log.created_at >= datetime.utcnow() - timedelta(days=14) and
-            log.created_at < datetime.utcnow() - timedelta(days=7)
-        ])
-        
-        month_ago_activity = len([
-            log for log in user_logs 
-            if log.created_at >= datetime.utcnow() - timedelta(days=30) and
-            log.created_at < datetime.utcnow() - timedelta(days=23)
-        ])
+        # Failed activities trend
+        last_20_logs = db.query(AuditLog.success).filter(period_filter).order_by(
+            AuditLog.created_at.desc()
+        ).limit(20).subquery()
+        recent_failed = db.query(func.count()).select_from(last_20_logs).filter(
+            last_20_logs.c.success.is_(False)
+        ).scalar()
         
         # Risk factors
-        risk_factors = []
-        risk_score = 0
-        
-        # Declining activity trend
-        if recent_activity < previous_week_activity * 0.5:
-            risk_factors.append("Activity declining sharply")
-            risk_score += 30
-        
-        # No activity in recent days
-        if recent_activity == 0:
-            risk_factors.append("No activity in past 7 days")
-            risk_score += 40
-        
-        # Low overall activity
-        avg_weekly_activity = (recent_activity + previous_week_activity + month_ago_activity) / 3
-        if avg_weekly_activity < 3:
-            risk_factors.append("Consistently low activity")
-            risk_score += 20
-        
-        # Failed activities trend
-        recent_failed = len([
-            log for log in user_logs[:20] if not log.success
-        ])
-        if recent_failed > 5:
-            risk_factors.append("High failure rate in recent activities")
-            risk_score += 25
+        risk_score, factor_mask = UserActivityService._score_churn_risk(
+            recent_activity, previous_week_activity, month_ago_activity, recent_failed
+        )
+        risk_factors = [
+            label for bit, (label, _) in enumerate(_CHURN_RISK_FACTORS)
+            if factor_mask & (1 << bit)
+        ]
         
         # Determine risk level
         if risk_score >= 70:
@@ -593,30 +787,42 @@ class UserActivityService:
             "recommendations": UserActivityService._get_churn_prevention_recommendations(risk_level)
         }
     
+    @staticmethod
+    def _score_churn_risk(
+        recent_activity: int,
+        previous_week_activity: int,
+        month_ago_activity: int,
+        recent_failed: int
+    ) -> Tuple[int, int]:
+        """Score churn risk from window counts, returning the score and a bitmask of risk factors"""
+        factor_mask = 0
+        
+        # Declining activity trend
+        if recent_activity < previous_week_activity * 0.5:
+            factor_mask |= 1
+        
+        # No activity in recent days
+        if recent_activity == 0:
+            factor_mask |= 2
+        
+        # Low overall activity
+        if recent_activity + previous_week_activity + month_ago_activity < 9:
+            factor_mask |= 4
+        
+        # Failed activities trend
+        if recent_failed > 5:
+            factor_mask |= 8
+        
+        risk_score = sum(
+            weight for bit, (_, weight) in enumerate(_CHURN_RISK_FACTORS)
+            if factor_mask & (1 << bit)
+        )
+        return risk_score, factor_mask
+    
     @staticmethod
     def _get_churn_prevention_recommendations(risk_level: str) -> List[str]:
         """Get recommendations based on churn risk level"""
-        recommendations = {
-            "high": [
-                "Send immediate re-engagement email",
-                "Offer personalized training session",
-                "Check for technical issues or access problems",
-                "Consider account manager outreach"
-            ],
-            "medium": [
-                "Send feature highlight email",
-                "Provide usage tips and best practices",
-                "Monitor closely for next 2 weeks"
-            ],
-            "low": [
-                "Include in general engagement campaigns",
-                "Monitor activity patterns"
-            ],
-            "very_low": [
-                "User appears to be actively engaged"
-            ]
-        }
-        return recommendations.get(risk_level, [])
+        return list(_CHURN_RECOMMENDATIONS.get(risk_level, ()))
     
     @staticmethod
     async def get_user_journey_analytics(
@@ -629,48 +835,40 @@ class UserActivityService:
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=days)
         
-        user_logs = db.query(AuditLog).filter(
+        logs_query = db.query(
+            AuditLog.action,
+            AuditLog.resource_type,
+            AuditLog.created_at,
+            extract('week', AuditLog.created_at).label("week")
+        ).filter(
             and_(
                 AuditLog.user_id == user_id,
                 AuditLog.created_at >= start_date
             )
-        ).order_by(AuditLog.created_at.asc()).all()
-        
-        if not user_logs:
-            return {"user_id": user_id, "journey_data": None}
+        ).order_by(AuditLog.created_at.asc())
         
-        # Feature adoption timeline
+        # Fold adoption, progression and frequency data in a single pass
         feature_first_use = {}
-        feature_usage_count = {}
-        
-        for log in user_logs:
-            feature = log.resource_type
-            if feature not in feature_first_use:
-                feature_first_use[feature] = log.created_at
-            feature_usage_count[feature] = feature_usage_count.get(feature, 0) + 1
+        feature_usage_count = Counter()
+        weekly_activity = Counter()
+        seen_activity = set()
+        
+        for log in logs_query.execution_options(stream_results=True, yield_per=5000):
+            feature_first_use.setdefault(log.resource_type, log.created_at)
+            feature_usage_count[log.resource_type] += 1
+            weekly_activity[int(log.week)] += 1
+            seen_activity.add(log.action)
+            seen_activity.add(log.resource_type)
+        
+        if not weekly_activity:
+            return {"user_id": user_id, "journey_data": None}
         
         # User progression stages
-        stages = {
-            "onboarding": ["authentication", "login"],
-            "exploration": ["dashboard", "analytics"],
-            "content_creation": ["document", "upload"],
-            "active_usage": ["query", "conversation"],
-            "advanced_usage": ["admin", "user_management"]
+        stage_completion = {
+            stage: not seen_activity.isdisjoint(actions)
+            for stage, actions in _JOURNEY_STAGES.items()
         }
         
-        stage_completion = {}
-        for stage, actions in stages.items():
-            completed = any(action in [log.action for log in user_logs] or 
-                          action in [log.resource_type for log in user_logs] 
-                          for action in actions)
-            stage_completion[stage] = completed
-        
-        # Activity frequency patterns
-        weekly_activity = {}
-        for log in user_logs:
-            week = log.created_at.isocalendar()[1]
-            weekly_activity[week] = weekly_activity.get(week, 0) + 1
-        
         return {
             "user_id": user_id,
             "analysis_period": days,
@@ -685,7 +883,7 @@ class UserActivityService:
             },
             "activity_patterns": {
                 "weekly_activity": weekly_activity,
-                "most_active_week": max(weekly_activity.items(), key=lambda x: x[1])[0] if weekly_activity else None,
+                "most_active_week": weekly_activity.most_common(1)[0][0] if weekly_activity else None,
                 "consistency_score": len(weekly_activity) / (days // 7) * 100 if days >= 7 else 100
             },
             "journey_insights": UserActivityService._generate_journey_insights(stage_completion, feature_usage_count)
@@ -717,6 +915,7 @@ class UserActivityService:
         return insights
     
     @staticmethod
+    @_cached_result("real_time", _REAL_TIME_CACHE_TTL_SECONDS)
     async def track_real_time_activity(
         db: Session,
         tpa_id: Optional[str] = None,
@@ -727,36 +926,36 @@ class UserActivityService:
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
         
-        # Get recent audit logs
-        logs_query = db.query(AuditLog).filter(AuditLog.created_at >= start_time)
+        # Get recent audit log totals in a single row
+        recent_filter = AuditLog.created_at >= start_time
         if tpa_id:
-            logs_query = logs_query.filter(AuditLog.tpa_id == tpa_id)
-        
-        recent_logs = logs_query.all()
-        
-        # Calculate real-time metrics
-        total_activities = len(recent_logs)
-        unique_users = len(set([log.user_id for log in recent_logs if log.user_id]))
-        failed_activities = len([log for log in recent_logs if not log.success])
-        
-        # Hourly breakdown
-        hourly_activity = {}
-        for log in recent_logs:
-            hour = log.created_at.hour
-            hourly_activity[hour] = hourly_activity.get(hour, 0) + 1
+            recent_filter = and_(recent_filter, AuditLog.tpa_id == tpa_id)
+        
+        total_activities, failed_activities, unique_users, security_events_count = db.query(
+            func.count(AuditLog.id),
+            func.sum(case((AuditLog.success.is_(False), 1), else_=0)),
+            func.count(func.distinct(AuditLog.user_id)),
+            func.sum(case((AuditLog.resource_type == "security", 1), else_=0))
+        ).filter(recent_filter).one()
+        failed_activities = failed_activities or 0
+        security_events_count = security_events_count or 0
+        
+        # Hourly and action breakdowns
+        activity_hour = extract('hour', AuditLog.created_at)
+        hourly_activity = Counter()
+        action_breakdown = Counter()
+        for hour, action, count in db.query(
+            activity_hour,
+            AuditLog.action,
+            func.count(AuditLog.id)
+        ).filter(recent_filter).group_by(activity_hour, AuditLog.action).all():
+            hourly_activity[int(hour)] += count
+            action_breakdown[action] += count
         
         # Current hour activity
         current_hour = datetime.utcnow().hour
         current_hour_activity = hourly_activity.get(current_hour, 0)
         
-        # Action breakdown for current period
-        action_breakdown = {}
-        for log in recent_logs:
-            action_breakdown[log.action] = action_breakdown.get(log.action, 0) + 1
-        
-        # Security events in timeframe
-        security_events = [log for log in recent_logs if log.resource_type == "security"]
-        
         return {
             "timeframe_hours": hours,
             "total_activities": total_activities,
@@ -766,10 +965,10 @@ class UserActivityService:
             "activities_per_hour": total_activities / hours,
             "current_hour_activity": current_hour_activity,
             "hourly_breakdown": hourly_activity,
-            "top_actions": sorted(action_breakdown.items(), key=lambda x: x[1], reverse=True)[:5],
-            "security_events_count": len(security_events),
+            "top_actions": action_breakdown.most_common(5),
+            "security_events_count": security_events_count,
             "real_time_alerts": UserActivityService._generate_real_time_alerts(
-                total_activities, failed_activities, len(security_events), hours
+                total_activities, failed_activities, security_events_count, hours
             )
         }
     
@@ -810,4 +1009,41 @@ class UserActivityService:
                 "recommendation": "Monitor for system issues or user access problems"
             })
         
-        return alerts
\ No newline at end of file
+        return alerts
+
+
+async def _run_in_session(method, *args) -> Any:
+    """Run a blocking analytics method in a worker thread on a dedicated session"""
+    def run() -> Any:
+        with get_db_context() as db:
+            return method(db, *args)
+    
+    return await asyncio.to_thread(run)
+
+
+async def run_daily_activity_refresher() -> None:
+    """Background worker keeping the daily activity rollup current from a single process"""
+    # A dedicated connection, since the refresher lock belongs to it
+    connection: Optional[Connection] = None
+    try:
+        while True:
+            await asyncio.sleep(settings.ACTIVITY_ROLLUP_REFRESH_SECONDS)
+            try:
+                if connection is None:
+                    connection = await asyncio.to_thread(engine.connect)
+                refreshed = await asyncio.to_thread(UserActivityService.refresh_daily_activity_rollup, connection)
+            except Exception as e:
+                logger.error(f"Failed to refresh daily activity rollup: {e}")
+                # Discard the connection (releasing the lock) and reconnect next time
+                if connection is not None:
+                    connection.invalidate()
+                    connection = None
+                continue
+            
+            if refreshed:
+                for prefix in _ROLLUP_CACHE_PREFIXES:
+                    await cache_delete_pattern(f"activity:{prefix}:*")
+    finally:
+        # Invalidate rather than return it to the pool, which would keep the lock held
+        if connection is not None:
+            connection.invalidate()
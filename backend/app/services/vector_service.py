@@ -1,18 +1,193 @@
 """
 Vector database service using Pinecone
 """
+import asyncio
+import functools
 import pinecone
 from typing import List, Dict, Any, Optional, Tuple
 import json
+import hashlib
 import logging
-from datetime import datetime
+import operator
+import time
 
+import numpy as np
+from async_lru import alru_cache
+
+from app.core.cache import cache_get_bytes, cache_incr, cache_set_bytes
 from app.core.config import settings
+from app.core.database import get_db_context
 from app.core.exceptions import AIServiceError
+from app.models.document import DocumentChunk
 from app.services.ai_service import ai_service
 
 logger = logging.getLogger(__name__)
 
+# Texts per embedding request, vectors per Pinecone upsert request, and ids
+# per Pinecone delete request (the API maximum)
+_EMBEDDING_BATCH_SIZE = 256
+_UPSERT_BATCH_SIZE = 100
+_DELETE_BATCH_SIZE = 1000
+
+# Chunk metadata fields stored in Pinecone as given
+_CHUNK_METADATA_FIELDS = (
+    "tpa_id",
+    "document_id",
+    "document_type",
+    "health_plan_id",
+    "chunk_index",
+    "page_number",
+    "chunk_type"
+)
+
+# Match fields and metadata fields copied into search results
+_match_fields = operator.attrgetter("id", "score", "metadata")
+_RESULT_METADATA_FIELDS = (
+    "document_id",
+    "document_type",
+    "health_plan_id",
+    "chunk_index",
+    "page_number",
+    "section_title",
+    "chunk_type"
+)
+
+# Pinecone client and index handle shared by every VectorService instance,
+# created once under the lock. The index existence check is reused for an hour.
+_shared_pc: Optional["pinecone.Pinecone"] = None
+_shared_index = None
+_index_verified_at: Optional[float] = None
+_init_lock = asyncio.Lock()
+_INDEX_CHECK_TTL_SECONDS = 3600
+
+# Embedding dimension of the index
+_EMBEDDING_DIMENSION = 1536
+
+# Semantic query cache: recent searches, reused when a new query embedding is
+# nearly identical and the filters match. The threshold is deliberately
+# conservative to keep wrong hits rare. Embeddings are held as int8 codes, a
+# quarter of the float32 footprint.
+_QUERY_CACHE_CAPACITY = 8192
+_QUERY_CACHE_SIMILARITY = 0.97
+_QUERY_CACHE_TTL_SECONDS = 600
+
+# Redis generation counters that are part of every query cache key. Writes bump
+# the TPA's counter, or the global one when the TPA is unknown, so every worker
+# stops serving results from before the write.
+_QUERY_GENERATION_KEY = "vector:generation"
+
+
+class _SemanticQueryCache:
+    """Fixed-size LRU of search results keyed by filter and query embedding similarity"""
+    
+    def __init__(self, capacity: int, dimension: int, similarity: float, ttl_seconds: float):
+        self.similarity = similarity
+        self.ttl_seconds = ttl_seconds
+        self._codes = np.zeros((capacity, dimension), dtype=np.int8)
+        self._scales = np.zeros(capacity, dtype=np.float32)
+        self._keys: List[Optional[str]] = [None] * capacity
+        self._results: List[Optional[List[Dict[str, Any]]]] = [None] * capacity
+        self._stored_at = np.zeros(capacity)
+        self._last_used = np.zeros(capacity)
+        self._slots_by_key: Dict[str, set] = {}
+    
+    def get(self, key: str, embedding: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        """Return cached results for the most similar fresh query under the same filters"""
+        slots = self._slots_by_key.get(key)
+        if not slots:
+            return None
+        
+        now = time.monotonic()
+        slot_ids = np.fromiter(slots, dtype=np.intp, count=len(slots))
+        query = self._normalize(embedding)
+        similarities = (self._codes[slot_ids] @ query) * self._scales[slot_ids]
+        similarities[now - self._stored_at[slot_ids] > self.ttl_seconds] = -1.0
+        
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity:
+            return None
+        
+        slot = int(slot_ids[best])
+        self._last_used[slot] = now
+        # Callers annotate result dicts, so hand out copies
+        return [dict(result) for result in self._results[slot]]
+    
+    def put(self, key: str, embedding: np.ndarray, results: List[Dict[str, Any]]) -> None:
+        """Store results for a query, evicting the least recently used entry when full"""
+        slot = int(np.argmin(self._last_used))
+        old_key = self._keys[slot]
+        if old_key is not None:
+            old_slots = self._slots_by_key[old_key]
+            old_slots.discard(slot)
+            if not old_slots:
+                del self._slots_by_key[old_key]
+        
+        now = time.monotonic()
+        self._codes[slot], self._scales[slot] = self._quantize(self._normalize(embedding))
+        self._keys[slot] = key
+        self._results[slot] = [dict(result) for result in results]
+        self._stored_at[slot] = now
+        self._last_used[slot] = now
+        self._slots_by_key.setdefault(key, set()).add(slot)
+    
+    def clear(self) -> None:
+        """Drop every cached entry"""
+        self._keys = [None] * len(self._keys)
+        self._results = [None] * len(self._results)
+        self._last_used[:] = 0
+        self._slots_by_key.clear()
+    
+    @staticmethod
+    def _quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Symmetric int8 quantization with a per-vector scale"""
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        return np.round(vector / scale).astype(np.int8), scale
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        """Scale an embedding to unit length so dot products are cosine similarities"""
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+
+# Shared by every VectorService instance so writes through one are seen by all
+_query_cache = _SemanticQueryCache(
+    _QUERY_CACHE_CAPACITY,
+    _EMBEDDING_DIMENSION,
+    _QUERY_CACHE_SIMILARITY,
+    _QUERY_CACHE_TTL_SECONDS
+)
+
+
+async def _query_generation(tpa_id: str) -> str:
+    """Current global and per-TPA generations, for use in a query cache key"""
+    global_generation, tpa_generation = await asyncio.gather(
+        cache_get_bytes(_QUERY_GENERATION_KEY),
+        cache_get_bytes(f"{_QUERY_GENERATION_KEY}:{tpa_id}")
+    )
+    return f"{int(global_generation or 0)}.{int(tpa_generation or 0)}"
+
+
+async def _invalidate_queries(tpa_ids: Optional[set] = None) -> None:
+    """Invalidate cached search results for the given TPAs, or for all when None"""
+    _query_cache.clear()
+    if tpa_ids is None:
+        await cache_incr(_QUERY_GENERATION_KEY)
+    else:
+        await asyncio.gather(*(cache_incr(f"{_QUERY_GENERATION_KEY}:{tpa_id}") for tpa_id in tpa_ids))
+
+
+def ensure_initialized(method):
+    """Connect to Pinecone before the first call of a VectorService method"""
+    
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        if not self.initialized:
+            await self.initialize()
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+
 class VectorService:
     """Service for vector database operations using Pinecone"""
     
@@ -22,48 +197,112 @@ class VectorService:
         self.initialized = False
         
     async def initialize(self):
-        """Initialize Pinecone connection"""
-        try:
-            # Initialize Pinecone
-            self.pc = pinecone.Pinecone(
-                api_key=settings.PINECONE_API_KEY,
-                environment=settings.PINECONE_ENVIRONMENT
-            )
-            
-            # Connect to index
-            index_name = settings.PINECONE_INDEX_NAME
-            
-            # Check if index exists, create if not
-            existing_indexes = self.pc.list_indexes()
-            if index_name not in [idx.name for idx in existing_indexes]:
-                logger.info(f"Creating Pinecone index: {index_name}")
-                self.pc.create_index(
-                    name=index_name,
-                    dimension=1536,  # OpenAI embedding dimension
-                    metric="cosine",
-                    spec=pinecone.ServerlessSpec(
-                        cloud="aws",
-                        region="us-east-1"
+        """Initialize Pinecone connection, shared by every VectorService instance"""
+        global _shared_pc, _shared_index, _index_verified_at
+        
+        if self.initialized:
+            return
+        
+        # Only the first caller connects; concurrent callers wait and reuse its handle
+        async with _init_lock:
+            try:
+                if _shared_index is None:
+                    # Initialize Pinecone
+                    pc = pinecone.Pinecone(
+                        api_key=settings.PINECONE_API_KEY,
+                        environment=settings.PINECONE_ENVIRONMENT
                     )
-                )
-            
-            self.index = self.pc.Index(index_name)
-            self.initialized = True
-            
-            logger.info("Vector service initialized successfully")
-            
-        except Exception as e:
-            logger.error(f"Failed to initialize vector service: {e}")
-            raise AIServiceError(f"Vector service initialization failed: {e}", "Pinecone")
+                    
+                    # Connect to index
+                    index_name = settings.PINECONE_INDEX_NAME
+                    
+                    # Check if index exists, create if not (skipped if checked recently)
+                    now = time.monotonic()
+                    if _index_verified_at is None or now - _index_verified_at > _INDEX_CHECK_TTL_SECONDS:
+                        existing_indexes = await asyncio.to_thread(pc.list_indexes)
+                        if index_name not in [idx.name for idx in existing_indexes]:
+                            logger.info(f"Creating Pinecone index: {index_name}")
+                            await asyncio.to_thread(
+                                pc.create_index,
+                                name=index_name,
+                                dimension=_EMBEDDING_DIMENSION,  # OpenAI embedding dimension
+                                metric="cosine",
+                                spec=pinecone.ServerlessSpec(
+                                    cloud="aws",
+                                    region="us-east-1"
+                                )
+                            )
+                        _index_verified_at = now
+                    
+                    _shared_index = pc.Index(index_name)
+                    _shared_pc = pc
+                    
+                    logger.info("Vector service initialized successfully")
+                
+                self.pc = _shared_pc
+                self.index = _shared_index
+                self.initialized = True
+                
+            except Exception as e:
+                logger.error(f"Failed to initialize vector service: {e}")
+                raise AIServiceError(f"Vector service initialization failed: {e}", "Pinecone")
     
     async def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using AI service"""
-        try:
-            return await ai_service.create_embedding(text.replace("\n", " "))
+        """Generate embedding for text, reusing the cached embedding of identical text"""
+        return (await self.generate_embeddings([text]))[0]
+    
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts, batching cache misses into few API calls"""
+        texts = [text.replace("\n", " ") for text in texts]
+        cache_keys = [self._embedding_cache_key(text) for text in texts]
+        
+        cached = await asyncio.gather(*(cache_get_bytes(key) for key in cache_keys))
+        embeddings = [
+            np.frombuffer(value, dtype=np.float32).tolist() if value is not None else None
+            for value in cached
+        ]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        
+        for start in range(0, len(missing), _EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + _EMBEDDING_BATCH_SIZE]
+            try:
+                batch_embeddings = await ai_service.create_embeddings([texts[i] for i in batch])
+                
+            except Exception as e:
+                logger.error(f"Failed to generate embeddings: {e}")
+                raise AIServiceError(f"Embedding generation failed: {e}", "AI_SERVICE")
             
-        except Exception as e:
-            logger.error(f"Failed to generate embedding: {e}")
-            raise AIServiceError(f"Embedding generation failed: {e}", "AI_SERVICE")
+            # Packed float32 is about a fifth of the size of the JSON-encoded vector
+            for i, embedding in zip(batch, batch_embeddings):
+                embeddings[i] = embedding
+            await asyncio.gather(*(
+                cache_set_bytes(
+                    cache_keys[i],
+                    np.asarray(embeddings[i], dtype=np.float32).tobytes(),
+                    settings.EMBEDDING_CACHE_TTL_SECONDS
+                )
+                for i in batch
+            ))
+        
+        return embeddings
+    
+    @staticmethod
+    def _embedding_cache_key(text: str) -> str:
+        """Cache key for an embedding, partitioned by provider and model"""
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        return f"emb:{ai_service.provider.value}:{ai_service.get_embedding_model()}:{text_hash}"
+    
+    async def embed_query(self, query: str) -> List[float]:
+        """Get the embedding for a search query, cached on its normalized text"""
+        embedding = await self._embed_normalized_query(" ".join(query.lower().split()))
+        return embedding.tolist()
+    
+    @alru_cache(maxsize=4096)
+    async def _embed_normalized_query(self, query_norm: str) -> np.ndarray:
+        """Embed a normalized query; failures are not cached"""
+        # Cached as packed float32, about an eighth of the memory of a list
+        # of Python floats
+        return np.asarray(await self.generate_embedding(query_norm), dtype=np.float32)
     
     async def upsert_document_chunk(
         self,
@@ -72,39 +311,55 @@ class VectorService:
         metadata: Dict[str, Any]
     ) -> bool:
         """Store document chunk in vector database"""
-        if not self.initialized:
-            await self.initialize()
+        return await self.upsert_document_chunks([(chunk_id, text, metadata)])
+    
+    @ensure_initialized
+    async def upsert_document_chunks(
+        self,
+        items: List[Tuple[str, str, Dict[str, Any]]],
+        embeddings: Optional[List[List[float]]] = None
+    ) -> bool:
+        """Store (chunk_id, text, metadata) chunks, embedding and upserting them in batches"""
+        if not items:
+            return True
         
         try:
-            # Generate embedding
-            embedding = await self.generate_embedding(text)
-            
-            # Prepare metadata (Pinecone has metadata size limits)
-            pinecone_metadata = {
-                "text": text[:8000],  # Limit text size
-                "tpa_id": metadata.get("tpa_id"),
-                "document_id": metadata.get("document_id"),
-                "document_type": metadata.get("document_type"),
-                "health_plan_id": metadata.get("health_plan_id"),
-                "chunk_index": metadata.get("chunk_index"),
-                "page_number": metadata.get("page_number"),
-                "section_title": metadata.get("section_title", "")[:100],
-                "chunk_type": metadata.get("chunk_type"),
-                "created_at": datetime.utcnow().isoformat()
-            }
+            # Generate embeddings unless the caller already has them
+            if embeddings is None:
+                embeddings = await self.generate_embeddings([text for _, text, _ in items])
             
-            # Remove None values
-            pinecone_metadata = {k: v for k, v in pinecone_metadata.items() if v is not None}
+            # One epoch timestamp per batch; integers allow $gte/$lt range filters
+            created_at = int(time.time())
+            vectors = [
+                (chunk_id, embedding, self._build_chunk_metadata(text, metadata, created_at))
+                for (chunk_id, text, metadata), embedding in zip(items, embeddings)
+            ]
             
-            # Upsert to Pinecone
-            self.index.upsert([(chunk_id, embedding, pinecone_metadata)])
+            # Upsert to Pinecone off the event loop
+            await asyncio.to_thread(self.index.upsert, vectors=vectors, batch_size=_UPSERT_BATCH_SIZE)
             
+            # Searches must see the new chunks
+            await _invalidate_queries({metadata.get("tpa_id") for _, _, metadata in items})
             return True
             
         except Exception as e:
-            logger.error(f"Failed to upsert document chunk: {e}")
+            logger.error(f"Failed to upsert document chunks: {e}")
             raise AIServiceError(f"Vector upsert failed: {e}", "Pinecone")
     
+    @staticmethod
+    def _build_chunk_metadata(text: str, metadata: Dict[str, Any], created_at: int) -> Dict[str, Any]:
+        """Prepare chunk metadata (Pinecone has metadata size limits)"""
+        # Copy the plain fields in one pass, skipping None values
+        pinecone_metadata = {
+            key: value for key in _CHUNK_METADATA_FIELDS
+            if (value := metadata.get(key)) is not None
+        }
+        pinecone_metadata["text"] = text[:8000]  # Limit text size
+        pinecone_metadata["section_title"] = (metadata.get("section_title") or "")[:100]
+        pinecone_metadata["created_at"] = created_at
+        return pinecone_metadata
+    
+    @ensure_initialized
     async def search_similar_chunks(
         self,
         query: str,
@@ -115,12 +370,17 @@ class VectorService:
         score_threshold: float = 0.7
     ) -> List[Dict[str, Any]]:
         """Search for similar document chunks"""
-        if not self.initialized:
-            await self.initialize()
-        
         try:
-            # Generate query embedding
-            query_embedding = await self.generate_embedding(query)
+            # Generate query embedding (repeat queries hit the cache)
+            query_embedding = await self.embed_query(query)
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            
+            # Near-identical recent queries with the same filters reuse their results
+            generation = await _query_generation(tpa_id)
+            cache_key = f"{generation}|{tpa_id}|{health_plan_id}|{document_type}|{top_k}|{score_threshold}"
+            cached = _query_cache.get(cache_key, query_vector)
+            if cached is not None:
+                return cached
             
             # Build filter
             filter_dict = {"tpa_id": {"$eq": tpa_id}}
@@ -131,8 +391,9 @@ class VectorService:
             if document_type:
                 filter_dict["document_type"] = {"$eq": document_type}
             
-            # Search Pinecone
-            search_response = self.index.query(
+            # Search Pinecone off the event loop
+            search_response = await asyncio.to_thread(
+                self.index.query,
                 vector=query_embedding,
                 filter=filter_dict,
                 top_k=top_k,
@@ -140,51 +401,61 @@ class VectorService:
                 include_values=False
             )
             
-            # Process results
+            # Process results, thresholding all scores at once
+            matches = search_response.matches
+            scores = np.fromiter((match.score for match in matches), dtype=np.float64, count=len(matches))
             results = []
-            for match in search_response.matches:
-                if match.score >= score_threshold:
-                    result = {
-                        "chunk_id": match.id,
-                        "score": float(match.score),
-                        "text": match.metadata.get("text", ""),
-                        "document_id": match.metadata.get("document_id"),
-                        "document_type": match.metadata.get("document_type"),
-                        "health_plan_id": match.metadata.get("health_plan_id"),
-                        "chunk_index": match.metadata.get("chunk_index"),
-                        "page_number": match.metadata.get("page_number"),
-                        "section_title": match.metadata.get("section_title"),
-                        "chunk_type": match.metadata.get("chunk_type")
-                    }
-                    results.append(result)
+            for i in np.flatnonzero(scores >= score_threshold):
+                chunk_id, score, metadata = _match_fields(matches[i])
+                result = {"chunk_id": chunk_id, "score": float(score), "text": metadata.get("text", "")}
+                result.update(zip(_RESULT_METADATA_FIELDS, map(metadata.get, _RESULT_METADATA_FIELDS)))
+                results.append(result)
             
+            _query_cache.put(cache_key, query_vector, results)
             return results
             
         except Exception as e:
             logger.error(f"Failed to search similar chunks: {e}")
             raise AIServiceError(f"Vector search failed: {e}", "Pinecone")
     
-    async def delete_document_chunks(self, document_id: str) -> bool:
-        """Delete all chunks for a document"""
-        if not self.initialized:
-            await self.initialize()
-        
+    @ensure_initialized
+    async def delete_document_chunks(
+        self,
+        document_id: str,
+        chunk_ids: Optional[List[str]] = None,
+        tpa_id: Optional[str] = None
+    ) -> bool:
+        """Delete all chunks for a document, by id when the chunks are known locally"""
         try:
-            # Delete by filter
-            self.index.delete(filter={"document_id": {"$eq": document_id}})
+            # Chunk rows share their ids with the vectors; callers that delete
+            # the rows first should pass the ids they removed
+            if chunk_ids is None:
+                chunk_ids = await asyncio.to_thread(_load_chunk_ids, document_id)
+            
+            if chunk_ids:
+                for start in range(0, len(chunk_ids), _DELETE_BATCH_SIZE):
+                    await asyncio.to_thread(
+                        self.index.delete,
+                        ids=chunk_ids[start:start + _DELETE_BATCH_SIZE]
+                    )
+            else:
+                # No local chunks (e.g. orphaned vectors), fall back to deleting by filter
+                await asyncio.to_thread(self.index.delete, filter={"document_id": {"$eq": document_id}})
+            
+            # Searches must stop returning the deleted chunks; without the TPA,
+            # every cached search is invalidated
+            await _invalidate_queries({tpa_id} if tpa_id else None)
             return True
             
         except Exception as e:
             logger.error(f"Failed to delete document chunks: {e}")
             raise AIServiceError(f"Vector deletion failed: {e}", "Pinecone")
     
+    @ensure_initialized
     async def get_index_stats(self) -> Dict[str, Any]:
         """Get index statistics"""
-        if not self.initialized:
-            await self.initialize()
-        
         try:
-            stats = self.index.describe_index_stats()
+            stats = await asyncio.to_thread(self.index.describe_index_stats)
             return {
                 "total_vector_count": stats.total_vector_count,
                 "dimension": stats.dimension,
@@ -194,4 +465,14 @@ class VectorService:
             
         except Exception as e:
             logger.error(f"Failed to get index stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+
+def _load_chunk_ids(document_id: str) -> List[str]:
+    """Ids of a document's chunks, which are also their vector ids"""
+    with get_db_context() as db:
+        return [
+            chunk_id for (chunk_id,) in db.query(DocumentChunk.id).filter(
+                DocumentChunk.document_id == document_id
+            )
+        ]
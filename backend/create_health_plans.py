@@ -4,6 +4,7 @@ Create health plans for the uploaded documents - Lockhart and Spooner
 """
 import sys
 import os
+import uuid
 from datetime import datetime, date
 
 # Add the app directory to the path
@@ -53,36 +54,39 @@ def create_health_plans():
             }
         ]
         
-        created_plans = []
-        for plan_data in health_plans:
-            # Check if plan already exists
-            existing = db.query(HealthPlan).filter(
-                HealthPlan.plan_number == plan_data["plan_number"],
+        # Check which plans already exist in one query
+        existing_numbers = {
+            plan_number for (plan_number,) in db.query(HealthPlan.plan_number).filter(
+                HealthPlan.plan_number.in_([plan["plan_number"] for plan in health_plans]),
                 HealthPlan.tpa_id == kempton_tpa.id
-            ).first()
-            
-            if existing:
+            )
+        }
+        
+        new_plans = []
+        for plan_data in health_plans:
+            if plan_data["plan_number"] in existing_numbers:
                 print(f"⚠️  Health plan {plan_data['name']} already exists")
-                created_plans.append(existing)
-                continue
-            
-            # Create new health plan
-            health_plan = HealthPlan(**plan_data)
-            db.add(health_plan)
+            else:
+                # Assign IDs up front so they can be reported without a refresh
+                new_plans.append({"id": str(uuid.uuid4()), **plan_data})
+        
+        # Create the new health plans in a single insert and commit
+        if new_plans:
+            db.bulk_insert_mappings(HealthPlan, new_plans)
             db.commit()
-            db.refresh(health_plan)
-            
-            created_plans.append(health_plan)
-            print(f"✅ Created: {health_plan.name}")
-            print(f"   Plan Number: {health_plan.plan_number}")
-            print(f"   Plan ID: {health_plan.id}")
+        
+        for plan_data in new_plans:
+            print(f"✅ Created: {plan_data['name']}")
+            print(f"   Plan Number: {plan_data['plan_number']}")
+            print(f"   Plan ID: {plan_data['id']}")
             print()
         
+        created_plans = health_plans
         print(f"🎉 Health Plans Ready: {len(created_plans)} plans available")
         print()
         print("📋 Summary:")
         for plan in created_plans:
-            print(f"   • {plan.name} ({plan.plan_number})")
+            print(f"   • {plan['name']} ({plan['plan_number']})")
         
         print(f"\n✅ Chat interface can now select from these health plans!")
         
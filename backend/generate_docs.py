@@ -13,6 +13,8 @@ import os
 import sys
 from pathlib import Path
 
+import orjson
+
 # Add the project root to Python path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
@@ -22,10 +24,34 @@ from app.core.openapi import custom_openapi, generate_openapi_json
 from app.core.config import settings
 
 
-def generate_markdown_docs(openapi_schema: dict) -> str:
+def group_endpoints_by_tag(openapi_schema: dict) -> dict:
+    """Group the schema's endpoints by their first tag in a single pass"""
+    
+    endpoints_by_tag = {}
+    
+    for path, methods in openapi_schema.get('paths', {}).items():
+        for method, details in methods.items():
+            if method.upper() in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']:
+                tags = details.get('tags', ['Untagged'])
+                tag = tags[0] if tags else 'Untagged'
+                
+                endpoints_by_tag.setdefault(tag, []).append({
+                    'path': path,
+                    'method': method.upper(),
+                    'summary': details.get('summary', ''),
+                    'description': details.get('description', ''),
+                    'parameters': details.get('parameters', []),
+                    'requestBody': details.get('requestBody'),
+                    'responses': details.get('responses', {})
+                })
+    
+    return endpoints_by_tag
+
+
+def generate_markdown_docs(openapi_schema: dict, endpoints_by_tag: dict = None) -> str:
     """Generate comprehensive Markdown documentation"""
     
-    md_content = f"""# {openapi_schema['info']['title']} API Documentation
+    parts = [f"""# {openapi_schema['info']['title']} API Documentation
 
 Version: {openapi_schema['info']['version']}
 
@@ -54,79 +80,60 @@ curl -X POST "http://localhost:8000/api/v1/auth/login" \\
 
 ## API Endpoints
 
-"""
+"""]
     
-    # Group endpoints by tags
-    endpoints_by_tag = {}
-    
-    for path, methods in openapi_schema.get('paths', {}).items():
-        for method, details in methods.items():
-            if method.upper() in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']:
-                tags = details.get('tags', ['Untagged'])
-                tag = tags[0] if tags else 'Untagged'
-                
-                if tag not in endpoints_by_tag:
-                    endpoints_by_tag[tag] = []
-                
-                endpoints_by_tag[tag].append({
-                    'path': path,
-                    'method': method.upper(),
-                    'summary': details.get('summary', ''),
-                    'description': details.get('description', ''),
-                    'parameters': details.get('parameters', []),
-                    'requestBody': details.get('requestBody'),
-                    'responses': details.get('responses', {})
-                })
+    if endpoints_by_tag is None:
+        endpoints_by_tag = group_endpoints_by_tag(openapi_schema)
     
     # Generate documentation for each tag
     for tag, endpoints in endpoints_by_tag.items():
-        md_content += f"### {tag.title()}\n\n"
+        parts.append(f"### {tag.title()}\n\n")
         
         for endpoint in endpoints:
-            md_content += f"#### {endpoint['method']} {endpoint['path']}\n\n"
+            parts.append(f"#### {endpoint['method']} {endpoint['path']}\n\n")
             
             if endpoint['summary']:
-                md_content += f"**{endpoint['summary']}**\n\n"
+                parts.append(f"**{endpoint['summary']}**\n\n")
             
             if endpoint['description']:
-                md_content += f"{endpoint['description']}\n\n"
+                parts.append(f"{endpoint['description']}\n\n")
             
             # Parameters
             if endpoint['parameters']:
-                md_content += "**Parameters:**\n\n"
-                md_content += "| Name | Type | Required | Description |\n"
-                md_content += "|------|------|----------|-------------|\n"
+                parts.append(
+                    "**Parameters:**\n\n"
+                    "| Name | Type | Required | Description |\n"
+                    "|------|------|----------|-------------|\n"
+                )
                 
                 for param in endpoint['parameters']:
                     name = param.get('name', '')
                     param_type = param.get('schema', {}).get('type', param.get('type', ''))
                     required = 'Yes' if param.get('required', False) else 'No'
                     description = param.get('description', '')
-                    md_content += f"| {name} | {param_type} | {required} | {description} |\n"
+                    parts.append(f"| {name} | {param_type} | {required} | {description} |\n")
                 
-                md_content += "\n"
+                parts.append("\n")
             
             # Request body
             if endpoint['requestBody']:
-                md_content += "**Request Body:**\n\n"
+                parts.append("**Request Body:**\n\n")
                 content = endpoint['requestBody'].get('content', {})
                 for content_type, schema_info in content.items():
-                    md_content += f"Content-Type: `{content_type}`\n\n"
+                    parts.append(f"Content-Type: `{content_type}`\n\n")
                     if 'example' in schema_info:
-                        md_content += "```json\n"
-                        md_content += json.dumps(schema_info['example'], indent=2)
-                        md_content += "\n```\n\n"
+                        parts.append(f"```json\n{json.dumps(schema_info['example'], indent=2)}\n```\n\n")
             
             # Responses
-            md_content += "**Responses:**\n\n"
+            parts.append("**Responses:**\n\n")
             for status_code, response in endpoint['responses'].items():
                 description = response.get('description', '')
-                md_content += f"- **{status_code}**: {description}\n"
+                parts.append(f"- **{status_code}**: {description}\n")
             
-            md_content += "\n---\n\n"
+            parts.append("\n---\n\n")
     
     # Add error handling section
-    md_content += """## Error Handling
+    parts.append("""## Error Handling
 
 The API uses standard HTTP status codes and returns detailed error information:
 
@@ -254,12 +261,12 @@ SmartSPD supports webhooks for real-time notifications:
 - **Support Email**: support@smartspd.com
 - **Status Page**: https://status.smartspd.com
 - **GitHub Issues**: https://github.com/smartspd/api-issues
-"""
+""")
     
-    return md_content
+    return "".join(parts)
 
 
-def generate_postman_collection(openapi_schema: dict) -> dict:
+def generate_postman_collection(openapi_schema: dict, endpoints_by_tag: dict = None) -> dict:
     """Generate Postman collection from OpenAPI schema"""
     
     collection = {
@@ -308,74 +315,77 @@ def generate_postman_collection(openapi_schema: dict) -> dict:
         "item": []
     }
     
-    # Group endpoints by tags for folders
-    folders = {}
+    if endpoints_by_tag is None:
+        endpoints_by_tag = group_endpoints_by_tag(openapi_schema)
     
-    for path, methods in openapi_schema.get('paths', {}).items():
-        for method, details in methods.items():
-            if method.upper() in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']:
-                tags = details.get('tags', ['Untagged'])
-                tag = tags[0] if tags else 'Untagged'
-                
-                if tag not in folders:
-                    folders[tag] = {
-                        "name": tag.title(),
-                        "description": f"Endpoints related to {tag}",
-                        "item": []
-                    }
-                
-                # Create request item
-                request_item = {
-                    "name": details.get('summary', f"{method.upper()} {path}"),
-                    "request": {
-                        "method": method.upper(),
-                        "header": [
-                            {
-                                "key": "Content-Type",
-                                "value": "application/json"
-                            }
-                        ],
-                        "url": {
-                            "raw": "{{base_url}}" + path,
-                            "host": ["{{base_url}}"],
-                            "path": path.strip('/').split('/')
-                        },
-                        "description": details.get('description', '')
-                    }
+    # One Postman folder per tag
+    folders = []
+    
+    for tag, endpoints in endpoints_by_tag.items():
+        items = []
+        
+        for endpoint in endpoints:
+            path = endpoint['path']
+            method = endpoint['method']
+            
+            # Create request item
+            request_item = {
+                "name": endpoint['summary'] or f"{method} {path}",
+                "request": {
+                    "method": method,
+                    "header": [
+                        {
+                            "key": "Content-Type",
+                            "value": "application/json"
+                        }
+                    ],
+                    "url": {
+                        "raw": "{{base_url}}" + path,
+                        "host": ["{{base_url}}"],
+                        "path": path.strip('/').split('/')
+                    },
+                    "description": endpoint['description']
                 }
-                
-                # Add query parameters
-                if details.get('parameters'):
-                    query_params = []
-                    for param in details['parameters']:
-                        if param.get('in') == 'query':
-                            query_params.append({
-                                "key": param.get('name'),
-                                "value": param.get('example', ''),
-                                "description": param.get('description', '')
-                            })
-                    if query_params:
-                        request_item["request"]["url"]["query"] = query_params
-                
-                # Add request body for POST/PUT
-                if method.upper() in ['POST', 'PUT', 'PATCH'] and details.get('requestBody'):
-                    content = details['requestBody'].get('content', {})
-                    if 'application/json' in content:
-                        example = content['application/json'].get('example', {})
-                        request_item["request"]["body"] = {
-                            "mode": "raw",
-                            "raw": json.dumps(example, indent=2),
-                            "options": {
-                                "raw": {
-                                    "language": "json"
-                                }
+            }
+            
+            # Add query parameters
+            query_params = [
+                {
+                    "key": param.get('name'),
+                    "value": param.get('example', ''),
+                    "description": param.get('description', '')
+                }
+                for param in endpoint['parameters']
+                if param.get('in') == 'query'
+            ]
+            if query_params:
+                request_item["request"]["url"]["query"] = query_params
+            
+            # Add request body for POST/PUT
+            if method in ['POST', 'PUT', 'PATCH'] and endpoint['requestBody']:
+                content = endpoint['requestBody'].get('content', {})
+                if 'application/json' in content:
+                    example = content['application/json'].get('example', {})
+                    request_item["request"]["body"] = {
+                        "mode": "raw",
+                        "raw": json.dumps(example, indent=2),
+                        "options": {
+                            "raw": {
+                                "language": "json"
                             }
                         }
-                
-                folders[tag]["item"].append(request_item)
+                    }
+            
+            items.append(request_item)
+        
+        folders.append({
+            "name": tag.title(),
+            "description": f"Endpoints related to {tag}",
+            "item": items
+        })
     
     # Add folders to collection
-    collection["item"] = list(folders.values())
+    collection["item"] = folders
     
     return collection
 
@@ -392,16 +402,17 @@ def main():
     # Generate OpenAPI schema
     print("1. Generating OpenAPI schema...")
     openapi_schema = custom_openapi(app)
+    endpoints_by_tag = group_endpoints_by_tag(openapi_schema)
     
     # Save OpenAPI JSON
     openapi_file = docs_dir / "openapi.json"
-    with open(openapi_file, 'w') as f:
-        json.dump(openapi_schema, f, indent=2)
+    with open(openapi_file, 'wb') as f:
+        f.write(orjson.dumps(openapi_schema, option=orjson.OPT_INDENT_2))
     print(f"   ✓ OpenAPI spec saved to {openapi_file}")
     
     # Generate Markdown documentation
     print("2. Generating Markdown documentation...")
-    markdown_content = generate_markdown_docs(openapi_schema)
+    markdown_content = generate_markdown_docs(openapi_schema, endpoints_by_tag)
     markdown_file = docs_dir / "README.md"
     with open(markdown_file, 'w') as f:
         f.write(markdown_content)
@@ -409,10 +420,10 @@ def main():
     
     # Generate Postman collection
     print("3. Generating Postman collection...")
-    postman_collection = generate_postman_collection(openapi_schema)
+    postman_collection = generate_postman_collection(openapi_schema, endpoints_by_tag)
     postman_file = docs_dir / "smartspd-postman-collection.json"
-    with open(postman_file, 'w') as f:
-        json.dump(postman_collection, f, indent=2)
+    with open(postman_file, 'wb') as f:
+        f.write(orjson.dumps(postman_collection, option=orjson.OPT_INDENT_2))
     print(f"   ✓ Postman collection saved to {postman_file}")
     
     # Generate API reference HTML
@@ -0,0 +1,23 @@
+-- SmartSPD v2 Daily Activity Rollup
+-- Pre-aggregated audit log counts for the user activity dashboards
+
+-- Create daily activity materialized view
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_user_daily_activity AS
+SELECT
+    tpa_id,
+    user_id,
+    date(created_at) AS day,
+    action,
+    resource_type,
+    success,
+    count(*) AS cnt
+FROM audit_logs
+GROUP BY 1, 2, 3, 4, 5, 6;
+
+-- Unique index required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_user_daily_activity_key
+    ON mv_user_daily_activity(tpa_id, user_id, day, action, resource_type, success);
+
+-- Create indexes for mv_user_daily_activity
+CREATE INDEX IF NOT EXISTS idx_mv_user_daily_activity_tpa_user_day ON mv_user_daily_activity(tpa_id, user_id, day);
+CREATE INDEX IF NOT EXISTS idx_mv_user_daily_activity_day ON mv_user_daily_activity(day);
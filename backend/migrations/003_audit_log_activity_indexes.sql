@@ -0,0 +1,15 @@
+-- SmartSPD v2 Audit Log Activity Indexes
+-- Composite indexes for per-user and per-TPA activity range scans
+-- Run outside a transaction block: CREATE/DROP INDEX CONCURRENTLY cannot run inside one
+
+-- Create composite covering indexes for audit_logs
+CREATE INDEX CONCURRENTLY idx_audit_logs_user_created
+    ON audit_logs(user_id, created_at DESC)
+    INCLUDE (action, resource_type, success, ip_address);
+CREATE INDEX CONCURRENTLY idx_audit_logs_tpa_created
+    ON audit_logs(tpa_id, created_at DESC)
+    INCLUDE (user_id, action, resource_type, success, ip_address);
+
+-- Drop single-column indexes covered by the composite indexes' leading columns
+DROP INDEX CONCURRENTLY IF EXISTS idx_audit_logs_user_id;
+DROP INDEX CONCURRENTLY IF EXISTS idx_audit_logs_tpa_id;
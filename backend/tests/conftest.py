@@ -0,0 +1,21 @@
+"""
+Shared pytest configuration for the SmartSPD v2 backend unit tests
+"""
+import os
+import sys
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+# Unit tests never reach external services; settings only need to validate
+os.environ.setdefault("ENVIRONMENT", "test")
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/15")
+os.environ.setdefault("NEO4J_URI", "bolt://localhost:7687")
+os.environ.setdefault("NEO4J_USER", "neo4j")
+os.environ.setdefault("NEO4J_PASSWORD", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("PINECONE_API_KEY", "test-key")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
@@ -0,0 +1,126 @@
+"""
+Unit tests for the AI request batcher
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.services.ai_service import AIBatcher, AIResponse
+
+
+class RecordingService:
+    """Chat completion stand-in recording calls and how many overlap"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def chat_completion(self, messages, **kwargs):
+        self.calls.append((messages, kwargs))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            content = messages[0]["content"]
+            if content == "fail":
+                raise RuntimeError("model error")
+            return AIResponse(content=content.upper(), token_count=1, model="test", provider="openai")
+        finally:
+            self.in_flight -= 1
+
+
+@pytest_asyncio.fixture
+async def make_batcher():
+    """Build batchers whose background consumer is stopped after the test"""
+    batchers = []
+
+    def make(service, **kwargs):
+        batcher = AIBatcher(service, **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+
+    for batcher in batchers:
+        if batcher._consumer_task is not None:
+            batcher._consumer_task.cancel()
+            await asyncio.gather(batcher._consumer_task, return_exceptions=True)
+
+
+def ask(batcher, content, **kwargs):
+    return batcher.submit(messages=[{"role": "user", "content": content}], **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_each_caller_gets_its_own_response(make_batcher):
+    batcher = make_batcher(RecordingService(), batch_size=4, flush_interval_ms=10)
+
+    responses = await asyncio.gather(*(ask(batcher, text) for text in ("a", "b", "c")))
+
+    assert [response.content for response in responses] == ["A", "B", "C"]
+
+
+@pytest.mark.asyncio
+async def test_requests_in_a_batch_run_concurrently(make_batcher):
+    service = RecordingService(delay=0.05)
+    batcher = make_batcher(service, batch_size=8, flush_interval_ms=10)
+
+    await asyncio.gather(*(ask(batcher, str(i)) for i in range(5)))
+
+    assert service.max_in_flight == 5
+
+
+@pytest.mark.asyncio
+async def test_request_options_are_passed_through(make_batcher):
+    service = RecordingService()
+    batcher = make_batcher(service, flush_interval_ms=1)
+
+    await ask(batcher, "a", model="gpt-4o-mini", max_tokens=50, temperature=0.1, top_p=0.5)
+
+    _, kwargs = service.calls[0]
+    assert kwargs == {"model": "gpt-4o-mini", "max_tokens": 50, "temperature": 0.1, "top_p": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_failure_only_affects_its_caller(make_batcher):
+    batcher = make_batcher(RecordingService(), batch_size=4, flush_interval_ms=10)
+
+    ok, failed = await asyncio.gather(ask(batcher, "ok"), ask(batcher, "fail"), return_exceptions=True)
+
+    assert ok.content == "OK"
+    assert isinstance(failed, RuntimeError)
+
+
+@pytest.mark.asyncio
+async def test_full_batch_dispatches_without_waiting_for_the_interval(make_batcher):
+    service = RecordingService(delay=0)
+    batcher = make_batcher(service, batch_size=2, flush_interval_ms=10_000)
+
+    responses = await asyncio.wait_for(
+        asyncio.gather(ask(batcher, "a"), ask(batcher, "b")),
+        timeout=1
+    )
+
+    assert [response.content for response in responses] == ["A", "B"]
+
+
+@pytest.mark.asyncio
+async def test_batches_are_capped_at_batch_size(make_batcher):
+    service = RecordingService(delay=0.05)
+    batcher = make_batcher(service, batch_size=2, flush_interval_ms=1)
+
+    batches = []
+    dispatch = batcher._dispatch
+
+    async def recording_dispatch(batch):
+        batches.append(len(batch))
+        await dispatch(batch)
+
+    batcher._dispatch = recording_dispatch
+    await asyncio.gather(*(ask(batcher, str(i)) for i in range(5)))
+
+    assert max(batches) == 2
+    assert sum(batches) == 5
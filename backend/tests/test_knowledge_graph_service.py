@@ -0,0 +1,92 @@
+"""
+Unit tests for knowledge graph full-text query building
+"""
+import pytest
+
+from app.services import knowledge_graph_service
+from app.services.knowledge_graph_service import KnowledgeGraphService, _lucene_escape, _lucene_query
+
+
+class TestLuceneEscape:
+
+    def test_plain_term_is_quoted(self):
+        assert _lucene_escape("deductible") == '"deductible"'
+
+    def test_special_characters_are_literal_inside_quotes(self):
+        assert _lucene_escape("copay (tier 1): $20+") == '"copay (tier 1): $20+"'
+
+    def test_quotes_and_backslashes_are_escaped(self):
+        assert _lucene_escape('say "hi"\\') == '"say \\"hi\\"\\\\"'
+
+    def test_reserved_words_are_quoted(self):
+        assert _lucene_escape("AND") == '"AND"'
+
+
+class TestLuceneQuery:
+
+    def test_terms_are_joined_with_or(self):
+        assert _lucene_query(["mri", "x-ray"]) == '"mri" OR "x-ray"'
+
+    def test_blank_terms_are_dropped(self):
+        assert _lucene_query(["", "  ", "mri", "\t"]) == '"mri"'
+
+    def test_terms_are_stripped(self):
+        assert _lucene_query(["  urgent care "]) == '"urgent care"'
+
+    def test_no_usable_terms(self):
+        assert _lucene_query(["", " "]) == ""
+        assert _lucene_query([]) == ""
+
+    def test_operator_terms_are_not_operators(self):
+        assert _lucene_query(["NOT", "OR"]) == '"NOT" OR "OR"'
+
+
+class FakeResult:
+    async def single(self):
+        return {"test": 1, "backfilled": 0}
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def run(self, query, **params):
+        return FakeResult()
+
+    async def execute_write(self, work):
+        self.driver.writes += 1
+        return await work(self)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.writes = 0
+
+    def session(self):
+        return FakeSession(self)
+
+
+@pytest.mark.asyncio
+async def test_category_backfill_runs_once_per_process(monkeypatch):
+    driver = FakeDriver()
+    monkeypatch.setattr(knowledge_graph_service, "_categories_backfilled", False)
+    monkeypatch.setattr(knowledge_graph_service.AsyncGraphDatabase, "driver", lambda *args, **kwargs: driver)
+
+    async def create_schema(self):
+        pass
+
+    monkeypatch.setattr(KnowledgeGraphService, "_create_schema", create_schema)
+
+    # Health probes initialize a fresh service each time
+    for _ in range(3):
+        service = KnowledgeGraphService()
+        await service.initialize()
+        assert service.initialized
+
+    assert driver.writes == 1
@@ -0,0 +1,202 @@
+"""
+Unit tests for the notification service's batching and shutdown
+"""
+import asyncio
+
+import pytest
+
+from app.services.notification_service import NotificationService
+
+
+@pytest.fixture
+def service():
+    """Email-enabled service whose batch sends are recorded instead of delivered"""
+    service = NotificationService()
+    service.enable_email = True
+    service.smtp_username = "alerts@example.com"
+    service.smtp_password = "secret"
+    service.sent = []
+
+    async def send_email_batch(messages):
+        service.sent.extend(messages)
+        return [True] * len(messages)
+
+    service.send_email_batch = send_email_batch
+    return service
+
+
+@pytest.mark.asyncio
+async def test_close_sends_the_batch_held_by_the_flusher(service):
+    service.email_batch_window = 0.2
+    await service.queue_email(["a@example.com"], "Subject", "Body")
+
+    # The flusher has taken the email and is waiting out the batch window
+    await asyncio.sleep(0.05)
+    await service.close()
+
+    assert [to_emails for to_emails, _ in service.sent] == [["a@example.com"]]
+    assert service._flusher_task is None
+
+
+@pytest.mark.asyncio
+async def test_close_sends_emails_queued_behind_a_full_batch(service):
+    service.email_batch_window = 0.05
+    service.smtp_max_messages_per_connection = 2
+    for i in range(5):
+        await service.queue_email([f"user{i}@example.com"], "Subject", "Body")
+
+    await service.close()
+
+    assert sorted(to_emails[0] for to_emails, _ in service.sent) == [
+        f"user{i}@example.com" for i in range(5)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_close_writes_the_audit_events_held_by_the_worker(service):
+    written = []
+    service._write_audit_events = written.extend
+    service._queue_audit(tpa_id="system", action="system_alert_sent")
+
+    # The worker has taken the event and is waiting out the batch window
+    await asyncio.sleep(0.05)
+    await service.close()
+
+    assert written == [{"tpa_id": "system", "action": "system_alert_sent"}]
+    assert service._audit_task is None
+
+
+@pytest.mark.asyncio
+async def test_close_writes_audit_events_queued_behind_a_full_batch(service, monkeypatch):
+    monkeypatch.setattr("app.services.notification_service._AUDIT_BATCH_SIZE", 2)
+    written = []
+    service._write_audit_events = written.extend
+    for i in range(5):
+        service._queue_audit(tpa_id="system", action=f"event_{i}")
+
+    await service.close()
+
+    assert sorted(event["action"] for event in written) == [f"event_{i}" for i in range(5)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the service"""
+    now = [1000.0]
+    monkeypatch.setattr("app.services.notification_service.time.monotonic", lambda: now[0])
+    return now
+
+
+class TestDuplicateSuppression:
+
+    def test_repeat_within_window_is_duplicate(self, service, clock):
+        key = service._dedup_key(["a@example.com"], "Subject", "Body")
+        assert not service._is_duplicate(key, ["a@example.com"], "Subject")
+        clock[0] += service.notification_dedup_seconds - 1
+        assert service._is_duplicate(key, ["a@example.com"], "Subject")
+
+    def test_repeat_after_window_is_sent(self, service, clock):
+        key = service._dedup_key(["a@example.com"], "Subject", "Body")
+        assert not service._is_duplicate(key, ["a@example.com"], "Subject")
+        clock[0] += service.notification_dedup_seconds
+        assert not service._is_duplicate(key, ["a@example.com"], "Subject")
+
+    def test_forgotten_send_can_be_retried(self, service, clock):
+        key = service._dedup_key(["a@example.com"], "Subject", "Body")
+        assert not service._is_duplicate(key, ["a@example.com"], "Subject")
+        service._forget_sent(key)
+        assert not service._is_duplicate(key, ["a@example.com"], "Subject")
+
+    def test_key_ignores_recipient_order(self, service):
+        assert service._dedup_key(["a@x.com", "b@x.com"], "S", "B") == service._dedup_key(["b@x.com", "a@x.com"], "S", "B")
+        assert service._dedup_key(["a@x.com"], "S", "B") != service._dedup_key(["a@x.com"], "S", "other")
+
+    @pytest.mark.asyncio
+    async def test_failed_batch_send_is_not_suppressed(self, service):
+        async def send_email_batch(messages):
+            return [False] * len(messages)
+
+        service.send_email_batch = send_email_batch
+        service.email_batch_window = 0
+        assert await service.queue_email(["a@example.com"], "Subject", "Body")
+        await service.close()
+
+        key = service._dedup_key(["a@example.com"], "Subject", "Body")
+        assert key not in service._dedup
+
+
+class TestAlertCoalescing:
+
+    @pytest.fixture
+    def summaries(self, service):
+        """Record alert summaries instead of queueing their emails"""
+        summaries = []
+
+        async def send_alert_summary(key, first_seen, messages):
+            summaries.append((key, list(messages)))
+
+        service._send_alert_summary = send_alert_summary
+        service.alert_coalesce_seconds = 0.05
+        return summaries
+
+    @pytest.mark.asyncio
+    async def test_alerts_in_a_window_are_sent_as_one_summary(self, service, summaries):
+        for message in ("disk 91%", "disk 93%", "disk 95%"):
+            service._coalesce_alert("disk", message, "medium", ["a@x.com", "b@x.com"])
+        assert summaries == []
+
+        await asyncio.sleep(0.1)
+
+        assert sorted(summaries) == [
+            (("disk", "medium", "a@x.com"), ["disk 91%", "disk 93%", "disk 95%"]),
+            (("disk", "medium", "b@x.com"), ["disk 91%", "disk 93%", "disk 95%"])
+        ]
+        assert service._alert_cache == {}
+
+    @pytest.mark.asyncio
+    async def test_alert_types_and_severities_are_kept_apart(self, service, summaries):
+        service._coalesce_alert("disk", "m1", "medium", ["a@x.com"])
+        service._coalesce_alert("disk", "m2", "low", ["a@x.com"])
+        service._coalesce_alert("cpu", "m3", "medium", ["a@x.com"])
+
+        await asyncio.sleep(0.1)
+
+        assert len(summaries) == 3
+
+    @pytest.mark.asyncio
+    async def test_window_stays_open_while_over_the_rate_limit(self, service, summaries):
+        service.alert_rate_limit_per_minute = 1
+        assert service._alert_within_rate_limit("a@x.com")
+
+        service._coalesce_alert("disk", "m1", "medium", ["a@x.com"])
+        await asyncio.sleep(0.08)
+        service._coalesce_alert("disk", "m2", "medium", ["a@x.com"])
+        assert summaries == []
+
+        # The minute has passed; the deferred window goes out with both alerts
+        service._alert_send_times["a@x.com"].clear()
+        await asyncio.sleep(0.1)
+
+        assert summaries == [(("disk", "medium", "a@x.com"), ["m1", "m2"])]
+
+    def test_rate_limit_slides_over_a_minute(self, service, clock):
+        service.alert_rate_limit_per_minute = 2
+        assert service._alert_within_rate_limit("a@x.com")
+        clock[0] += 30
+        assert service._alert_within_rate_limit("a@x.com")
+        assert not service._alert_within_rate_limit("a@x.com")
+        assert service._alert_within_rate_limit("b@x.com")
+
+        clock[0] += 31
+        assert service._alert_within_rate_limit("a@x.com")
+        assert not service._alert_within_rate_limit("a@x.com")
+
+    @pytest.mark.asyncio
+    async def test_close_sends_open_windows(self, service, summaries):
+        service.alert_coalesce_seconds = 60
+        service._coalesce_alert("disk", "m1", "medium", ["a@x.com"])
+
+        await service.close()
+
+        assert summaries == [(("disk", "medium", "a@x.com"), ["m1"])]
+        assert service._alert_cache == {}
@@ -0,0 +1,180 @@
+"""
+Unit tests for the RAG service's pure helpers
+"""
+import json
+
+import pytest
+
+from app.services.rag_service import (
+    RAGService,
+    _AnswerStreamExtractor,
+    _CONTEXT_TOKEN_BUDGET,
+    _KEYWORD_PATTERN,
+    _KEYWORD_PAYLOADS,
+)
+
+
+class WordEncoding:
+    """Tokenizer stand-in with one token per whitespace-separated word"""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def rag_service():
+    service = RAGService.__new__(RAGService)
+    service._enc = WordEncoding()
+    return service
+
+
+def stream(deltas):
+    """Feed deltas to a fresh extractor, returning the concatenated output"""
+    extractor = _AnswerStreamExtractor()
+    return "".join(extractor.feed(delta) for delta in deltas)
+
+
+class TestAnswerStreamExtractor:
+
+    def test_whole_response(self):
+        assert stream(['{"answer": "Your deductible is $500.", "reasoning": "x"}']) == "Your deductible is $500."
+
+    def test_output_matches_json_for_every_split(self):
+        response = json.dumps({
+            "answer": 'Copay "tier 1" is $20\\visit\nSee page 4 é \U0001F600',
+            "reasoning": "ignored"
+        })
+        expected = json.loads(response)["answer"]
+        for split in range(len(response) + 1):
+            assert stream([response[:split], response[split:]]) == expected
+
+    def test_character_by_character(self):
+        response = json.dumps({"answer": "Tab\there ✓ \U0001F3E5 done"})
+        assert stream(list(response)) == json.loads(response)["answer"]
+
+    def test_split_surrogate_pair_is_held_back(self):
+        extractor = _AnswerStreamExtractor()
+        assert extractor.feed('{"answer": "A') == "A"
+        assert extractor.feed('\\ud83d') == ""
+        assert extractor.feed('\\ude00') == "\U0001F600"
+        assert extractor.feed('"}') == ""
+
+    def test_split_escape_is_held_back(self):
+        extractor = _AnswerStreamExtractor()
+        assert extractor.feed('{"answer": "a\\') == "a"
+        assert extractor.feed('"b"}') == '"b'
+
+    def test_answer_key_split_across_deltas(self):
+        assert stream(['{"reasoning": "r", "ans', 'wer"', ' : ', '"yes"}']) == "yes"
+
+    def test_text_after_answer_is_ignored(self):
+        extractor = _AnswerStreamExtractor()
+        assert extractor.feed('{"answer": "done", ') == "done"
+        assert extractor.feed('"answer": "again"}') == ""
+        assert extractor.text == '{"answer": "done", "answer": "again"}'
+
+    def test_no_answer_key(self):
+        assert stream(['{"reasoning": "no answer here"}']) == ""
+
+
+class TestKeywordMatcher:
+
+    def test_every_payload_has_a_group(self):
+        assert set(_KEYWORD_PAYLOADS) == set(_KEYWORD_PATTERN.groupindex)
+
+    def test_phrase_wins_over_its_leading_word(self, rag_service):
+        analysis = rag_service._pattern_based_analysis("Is the emergency room covered?")
+        assert analysis["benefit_types"] == ["emergency"]
+        assert analysis["intent"] == "coverage"
+
+    def test_phrase_keeps_the_payloads_of_its_words(self):
+        match = _KEYWORD_PATTERN.search("family doctor visit")
+        assert match.group() == "family doctor"
+        assert ("benefit", "primary_care") in _KEYWORD_PAYLOADS[match.lastgroup]
+        assert ("intent", "network") in _KEYWORD_PAYLOADS[match.lastgroup]
+
+    def test_member_keywords_match_whole_words_only(self, rag_service):
+        assert rag_service._pattern_based_analysis("What is my copay?")["member_specific"]
+        assert not rag_service._pattern_based_analysis("Is imaging covered?")["member_specific"]
+
+    def test_benefit_keywords_allow_plurals_but_not_longer_words(self, rag_service):
+        assert rag_service._pattern_based_analysis("Are drugs covered?")["benefit_types"] == ["prescription"]
+        assert rag_service._pattern_based_analysis("Is there an error?")["benefit_types"] == []
+
+    def test_intent_keywords_match_word_prefixes(self, rag_service):
+        assert rag_service._pattern_based_analysis("How much will I be paying?")["intent"] == "cost"
+        assert rag_service._pattern_based_analysis("Is there a repayment option?")["intent"] == "general"
+
+    def test_ambiguous_intent_lowers_confidence(self, rag_service):
+        assert rag_service._pattern_based_analysis("What is the copay?")["intent_confidence"] == 1.0
+        analysis = rag_service._pattern_based_analysis("What is the copay for a network doctor?")
+        assert analysis["intent"] == "cost"
+        assert analysis["intent_confidence"] == 0.5
+
+    def test_comparison_is_complex(self, rag_service):
+        analysis = rag_service._pattern_based_analysis("Compare PPO vs HMO")
+        assert analysis["complexity"] == "complex"
+        assert not rag_service._is_fast_path_query("Compare PPO vs HMO", analysis)
+
+    def test_no_keywords(self, rag_service):
+        analysis = rag_service._pattern_based_analysis("hello")
+        assert analysis["intent"] == "general"
+        assert analysis["intent_confidence"] == 0.0
+        assert analysis["benefit_types"] == []
+
+    def test_fast_path_cost_queries_cross_reference(self, rag_service):
+        query = "What is my deductible?"
+        analysis = rag_service._pattern_based_analysis(query)
+        assert rag_service._is_fast_path_query(query, analysis)
+
+        fallback = rag_service._fallback_analysis(query, analysis)
+        assert fallback["cross_reference_needed"]
+        assert fallback["document_types_needed"] == ["both"]
+
+
+def chunk(content, confidence, **fields):
+    return {"content": content, "confidence": confidence, "source": "spd", **fields}
+
+
+class TestBuildContext:
+
+    def test_short_chunks_are_kept_whole(self, rag_service):
+        context = rag_service._build_context([
+            chunk("one two three", 0.9, section_title="Deductibles", page_number=4),
+            chunk("four five", 0.5)
+        ])
+        assert context == [
+            {"id": 1, "src": "Deductibles", "pg": 4, "text": "one two three"},
+            {"id": 2, "src": "spd", "text": "four five"}
+        ]
+
+    def test_budget_is_shared_by_confidence(self, rag_service):
+        words = " ".join(["w"] * _CONTEXT_TOKEN_BUDGET)
+        context = rag_service._build_context([chunk(words, 0.75), chunk(words, 0.25)])
+
+        first, second = (entry["text"][:-3].split() for entry in context)
+        assert len(first) == _CONTEXT_TOKEN_BUDGET * 3 // 4
+        assert len(second) == _CONTEXT_TOKEN_BUDGET // 4
+        assert all(entry["text"].endswith("...") for entry in context)
+
+    def test_unused_budget_goes_to_later_chunks(self, rag_service):
+        words = " ".join(["w"] * _CONTEXT_TOKEN_BUDGET)
+        context = rag_service._build_context([chunk("short", 0.5), chunk(words, 0.5)])
+
+        assert context[0]["text"] == "short"
+        assert len(context[1]["text"][:-3].split()) == _CONTEXT_TOKEN_BUDGET - 1
+
+    def test_zero_confidence_splits_evenly(self, rag_service):
+        words = " ".join(["w"] * _CONTEXT_TOKEN_BUDGET)
+        context = rag_service._build_context([chunk(words, 0), chunk(words, 0)])
+
+        assert [len(entry["text"][:-3].split()) for entry in context] == [_CONTEXT_TOKEN_BUDGET // 2] * 2
+
+    def test_total_never_exceeds_budget(self, rag_service):
+        words = " ".join(["w"] * 1000)
+        context = rag_service._build_context([chunk(words, c) for c in (0.9, 0.8, 0.7, 0.6, 0.5)])
+
+        assert sum(len(entry["text"].rstrip(".").split()) for entry in context) <= _CONTEXT_TOKEN_BUDGET
@@ -0,0 +1,130 @@
+"""
+Unit tests for the user activity service's pure helpers
+"""
+import asyncio
+from datetime import datetime
+from enum import Enum
+
+import pytest
+
+from app.services import user_activity_service
+from app.services.user_activity_service import UserActivityService, _cached_result
+
+
+class TestScoreChurnRisk:
+
+    def test_steady_activity_has_no_risk(self):
+        assert UserActivityService._score_churn_risk(10, 10, 10, 0) == (0, 0)
+
+    def test_sharp_decline(self):
+        assert UserActivityService._score_churn_risk(4, 10, 10, 0) == (30, 0b0001)
+
+    def test_decline_must_be_below_half(self):
+        assert UserActivityService._score_churn_risk(5, 10, 10, 0) == (0, 0)
+
+    def test_no_recent_activity(self):
+        # Also a decline and, with too few events overall, low activity
+        assert UserActivityService._score_churn_risk(0, 4, 4, 0) == (90, 0b0111)
+
+    def test_no_activity_without_previous_activity_is_not_a_decline(self):
+        assert UserActivityService._score_churn_risk(0, 0, 20, 0) == (40, 0b0010)
+
+    def test_low_overall_activity(self):
+        assert UserActivityService._score_churn_risk(3, 3, 2, 0) == (20, 0b0100)
+        assert UserActivityService._score_churn_risk(3, 3, 3, 0) == (0, 0)
+
+    def test_failures(self):
+        assert UserActivityService._score_churn_risk(10, 10, 10, 5) == (0, 0)
+        assert UserActivityService._score_churn_risk(10, 10, 10, 6) == (25, 0b1000)
+
+    def test_every_factor(self):
+        assert UserActivityService._score_churn_risk(0, 2, 2, 6) == (115, 0b1111)
+
+
+class Level(str, Enum):
+    HIGH = "high"
+
+
+@pytest.fixture
+def redis_store(monkeypatch):
+    """In-memory stand-in for the Redis cache helpers"""
+    store = {}
+
+    async def cache_get_bytes(key):
+        return store.get(key)
+
+    async def cache_set_bytes(key, value, ttl_seconds):
+        store[key] = value
+
+    async def cache_delete_pattern(pattern):
+        prefix = pattern.rstrip("*")
+        for key in [key for key in store if key.startswith(prefix)]:
+            del store[key]
+
+    monkeypatch.setattr(user_activity_service, "cache_get_bytes", cache_get_bytes)
+    monkeypatch.setattr(user_activity_service, "cache_set_bytes", cache_set_bytes)
+    monkeypatch.setattr(user_activity_service, "cache_delete_pattern", cache_delete_pattern)
+    return store
+
+
+class TestCachedResult:
+
+    @pytest.mark.asyncio
+    async def test_hit_and_miss_return_the_same_shape(self, redis_store):
+        calls = []
+
+        @_cached_result("test", 30)
+        async def overview(db, tpa_id, days=30):
+            calls.append((tpa_id, days))
+            return {"by_hour": {9: 3}, "level": Level.HIGH, "at": datetime(2024, 1, 2, 3, 4, 5)}
+
+        miss = await overview("session", "tpa-1")
+        hit = await overview("other-session", "tpa-1")
+
+        assert miss == hit == {"by_hour": {"9": 3}, "level": "high", "at": "2024-01-02T03:04:05"}
+        assert calls == [("tpa-1", 30)]
+        assert list(redis_store) == ["activity:test:tpa-1:30"]
+
+    @pytest.mark.asyncio
+    async def test_arguments_other_than_the_session_form_the_key(self, redis_store):
+        @_cached_result("test", 30)
+        async def overview(db, tpa_id, days=30):
+            return {"tpa_id": tpa_id, "days": days}
+
+        assert await overview("session", "tpa-1") == {"tpa_id": "tpa-1", "days": 30}
+        assert await overview("session", "tpa-1", days=7) == {"tpa_id": "tpa-1", "days": 7}
+        assert await overview("session", tpa_id="tpa-2") == {"tpa_id": "tpa-2", "days": 30}
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+
+    def invalidate(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_rollup_refresh_clears_rollup_backed_caches(redis_store, monkeypatch):
+    redis_store.update({
+        "activity:tpa_overview:tpa-1:30": b"{}",
+        "activity:engagement:None:30": b"{}",
+        "activity:real_time:tpa-1": b"{}"
+    })
+    refreshed = asyncio.Event()
+
+    def refresh(connection):
+        refreshed.set()
+        return True
+
+    monkeypatch.setattr(user_activity_service.settings, "ACTIVITY_ROLLUP_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(user_activity_service.engine, "connect", FakeConnection)
+    monkeypatch.setattr(UserActivityService, "refresh_daily_activity_rollup", staticmethod(refresh))
+
+    task = asyncio.create_task(user_activity_service.run_daily_activity_refresher())
+    await refreshed.wait()
+    await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert list(redis_store) == ["activity:real_time:tpa-1"]
@@ -0,0 +1,93 @@
+"""
+Unit tests for the vector service's semantic query cache
+"""
+import numpy as np
+import pytest
+
+from app.services import vector_service
+from app.services.vector_service import _SemanticQueryCache
+
+
+def unit(*values):
+    return np.asarray(values, dtype=np.float32)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic for the cache"""
+    now = [1000.0]
+    monkeypatch.setattr(vector_service.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return _SemanticQueryCache(capacity=2, dimension=4, similarity=0.97, ttl_seconds=600)
+
+
+class TestSemanticQueryCache:
+
+    def test_miss_on_empty_cache(self, cache):
+        assert cache.get("k", unit(1, 0, 0, 0)) is None
+
+    def test_hit_for_near_identical_embedding(self, cache):
+        cache.put("k", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        assert cache.get("k", unit(1, 0.05, 0, 0)) == [{"chunk_id": "a"}]
+
+    def test_miss_for_dissimilar_embedding(self, cache):
+        cache.put("k", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        assert cache.get("k", unit(0.7, 0.7, 0, 0)) is None
+
+    def test_keys_are_isolated(self, cache):
+        cache.put("tpa-1", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        assert cache.get("tpa-2", unit(1, 0, 0, 0)) is None
+
+    def test_scale_does_not_matter(self, cache):
+        cache.put("k", unit(3, 4, 0, 0), [{"chunk_id": "a"}])
+        assert cache.get("k", unit(0.6, 0.8, 0, 0)) == [{"chunk_id": "a"}]
+
+    def test_results_are_copied(self, cache):
+        results = [{"chunk_id": "a"}]
+        cache.put("k", unit(1, 0, 0, 0), results)
+        results[0]["chunk_id"] = "changed"
+
+        hit = cache.get("k", unit(1, 0, 0, 0))
+        hit[0]["annotated"] = True
+        assert cache.get("k", unit(1, 0, 0, 0)) == [{"chunk_id": "a"}]
+
+    def test_entries_expire(self, cache, clock):
+        cache.put("k", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        clock[0] += 599
+        assert cache.get("k", unit(1, 0, 0, 0)) is not None
+        clock[0] += 2
+        assert cache.get("k", unit(1, 0, 0, 0)) is None
+
+    def test_least_recently_used_is_evicted(self, cache, clock):
+        cache.put("a", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        clock[0] += 1
+        cache.put("b", unit(0, 1, 0, 0), [{"chunk_id": "b"}])
+        clock[0] += 1
+        assert cache.get("a", unit(1, 0, 0, 0)) is not None  # "b" is now least recent
+
+        clock[0] += 1
+        cache.put("c", unit(0, 0, 1, 0), [{"chunk_id": "c"}])
+
+        assert cache.get("a", unit(1, 0, 0, 0)) == [{"chunk_id": "a"}]
+        assert cache.get("b", unit(0, 1, 0, 0)) is None
+        assert cache.get("c", unit(0, 0, 1, 0)) == [{"chunk_id": "c"}]
+        assert set(cache._slots_by_key) == {"a", "c"}
+
+    def test_clear(self, cache):
+        cache.put("k", unit(1, 0, 0, 0), [{"chunk_id": "a"}])
+        cache.clear()
+        assert cache.get("k", unit(1, 0, 0, 0)) is None
+        cache.put("k", unit(0, 1, 0, 0), [{"chunk_id": "b"}])
+        assert cache.get("k", unit(0, 1, 0, 0)) == [{"chunk_id": "b"}]
+
+    def test_quantization_keeps_similarity(self):
+        rng = np.random.default_rng(0)
+        vector = _SemanticQueryCache._normalize(rng.standard_normal(1536).astype(np.float32))
+        codes, scale = _SemanticQueryCache._quantize(vector)
+
+        assert codes.dtype == np.int8
+        assert float(codes @ vector) * scale == pytest.approx(1.0, abs=1e-3)